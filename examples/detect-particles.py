@@ -6,7 +6,8 @@
 
 import time
 import datetime
-from max30105 import MAX30105, HeartRate
+from max30105 import MAX30105, HeartRate, ParticleDetector, PollScheduler
+from max30105.recording import Recorder
 
 max30105 = MAX30105()
 max30105.setup(leds_enable=3)
@@ -21,6 +22,9 @@ max30105.set_slot_mode(2, 'ir')
 max30105.set_slot_mode(3, 'green')
 max30105.set_slot_mode(4, 'off')
 
+# Measure the temperature in the background once a second
+max30105.set_temperature_interval(1.0)
+
 hr = HeartRate(max30105)
 
 # Smooths wobbly data. Increase to increase smoothing.
@@ -37,8 +41,7 @@ delta_size = 10
 # sensitive to fluctuations.
 threshold = 10
 
-data = []
-means = []
+detector = ParticleDetector(mean_size, delta_size, threshold)
 
 timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
 
@@ -57,8 +60,9 @@ the sensor.
 Any movement of objects close to the sensor is likely to also
 trigger detection of a change.
 
-Values are printed to the terminal and to a datestamped text
-file in the directory file_dir.
+Values are printed to the terminal, and the raw readings are
+recorded to a datestamped file in the directory file_dir. Load it
+with max30105.recording.Recording for analysis.
 """)
 
 delay = 10
@@ -66,40 +70,21 @@ delay = 10
 print("Starting readings in {} seconds...\n".format(delay))
 time.sleep(delay)
 
+# Drain the FIFO whenever it holds about 10 samples
+scheduler = PollScheduler(max30105, target_fill=10)
+
 try:
-    with open(file_dir + timestamp + ".txt", "w") as f:
-        f.write("time,green,mean,delta,change_detected,temp\n")
+    with Recorder(file_dir + timestamp + ".max30105", max30105) as recorder:
         while True:
-            timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
-            samples = max30105.get_samples()
-            if samples is not None:
-                f.write(timestamp + ",")
-                r = samples[2] & 0xff
-                d = hr.low_pass_fir(r)
-                data.append(d)
-                if len(data) > mean_size:
-                    data.pop(0)
-                mean = sum(data) / float(len(data))
-                means.append(mean)
-                if len(means) > delta_size:
-                    delta = means[-1] - means[-delta_size]
-                else:
-                    delta = 0
-                if delta > threshold:
-                    detected = True
-                else:
-                    detected = False
+            scheduler.sleep()
+            frames = recorder.record()
+            scheduler.update(len(frames) if frames is not None else 0)
+            if frames is not None:
+                # Process the least significant byte, where most wiggling is
+                values = [hr.low_pass_fir(green & 0xff) for green in frames.green]
+                detected = detector.update(values)
                 print("Value: {:.2f} // Mean: {:.2f} // Delta: {:.2f} // \
-Change detected: {}".format(d, mean, delta, detected))
-                f.write("{:.2f},".format(d))
-                f.write("{:.2f},".format(mean))
-                f.write("{:.2f},".format(delta))
-                f.write("{},".format(detected))
-                time.sleep(0.05)
-                temp = max30105.get_temperature()
-                f.write("{:.2f}\n".format(temp))
-                time.sleep(0.05)
+Change detected: {} // Temp: {}".format(values[-1], detector.mean, detector.delta, detected, frames.temperature))
 
 except KeyboardInterrupt:
-    f.close()
     pass
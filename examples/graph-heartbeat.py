@@ -4,7 +4,7 @@
 # for fun/novelty use only, so bear that in mind while using it.
 
 import time
-from max30105 import MAX30105, HeartRate
+from max30105 import MAX30105, HeartRate, PollScheduler
 
 max30105 = MAX30105()
 max30105.setup(leds_enable=2)
@@ -45,17 +45,17 @@ delay = 10
 print("Starting readings in {} seconds...\n".format(delay))
 time.sleep(delay)
 
+# Drain the FIFO whenever it holds about 2 samples, whatever the sample rate
+scheduler = PollScheduler(max30105, target_fill=2)
+
 try:
     while True:
-        samples = max30105.get_samples()
-        if samples is not None:
-            for i in range(0, len(samples), 2):
+        frames = scheduler.get_frames()
+        if frames is not None:
+            for ir in frames.ir:
                 # Process the least significant byte, where most wiggling is
-                ir = samples[i + 1] & 0xff
-                d = hr.low_pass_fir(ir)
-
-            print("#" * int(d / 2))
-            time.sleep(1.0 / 100)  # 400sps 4 sample averaging = 100sps
+                d = hr.low_pass_fir(ir & 0xff)
+                print("#" * int(d / 2))
 
 except KeyboardInterrupt:
     pass
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+# NOTE! This code should not be used for medical diagnosis. It's
+# for fun/novelty use only, so bear that in mind while using it.
+
+import time
+from max30105 import MAX30105, HeartRate, Oximeter, PollScheduler
+
+max30105 = MAX30105()
+max30105.setup(leds_enable=2)
+
+max30105.set_led_pulse_amplitude(1, 12.5)
+max30105.set_led_pulse_amplitude(2, 12.5)
+max30105.set_led_pulse_amplitude(3, 0)
+
+max30105.set_slot_mode(1, 'red')
+max30105.set_slot_mode(2, 'ir')
+max30105.set_slot_mode(3, 'off')
+max30105.set_slot_mode(4, 'off')
+
+hr = HeartRate(max30105)
+
+# Measures the red and IR pulse between each pair of heartbeats
+oximeter = Oximeter(hr)
+
+print("""
+NOTE! This code should not be used for medical diagnosis. It's
+for fun/novelty use only, so bear that in mind while using it.
+
+This example shows an estimate of your blood oxygen saturation
+(SpO2) and perfusion index, a measure of the strength of your
+pulse at the sensor, after every heartbeat.
+
+The estimate uses a generic calibration, so will not match a
+real pulse oximeter. Hold the sensor against your fingertip with
+a rubber band for steady readings, see read-heartbeat.py.
+""")
+
+delay = 10
+
+print("Starting readings in {} seconds...\n".format(delay))
+time.sleep(delay)
+
+scheduler = PollScheduler(max30105)
+
+try:
+    while True:
+        frames = scheduler.get_frames()
+        if frames is None:
+            continue
+        for t, ratio, spo2, perfusion in oximeter.update(frames):
+            print("SpO2: {:.1f}%  R: {:.3f}  PI: {:.2f}%  BPM: {:.2f}".format(spo2, ratio, perfusion, hr.bpm))
+
+except KeyboardInterrupt:
+    pass
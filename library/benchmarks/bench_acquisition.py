@@ -0,0 +1,115 @@
+"""Benchmarks for draining and decoding the sample FIFO.
+
+Run from the library directory with: tox -e benchmark
+
+"""
+import pytest
+
+from max30105 import FIFO_DEPTH, sample_buffer
+
+
+# A completely full FIFO, without overflow, has equal pointers and reads as empty
+FILL = FIFO_DEPTH - 1
+
+
+def _fill(bus):
+    bus.generate(FILL)
+
+
+# Poll when the FIFO is three quarters full at 3200sps without averaging, leaving room for timing jitter
+POLL_RATE = 3200
+POLL_INTERVAL = FIFO_DEPTH * 0.75 / POLL_RATE
+
+
+SAMPLE_AVERAGES = [1, 2, 4, 8, 16, 32]
+
+
+@pytest.mark.parametrize('sample_average', SAMPLE_AVERAGES)
+@pytest.mark.parametrize('leds_enable', [1, 2, 3])
+def test_get_samples(benchmark, simulated_sensor, leds_enable, sample_average):
+    """Drain the FIFO once per poll interval, averaging reduces the samples waiting at each drain."""
+    max30105, bus, clock = simulated_sensor(leds_enable, sample_average, sample_rate=POLL_RATE)
+    words = []
+
+    def get_samples():
+        result = max30105.get_samples()
+        words.append(len(result) if result is not None else 0)
+
+    benchmark.pedantic(get_samples, setup=lambda: clock.sleep(POLL_INTERVAL), rounds=500)
+
+    benchmark.extra_info['words_per_drain'] = float(sum(words)) / len(words)
+
+
+@pytest.mark.parametrize('sample_average', SAMPLE_AVERAGES)
+@pytest.mark.parametrize('leds_enable', [1, 2, 3])
+def test_get_samples_lossless(simulated_sensor, leds_enable, sample_average):
+    # Draining once per poll interval reads every sample and loses none
+    max30105, bus, clock = simulated_sensor(leds_enable, sample_average, sample_rate=POLL_RATE)
+    words = 0
+    for _ in range(500):
+        clock.sleep(POLL_INTERVAL)
+        result = max30105.get_samples()
+        words += len(result) if result is not None else 0
+
+    expected = 500 * POLL_INTERVAL * POLL_RATE / sample_average * leds_enable
+    assert words == pytest.approx(expected, abs=leds_enable)
+    assert bus.samples_lost == 0
+
+
+@pytest.mark.parametrize('use_numpy', [False, True])
+@pytest.mark.parametrize('leds_enable', [1, 2, 3])
+def test_get_frames(benchmark, simulated_sensor, leds_enable, use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    max30105, bus, clock = simulated_sensor(leds_enable)
+
+    frames = benchmark.pedantic(max30105.get_frames, args=(use_numpy,), setup=lambda: _fill(bus), rounds=500)
+
+    assert len(frames) == FILL
+
+
+@pytest.mark.parametrize('leds_enable', [1, 2, 3])
+def test_get_samples_into(benchmark, simulated_sensor, leds_enable):
+    max30105, bus, clock = simulated_sensor(leds_enable)
+    out = sample_buffer()
+
+    count = benchmark.pedantic(max30105.get_samples_into, args=(out,), setup=lambda: _fill(bus), rounds=500)
+
+    assert count == FILL * leds_enable
+
+
+@pytest.mark.parametrize('leds_enable', [1, 2, 3])
+def test_get_samples_transactions(simulated_sensor, leds_enable):
+    # One status burst, plus one FIFO_DATA read per 32 bytes
+    max30105, bus, clock = simulated_sensor(leds_enable)
+    _fill(bus)
+    bus.transactions = 0
+    max30105.get_samples()
+    assert bus.transactions <= 1 + -(-FILL * leds_enable * 3 // 32)
+
+
+def _drain(max30105, bus):
+    """Generate and drain half a FIFO of samples 100 times, returning the number of frames read."""
+    samples = 0
+    for _ in range(100):
+        bus.generate(FIFO_DEPTH // 2)
+        frames = max30105.get_frames()
+        samples += len(frames)
+    return samples
+
+
+def test_end_to_end_throughput(benchmark, simulated_sensor):
+    """Drain a sensor running at 3200 sps, samples/sec is reported in extra_info."""
+    max30105, bus, clock = simulated_sensor(leds_enable=3, sample_average=1, sample_rate=3200)
+
+    samples = benchmark.pedantic(_drain, args=(max30105, bus), rounds=20)
+
+    # No stats are collected with --benchmark-disable
+    if benchmark.stats is not None:
+        benchmark.extra_info['samples_per_second'] = samples / benchmark.stats.stats.mean
+
+
+def test_end_to_end_lossless(simulated_sensor):
+    max30105, bus, clock = simulated_sensor(leds_enable=3, sample_average=1, sample_rate=3200)
+    assert _drain(max30105, bus) == 100 * FIFO_DEPTH // 2
+    assert bus.samples_lost == 0
@@ -0,0 +1,48 @@
+"""Bus transaction counts and timings for configuration calls.
+
+Transaction counts are deterministic, so a change that adds bus traffic fails
+these checks on any machine.
+
+Run from the library directory with: tox -e benchmark
+
+"""
+from max30105 import MAX30105, Profile
+from max30105.simulator import SimulatedSMBus
+
+
+def _count(function):
+    bus = SimulatedSMBus()
+    max30105 = MAX30105(i2c_dev=bus)
+    max30105.setup()
+    bus.transactions = 0
+    function(max30105)
+    return bus.transactions
+
+
+def test_setup_transactions(benchmark):
+    def setup():
+        bus = SimulatedSMBus()
+        MAX30105(i2c_dev=bus).setup()
+        return bus.transactions
+
+    transactions = benchmark(setup)
+    benchmark.extra_info['transactions'] = transactions
+    # MODE_CONFIG read, reset write and two polls, three configuration block writes, FIFO clear
+    assert transactions <= 8
+
+
+def test_configure_unchanged_transactions(benchmark):
+    bus = SimulatedSMBus()
+    max30105 = MAX30105(i2c_dev=bus)
+    max30105.setup()
+    profile = Profile(sample_rate=400, sample_average=4)
+    bus.transactions = 0
+    benchmark(max30105.configure, profile)
+    assert bus.transactions == 0
+
+
+def test_setter_transactions():
+    assert _count(lambda max30105: max30105.set_led_pulse_amplitude(1, 12.5)) == 1
+    assert _count(lambda max30105: max30105.set_slot_mode(1, 'green')) == 1
+    assert _count(lambda max30105: max30105.set_fifo_almost_full_count(8)) == 1
+    assert _count(lambda max30105: max30105.configure(Profile(sample_rate=100, pulse_width=411))) == 1
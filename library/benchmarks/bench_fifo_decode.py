@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""Compare the list-building FIFO read against the buffer-backed read path.
+
+Run from the library directory: python benchmarks/bench_fifo_decode.py
+
+"""
+import timeit
+
+from i2cdevice import MockSMBus
+from max30105 import MAX30105, FIFO_DEPTH, sample_buffer, numpy
+
+
+class FullFIFOBus(MockSMBus):
+    """Report a full FIFO on every read and serve constant sample data."""
+    def __init__(self, i2c_bus, leds):
+        MockSMBus.__init__(self, i2c_bus, default_registers={0x09: 0b00000111})
+        self.leds = leds
+
+    def write_i2c_block_data(self, i2c_address, register, values):
+        if register == 0x09:
+            values[0] &= ~0b01000000
+        MockSMBus.write_i2c_block_data(self, i2c_address, register, values)
+
+    def read_i2c_block_data(self, i2c_address, register, length):
+        if register == 0x04:
+            # Write pointer, overflow counter, read pointer
+            return [FIFO_DEPTH - 1, 0, 0][:length]
+        if register == 0x07:
+            return [0x01, 0x23, 0x45] * (length // 3) + [0x67] * (length % 3)
+        return MockSMBus.read_i2c_block_data(self, i2c_address, register, length)
+
+
+def legacy_get_samples(max30105):
+    """The original list-building implementation of get_samples()."""
+    ptr_r = max30105._max30105.get('FIFO_READ').pointer
+    ptr_w = max30105._max30105.get('FIFO_WRITE').pointer
+
+    if ptr_r == ptr_w:
+        return None
+
+    sample_count = ptr_w - ptr_r
+    if sample_count < 0:
+        sample_count = 32
+
+    byte_count = sample_count * 3 * max30105._active_leds
+
+    data = []
+
+    while byte_count > 0:
+        data += max30105._max30105._i2c.read_i2c_block_data(max30105._i2c_addr, 0x07, min(byte_count, 32))
+        byte_count -= 32
+
+    max30105.clear_fifo()
+
+    result = []
+    for x in range(0, len(data), 3):
+        result.append((data[x] << 16) | (data[x + 1] << 8) | data[x + 2])
+
+    return result
+
+
+def legacy_decode(data):
+    result = []
+    for x in range(0, len(data), 3):
+        result.append((data[x] << 16) | (data[x + 1] << 8) | data[x + 2])
+    return result
+
+
+def report(name, seconds, number, baseline=None):
+    usec = seconds / number * 1e6
+    if baseline is None:
+        print("  {:<28} {:8.2f} us".format(name, usec))
+    else:
+        print("  {:<28} {:8.2f} us  ({:.1f}x)".format(name, usec, baseline / usec))
+    return usec
+
+
+def main(number=2000):
+    from max30105 import _decode_words
+
+    for leds in (1, 2, 3):
+        max30105 = MAX30105(i2c_dev=FullFIFOBus(1, leds))
+        max30105.setup(leds_enable=leds)
+
+        words = FIFO_DEPTH * leds
+        raw = bytearray([0x01, 0x23, 0x45] * words)
+        out = sample_buffer()
+
+        print("{} LED(s), {} words per full FIFO".format(leds, words))
+
+        print(" decode only:")
+        base = report("list loop", timeit.timeit(lambda: legacy_decode(raw), number=number), number)
+        report("array('I')", timeit.timeit(lambda: _decode_words(raw, words, out), number=number), number, base)
+        if numpy is not None:
+            np_out = sample_buffer(use_numpy=True)
+            report("numpy uint32", timeit.timeit(lambda: _decode_words(raw, words, np_out), number=number), number, base)
+
+        print(" full read:")
+        base = report("legacy get_samples()", timeit.timeit(lambda: legacy_get_samples(max30105), number=number), number)
+        report("get_samples()", timeit.timeit(max30105.get_samples, number=number), number, base)
+        report("get_samples_into(array)", timeit.timeit(lambda: max30105.get_samples_into(out), number=number), number, base)
+        if numpy is not None:
+            report("get_samples_into(numpy)", timeit.timeit(lambda: max30105.get_samples_into(np_out), number=number), number, base)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Benchmarks for the HeartRate DSP.
+
+Run from the library directory with: tox -e benchmark
+
+"""
+import pytest
+
+from max30105 import HeartRate, FIFO_DEPTH
+from max30105.simulator import PPGSource
+
+
+def _ir(count):
+    return [sample[0] for sample in PPGSource(seed=0).get_samples(('ir',), 0, count, 100.0)]
+
+
+def test_low_pass_fir(benchmark):
+    heartrate = HeartRate(None)
+    samples = iter(_ir(1000) * 1000)
+    benchmark(lambda: heartrate.low_pass_fir(next(samples)))
+
+
+def test_check_for_beat(benchmark):
+    heartrate = HeartRate(None)
+    samples = iter(_ir(1000) * 1000)
+    benchmark(lambda: heartrate.check_for_beat(next(samples)))
+
+
+@pytest.mark.parametrize('use_numpy', [False, True])
+def test_process_block(benchmark, monkeypatch, use_numpy):
+    import max30105
+    if use_numpy:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(max30105, 'numpy', None)
+    heartrate = HeartRate(None)
+    block = _ir(FIFO_DEPTH)
+    benchmark(heartrate.process_block, block)
+
+
+def test_track_beats(benchmark):
+    samples = _ir(1000)
+    timestamps = [x / 100.0 for x in range(1000)]
+
+    def track():
+        heartrate = HeartRate(None)
+        heartrate.reset(4)
+        return heartrate.track_beats(samples, timestamps)
+
+    beats = benchmark(track)
+    assert len(beats) > 0
@@ -0,0 +1,29 @@
+import pytest
+
+
+class FakeClock(object):
+    """Simulated time, moved on by the benchmarks rather than the wall clock."""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture()
+def simulated_sensor():
+    """Return a factory for a MAX30105 set up on a `SimulatedSMBus` driven by a `FakeClock`."""
+    from max30105 import MAX30105
+    from max30105.simulator import SimulatedSMBus, PPGSource
+
+    def factory(leds_enable=3, sample_average=4, sample_rate=400):
+        clock = FakeClock()
+        bus = SimulatedSMBus(source=PPGSource(seed=0, noise=0), clock=clock, sleep=clock.sleep)
+        max30105 = MAX30105(i2c_dev=bus, clock=bus.get_time, sleep=bus.sleep)
+        max30105.setup(leds_enable=leds_enable, sample_average=sample_average, sample_rate=sample_rate)
+        return max30105, bus, clock
+
+    return factory
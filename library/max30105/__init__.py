@@ -1,20 +1,154 @@
 """MAX30105 Driver."""
 from i2cdevice import Device, Register, BitField, _int_to_bytes
 from i2cdevice.adapter import LookupAdapter, Adapter
+from array import array
+import bisect
+import ctypes
+import operator
 import struct
+import sys
 import time
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from smbus2 import i2c_msg
+except ImportError:
+    i2c_msg = None
+
+from . import filters
+
 
 __version__ = '0.0.5'
 
 CHIP_ID = 0x15
 I2C_ADDRESS = 0x57
 
+# The FIFO holds 32 samples of up to 4 slots, each slot a 3-byte word
+FIFO_DEPTH = 32
+FIFO_MAX_SLOTS = 4
+FIFO_WORD_SIZE = 3
+
+# Largest SMBus block transfer, in bytes
+SMBUS_BLOCK_MAX = 32
+
+# I2C_FUNCS bit for adapters that support plain I2C messages, and so i2c_rdwr
+I2C_FUNC_I2C = 0x00000001
+
+# array typecode for an unsigned 32bit sample word
+SAMPLE_TYPECODE = 'I' if array('I').itemsize == 4 else 'L'
+
+# Byte offsets of the FIFO word MSB, middle byte, LSB and zero pad in a native uint32
+if sys.byteorder == 'little':
+    _WORD_LAYOUT = (2, 1, 0, 3)
+else:
+    _WORD_LAYOUT = (1, 2, 3, 0)
+
+_ZEROS = bytearray(FIFO_DEPTH * FIFO_MAX_SLOTS)
+
+try:
+    monotonic = time.monotonic
+except AttributeError:  # Python 2
+    monotonic = time.time
+
+
+# Runs of configuration registers with contiguous addresses, which can be written in one burst
+_CONFIG_BLOCKS = (
+    ('FIFO_CONFIG', 'MODE_CONFIG', 'SPO2_CONFIG'),
+    ('LED_PULSE_AMPLITUDE',),
+    ('LED_PROX_PULSE_AMPLITUDE', 'LED_MODE_CONTROL')
+)
+
 
 def bit(n):
     return 1 << n
 
 
+def sample_buffer(size=FIFO_DEPTH * FIFO_MAX_SLOTS, use_numpy=False):
+    """Allocate a zeroed buffer suitable for `MAX30105.get_samples_into`.
+
+    :param size: Number of sample words, defaults to a full FIFO of 4 slots
+    :param use_numpy: Return a numpy uint32 array instead of an array('I')
+
+    """
+    if use_numpy:
+        if numpy is None:
+            raise ImportError("This feature requires the numpy module\nInstall with: sudo pip install numpy")
+        return numpy.zeros(size, dtype=numpy.uint32)
+    return array(SAMPLE_TYPECODE, bytes(bytearray(size * 4)))
+
+
+def gpio_interrupt_wait(pin, gpio=None):
+    """Return a wait function that blocks on the MAX30105 INT pin.
+
+    The returned function accepts an optional timeout in seconds and returns
+    True once the active-low INT pin has been asserted, or False on timeout.
+
+    :param pin: BCM pin number the INT pin is connected to
+    :param gpio: GPIO module to use, defaults to RPi.GPIO
+
+    """
+    if gpio is None:
+        try:
+            import RPi.GPIO as gpio
+        except ImportError:
+            raise ImportError("This feature requires the RPi.GPIO module\nInstall with: sudo pip install RPi.GPIO")
+        gpio.setmode(gpio.BCM)
+        gpio.setwarnings(False)
+
+    gpio.setup(pin, gpio.IN, pull_up_down=gpio.PUD_UP)
+
+    def wait(timeout=None):
+        # INT stays low until the flag is cleared, so the edge may already have passed
+        if gpio.input(pin) == 0:
+            return True
+        if timeout is None:
+            return gpio.wait_for_edge(pin, gpio.FALLING) is not None
+        return gpio.wait_for_edge(pin, gpio.FALLING, timeout=max(1, int(timeout * 1000))) is not None
+
+    return wait
+
+
+def _decode_words(data, count, out):
+    """Decode count big-endian 24bit FIFO words from data into out.
+
+    :param data: bytearray or memoryview of raw FIFO bytes
+    :param count: Number of words to decode
+    :param out: array('I') or numpy uint32 array to decode into
+
+    """
+    if numpy is not None and isinstance(out, numpy.ndarray):
+        raw = numpy.frombuffer(data, dtype=numpy.uint8, count=count * FIFO_WORD_SIZE).reshape(count, FIFO_WORD_SIZE)
+        words = out[:count]
+        words[:] = raw[:, 0]
+        words <<= 8
+        words |= raw[:, 1]
+        words <<= 8
+        words |= raw[:, 2]
+        return
+
+    try:
+        view = memoryview(out).cast('B')
+    except (AttributeError, TypeError):
+        # Python 2 arrays do not support the buffer protocol
+        for x in range(count):
+            i = x * FIFO_WORD_SIZE
+            out[x] = (data[i] << 16) | (data[i + 1] << 8) | data[i + 2]
+        return
+
+    # Scatter each byte lane into place with one strided copy apiece
+    data = memoryview(data)
+    length = count * FIFO_WORD_SIZE
+    msb, mid, lsb, pad = _WORD_LAYOUT
+    view[msb:count * 4:4] = data[0:length:3]
+    view[mid:count * 4:4] = data[1:length:3]
+    view[lsb:count * 4:4] = data[2:length:3]
+    view[pad:count * 4:4] = memoryview(_ZEROS)[:count]
+
+
 class LEDModeAdapter(Adapter):
     LOOKUP = [
         'off',
@@ -29,7 +163,7 @@ class LEDModeAdapter(Adapter):
 
     def _decode(self, value):
         try:
-            return self.LOOPUP[value]
+            return self.LOOKUP[value]
         except IndexError:
             return 'off'
 
@@ -84,13 +218,405 @@ class SampleAdapter(Adapter):
         return struct.unpack('<LLL', b)
 
 
+class SampleFrames(object):
+    """A block of FIFO samples de-interleaved into one array per channel.
+
+    Channels are named after the slot mode that produced them, eg: `frames.red`,
+    `frames.ir` or `frames['green']`, and are listed in FIFO order in `channels`.
+
+    `dropped` holds the number of samples lost to FIFO overflow before this block.
+
+    `timestamps`, when available, holds the time of each sample, from `MAX30105.get_time`, see `SampleClock`.
+
+    `temperature` holds the latest die temperature, see `MAX30105.set_temperature_interval`.
+
+    """
+
+    def __init__(self, channels, columns, dropped=0, timestamps=None):
+        self.channels = tuple(channels)
+        self.dropped = dropped
+        self.timestamps = timestamps
+        self.temperature = None
+        self._columns = dict(zip(self.channels, columns))
+
+    def __len__(self):
+        if not self.channels:
+            return 0
+        return len(self._columns[self.channels[0]])
+
+    def __contains__(self, channel):
+        return channel in self._columns
+
+    def __getitem__(self, channel):
+        return self._columns[channel]
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._columns[name]
+        except KeyError:
+            raise AttributeError("No {} channel in frames".format(name))
+
+
+def _deinterleave(words, count, channels, dropped=0, timestamps=None):
+    """Split count interleaved sample words into per-channel SampleFrames."""
+    stride = len(channels)
+    return SampleFrames(channels, [words[x:count:stride] for x in range(stride)], dropped=dropped, timestamps=timestamps)
+
+
+def _timestamps(first, period, count, use_numpy=False):
+    """Return count timestamps, period apart from first, as a numpy float64 array if use_numpy, otherwise array('d')."""
+    if numpy is None:
+        return array('d', [first + x * period for x in range(count)])
+    stamps = numpy.arange(count, dtype=numpy.float64)
+    stamps *= period
+    stamps += first
+    return stamps if use_numpy else array('d', stamps.tobytes())
+
+
+class SampleClock(object):
+    def __init__(self, rate, phase_gain=0.1, rate_gain=0.01, tolerance=0.1):
+        """Reconstruct per-sample timestamps from the sensor's output data rate.
+
+        Samples are assumed to be evenly spaced at the nominal rate. Each FIFO
+        drain compares the predicted time of the newest sample with the time it
+        was read, and nudges both the phase and the period of the clock towards
+        it, so drift between the sensor's oscillator and the host is corrected.
+
+        :param rate: Nominal output data rate in samples per second
+        :param phase_gain: Fraction of each timing error corrected immediately
+        :param rate_gain: Fraction of each timing error folded into the estimated period
+        :param tolerance: Maximum fractional deviation of the period from nominal
+
+        """
+        self.nominal_period = 1.0 / rate
+        self.period = self.nominal_period
+        self.phase_gain = phase_gain
+        self.rate_gain = rate_gain
+        self.tolerance = tolerance
+        self._next = None
+
+    def reset(self):
+        """Forget the current phase, the next block will be anchored to its read time."""
+        self._next = None
+
+    def stamp(self, count, t_read, dropped=0):
+        """Return timestamps for a block of samples.
+
+        :param count: Number of samples in the block
+        :param t_read: `monotonic` time at which the FIFO was found to hold them
+        :param dropped: Number of samples lost to FIFO overflow before the block
+        :returns: array('d') of count timestamps
+
+        """
+        first, period = self.advance(count, t_read, dropped)
+        return _timestamps(first, period, count)
+
+    def advance(self, count, t_read, dropped=0):
+        """Account for a block of samples, like `stamp`, without building its timestamps.
+
+        :param count: Number of samples in the block
+        :param t_read: `monotonic` time at which the FIFO was found to hold them
+        :param dropped: Number of samples lost to FIFO overflow before the block
+        :returns: Time of the first sample, and the period between samples
+
+        """
+        period = self.period
+
+        if self._next is None or abs(t_read - self._next) > (FIFO_DEPTH + count + dropped) * period:
+            # First block, or we've lost track entirely: assume the newest sample has just arrived
+            first = t_read - (count - 1) * period
+        else:
+            first = self._next + dropped * period
+            newest = first + (count - 1) * period
+
+            # The newest sample arrived no later than the read, and no more than a period before it
+            error = 0
+            if newest > t_read:
+                error = t_read - newest
+            elif newest < t_read - period:
+                error = t_read - period - newest
+
+            if error:
+                # Never pull the clock back far enough to overlap the previous block
+                first += max(error * self.phase_gain, -0.5 * period)
+                period += error * self.rate_gain / (count + dropped)
+                period = min(max(period, self.nominal_period * (1 - self.tolerance)), self.nominal_period * (1 + self.tolerance))
+                self.period = period
+
+        self._next = first + count * period
+        return first, period
+
+
+class PollScheduler(object):
+    def __init__(self, max30105, target_fill=FIFO_DEPTH // 2, gain=0.5, min_interval=0.001):
+        """Poll a sensor's FIFO at an interval matched to its output data rate.
+
+        The interval starts at the time the FIFO takes to collect target_fill samples,
+        from the rate set by `setup` or `configure`. After each drain it is scaled by
+        how far the observed fill missed the target, so delays in the caller's loop,
+        and the difference between the sensor's clock and the host's, are corrected.
+
+        A low target_fill gives fresh samples but more bus transactions, a high one
+        fewer transactions at the cost of latency and less headroom before overflow.
+
+        :param max30105: Instance of a max30105 sensor to poll
+        :param target_fill: Number of samples, from 1 to 31, the FIFO should hold at each drain
+        :param gain: Fraction, from 0 to 1, of each fill error corrected in one step
+        :param min_interval: Shortest interval between drains, in seconds
+
+        """
+        if not 1 <= target_fill < FIFO_DEPTH:
+            raise ValueError("Invalid target_fill: {}".format(target_fill))
+        self.max30105 = max30105
+        self.target_fill = target_fill
+        self.gain = gain
+        self.min_interval = min_interval
+        self.interval = None
+        self._rate = None
+        self._next = None
+
+    def sleep(self):
+        """Sleep until the next drain is due."""
+        if self._next is not None:
+            delay = self._next - self.max30105.get_time()
+            if delay > 0:
+                self.max30105._sleep(delay)
+
+    def update(self, fill, dropped=0, t_read=None):
+        """Adjust the interval from the result of a drain.
+
+        :param fill: Number of samples drained
+        :param dropped: Number of samples lost to FIFO overflow before the drain
+        :param t_read: Time the drain started, from `MAX30105.get_time`, defaults to now
+        :returns: Time in seconds until the next drain is due
+
+        """
+        if t_read is None:
+            t_read = self.max30105.get_time()
+
+        rate = self.max30105.get_sample_rate()
+        if rate != self._rate:
+            # Start again from the nominal interval whenever the output rate changes
+            self._rate = rate
+            self.interval = self.target_fill / rate
+        elif dropped:
+            self.interval *= 0.5
+        else:
+            self.interval *= (float(self.target_fill) / max(fill, 0.5)) ** self.gain
+
+        # Never wait long enough for the FIFO to fill up
+        self.interval = min(max(self.interval, self.min_interval), (FIFO_DEPTH - 1) / rate)
+
+        self._next = t_read + self.interval
+        return max(self._next - self.max30105.get_time(), 0)
+
+    def get_frames(self, use_numpy=False):
+        """Sleep until the next drain is due, then drain the FIFO.
+
+        :param use_numpy: Return numpy uint32 arrays instead of array('I')
+        :returns: `SampleFrames`, or None if the FIFO is empty
+
+        """
+        self.sleep()
+        t_read = self.max30105.get_time()
+        frames = self.max30105.get_frames(use_numpy=use_numpy)
+        if frames is None:
+            self.update(0, 0, t_read)
+        else:
+            self.update(len(frames), frames.dropped, t_read)
+        return frames
+
+
+class Profile(object):
+    def __init__(self, mode=None, slots=None, led_power=None, pilot_power=None, sample_rate=None,
+                 sample_average=None, pulse_width=None, adc_range=None, fifo_rollover=None, fifo_almost_full=None):
+        """Declarative sensor settings, applied with `MAX30105.configure`.
+
+        Any setting left as None is not changed.
+
+        :param mode: Mode, either red_only, red_ir or green_red_ir
+        :param slots: Sequence of up to four slot modes, eg: ('red', 'ir', 'green', 'off')
+        :param led_power: LED pulse amplitude in milliamps, either one value for all LEDs or a (led1, led2, led3) tuple
+        :param pilot_power: Proximity mode pilot LED amplitude in milliamps
+        :param sample_rate: Sample rate in samples per second, from 50 to 3200
+        :param sample_average: Number of samples averaged per FIFO sample, 1, 2, 4, 8, 16 or 32
+        :param pulse_width: LED pulse width in microseconds, 69, 118, 215 or 411
+        :param adc_range: ADC full scale range in nA, 2048, 4096, 8192 or 16384
+        :param fifo_rollover: Whether the FIFO should roll over and overwrite old samples when full
+        :param fifo_almost_full: Number of free FIFO slots that triggers the almost-full flag, from 0 to 15
+
+        """
+        if slots is not None and len(slots) > 4:
+            raise ValueError("Invalid slots: {}, at most 4 supported".format(slots))
+
+        if led_power is not None and not isinstance(led_power, (tuple, list)):
+            led_power = (led_power, led_power, led_power)
+
+        if led_power is not None and len(led_power) != 3:
+            raise ValueError("Invalid led_power: {}, expected one value or three".format(led_power))
+
+        self.mode = mode
+        self.slots = None if slots is None else tuple(slots)
+        self.led_power = None if led_power is None else tuple(led_power)
+        self.pilot_power = pilot_power
+        self.sample_rate = sample_rate
+        self.sample_average = sample_average
+        self.pulse_width = pulse_width
+        self.adc_range = adc_range
+        self.fifo_rollover = fifo_rollover
+        self.fifo_almost_full = fifo_almost_full
+
+    def get_register_fields(self):
+        """Return the register fields this profile sets, as a dict of register name: {field: value}."""
+        fields = {
+            'FIFO_CONFIG': {
+                'sample_average': self.sample_average,
+                'fifo_rollover_en': self.fifo_rollover,
+                'fifo_almost_full': self.fifo_almost_full
+            },
+            'MODE_CONFIG': {
+                'mode': self.mode
+            },
+            'SPO2_CONFIG': {
+                'sample_rate_sps': self.sample_rate,
+                'adc_range_nA': self.adc_range,
+                'led_pw_us': self.pulse_width
+            },
+            'LED_PROX_PULSE_AMPLITUDE': {
+                'pilot_mA': self.pilot_power
+            },
+            'LED_PULSE_AMPLITUDE': {},
+            'LED_MODE_CONTROL': {}
+        }
+
+        if self.led_power is not None:
+            for led, power in enumerate(self.led_power):
+                fields['LED_PULSE_AMPLITUDE']['led{}_mA'.format(led + 1)] = power
+
+        if self.slots is not None:
+            for slot, mode in enumerate(self.slots):
+                fields['LED_MODE_CONTROL']['slot{}'.format(slot + 1)] = mode
+
+        result = {}
+        for register, values in fields.items():
+            values = dict((field, value) for field, value in values.items() if value is not None)
+            if values:
+                result[register] = values
+        return result
+
+
+class Decimator(object):
+    def __init__(self, factor, sample_rate=None, sample_average=1, cutoff=None, kernel=None):
+        """Reduce the rate of a stream of samples by an integer factor.
+
+        Samples are low-pass filtered to prevent aliasing, but the filter is only
+        evaluated at the samples that are kept, so the cost falls with the factor.
+        Filter history is kept between blocks, per channel.
+
+        :param factor: Number of input samples for each output sample
+        :param sample_rate: Sample rate the sensor is set up with, in samples per second
+        :param sample_average: Number of samples averaged into each FIFO sample
+        :param cutoff: Anti-aliasing cutoff frequency in Hz, defaults to 0.4 times the output rate
+        :param kernel: Symmetric integer FIR kernel, see `max30105.filters`, instead of designing one
+
+        """
+        self.factor = factor
+        if kernel is None:
+            if sample_rate is None:
+                raise ValueError("Decimator requires either sample_rate or kernel")
+            if cutoff is None:
+                cutoff = 0.4 * sample_rate / sample_average / factor
+            kernel = filters.bank.get_low_pass(sample_rate, sample_average, cutoff)
+        self.kernel = kernel
+        self.reset()
+
+    def reset(self):
+        """Forget the filter history of every channel."""
+        self._history = {}
+
+    def process(self, samples, channel=None):
+        """Decimate a block of samples.
+
+        :param samples: Sequence of samples, eg: `frames.ir`
+        :param channel: Name of the stream the samples belong to, each has its own history
+        :returns: Decimated samples, as a numpy int64 array if samples is a numpy array, otherwise a list
+
+        """
+        return self._process(samples, channel)[0]
+
+    def process_frames(self, frames):
+        """Decimate every channel of a block of `SampleFrames`.
+
+        Each output sample takes the timestamp of the newest input sample it was filtered from.
+
+        :param frames: `SampleFrames`, eg: from `MAX30105.get_frames`
+        :returns: `SampleFrames` of decimated samples
+
+        """
+        columns = []
+        ends = []
+        for channel in frames.channels:
+            column, ends = self._process(frames[channel], channel)
+            columns.append(column)
+
+        timestamps = frames.timestamps
+        if timestamps is not None:
+            if numpy is not None and isinstance(timestamps, numpy.ndarray):
+                timestamps = timestamps[numpy.asarray(ends, dtype=numpy.intp)]
+            else:
+                timestamps = array('d', [timestamps[x] for x in ends])
+
+        result = SampleFrames(frames.channels, columns, dropped=frames.dropped, timestamps=timestamps)
+        result.temperature = frames.temperature
+        return result
+
+    def _process(self, samples, channel):
+        kernel = self.kernel
+        taps = len(kernel)
+        factor = self.factor
+        is_numpy = numpy is not None and isinstance(samples, numpy.ndarray)
+
+        history = self._history.get(channel)
+        if history is None:
+            # Start as if the stream had been preceded by silence
+            history = [0] * (taps - 1)
+        length = len(history) + len(samples)
+        count = max(0, (length - taps) // factor + 1)
+
+        if numpy is not None:
+            signal = numpy.concatenate((numpy.asarray(history, dtype=numpy.int64), numpy.asarray(samples, dtype=numpy.int64)))
+            itemsize = signal.itemsize
+            windows = numpy.lib.stride_tricks.as_strided(signal, shape=(count, taps), strides=(factor * itemsize, itemsize))
+            result = windows.dot(numpy.asarray(kernel, dtype=numpy.int64)) >> 15
+            self._history[channel] = signal[count * factor:].copy()
+            if not is_numpy:
+                result = result.tolist()
+        else:
+            signal = list(history) + list(samples)
+            # The kernel is symmetric, so each output is a plain dot product with its window
+            result = [sum(map(operator.mul, kernel, signal[x:x + taps])) >> 15 for x in range(0, count * factor, factor)]
+            self._history[channel] = signal[count * factor:]
+
+        # Index in samples of the newest sample in each output's window
+        ends = [x * factor + taps - 1 - len(history) for x in range(count)]
+        return result, ends
+
+
 # HeartRate processing adapted from:
 # https://github.com/sparkfun/SparkFun_MAX3010x_Sensor_Library/blob/master/examples/Example5_HeartRate/
 class HeartRate:
-    def __init__(self, max30105):
+    def __init__(self, max30105, cutoff=None, band=None):
         """Initialise HeartRate detector.
 
+        By default samples are filtered with a fixed kernel designed for 25 samples per second.
+        Pass cutoff or band to filter with a kernel designed for the sensor's output data rate
+        instead, see `update_filter`.
+
         :param max30105: Instance of a max30105 sensor to read from.
+        :param cutoff: Low-pass cutoff frequency in Hz
+        :param band: Tuple of lower and upper band-pass cutoff frequencies in Hz
 
         """
         self.max30105 = max30105
@@ -110,16 +636,68 @@ class HeartRate:
 
         self.fir_coeffs = [172, 321, 579, 927, 1360, 1858, 2390, 2916, 3391, 3768, 4012, 4096]
 
+        self.cutoff = cutoff
+        self.band = band
+        self._kernel = None
+
+        self.reset(4)
+
+    def set_filter(self, kernel):
+        """Filter samples with a symmetric integer FIR kernel, see `max30105.filters`.
+
+        The filter history is cleared if the kernel changes.
+
+        :param kernel: Sequence of an odd number of taps, scaled so 1 << 15 is a gain of 1.0
+
+        """
+        if kernel is self._kernel:
+            return
+        taps = list(kernel)
+        if len(taps) % 2 == 0 or taps != taps[::-1]:
+            raise ValueError("Kernel must be symmetric with an odd number of taps")
+        self._kernel = kernel
+        self.fir_coeffs = taps[:len(taps) // 2 + 1]
+
+        # The ring buffer must be a power of two at least as long as the kernel
+        size = 32
+        while size < len(taps):
+            size <<= 1
+        self.buf = [0 for x in range(size)]
+        self.offset = 0
+
+    def update_filter(self):
+        """Switch to the kernel for the sensor's current output data rate, if cutoff or band was given.
+
+        Kernels come from the shared `max30105.filters.bank`, so switching back to a rate
+        that has been used before costs a dictionary lookup. Called automatically by
+        `process_block` and `on_beat`; call it after reconfiguring the sensor if you use
+        `low_pass_fir` or `check_for_beat` directly.
+
+        """
+        if self.max30105 is None or (self.cutoff is None and self.band is None):
+            return
+        sample_rate = self.max30105._sample_rate
+        sample_average = self.max30105._sample_average
+        if self.band is not None:
+            low, high = self.band
+            self.set_filter(filters.bank.get_band_pass(sample_rate, sample_average, low, high))
+        else:
+            self.set_filter(filters.bank.get_low_pass(sample_rate, sample_average, self.cutoff))
+
     def low_pass_fir(self, sample):
-        """Filter a sample using a low-pass FIR filter with a 32 sample buffer."""
-        self.buf[self.offset] = sample
-        z = self.fir_coeffs[11] * self.buf[(self.offset - 11) & 0x1f]
+        """Filter a sample using a low-pass FIR filter with a ring buffer of at least 32 samples."""
+        buf = self.buf
+        mask = len(buf) - 1
+        offset = self.offset
+        centre = len(self.fir_coeffs) - 1
 
-        for i in range(11):
-            z += self.fir_coeffs[i] * (self.buf[(self.offset - i) & 0x1f] + self.buf[(self.offset - 22 + i) & 0x1f])
+        buf[offset] = sample
+        z = self.fir_coeffs[centre] * buf[(offset - centre) & mask]
 
-        self.offset += 1
-        self.offset %= 32
+        for i in range(centre):
+            z += self.fir_coeffs[i] * (buf[(offset - i) & mask] + buf[(offset - centre * 2 + i) & mask])
+
+        self.offset = (offset + 1) & mask
         return z >> 15
 
     def average_dc_estimator(self, sample):
@@ -127,12 +705,70 @@ class HeartRate:
         self.ir_avg += (((sample << 15) - self.ir_avg) >> 4)
         return self.ir_avg >> 15
 
+    def process_block(self, samples):
+        """Run DC removal and the low-pass FIR filter over a block of samples.
+
+        Equivalent to, and bit-exact with, calling `average_dc_estimator` and
+        `low_pass_fir` on each sample in turn. Filter state is carried between
+        blocks and shared with the per-sample methods.
+
+        :param samples: Sequence of samples, eg: `frames.ir`
+        :returns: Filtered samples, as a numpy int64 array if samples is a numpy array, otherwise a list
+
+        """
+        self.update_filter()
+
+        is_numpy = numpy is not None and isinstance(samples, numpy.ndarray)
+        samples = samples.tolist() if hasattr(samples, 'tolist') else list(samples)
+        count = len(samples)
+
+        if count == 0:
+            # numpy.convolve swaps its operands when the signal is shorter than the kernel
+            return numpy.zeros(0, dtype=numpy.int64) if is_numpy else []
+
+        # The DC estimator is recursive with per-step rounding, so it can't be vectorised exactly
+        ir_avg = self.ir_avg
+        dc_removed = []
+        for sample in samples:
+            ir_avg += (((sample << 15) - ir_avg) >> 4)
+            dc_removed.append(sample - (ir_avg >> 15))
+        self.ir_avg = ir_avg
+
+        size = len(self.buf)
+        taps = len(self.fir_coeffs) * 2 - 1
+        history = [self.buf[(self.offset - taps + 1 + x) & (size - 1)] for x in range(taps - 1)]
+        kernel = self.fir_coeffs + self.fir_coeffs[-2::-1]
+
+        if numpy is not None:
+            result = numpy.convolve(numpy.array(history + dc_removed, dtype=numpy.int64),
+                                    numpy.array(kernel, dtype=numpy.int64), 'valid') >> 15
+        else:
+            # The kernel is symmetric, so each output is a plain dot product with its window
+            signal = history + dc_removed
+            result = [sum(map(operator.mul, kernel, signal[x:x + taps])) >> 15 for x in range(count)]
+
+        # Leave the ring buffer as if each sample had gone through low_pass_fir
+        tail = dc_removed[-size:]
+        for x, sample in enumerate(tail):
+            self.buf[(self.offset + count - len(tail) + x) & (size - 1)] = sample
+        self.offset = (self.offset + count) % size
+
+        if is_numpy:
+            return result
+        if numpy is not None:
+            return result.tolist()
+        return result
+
     def check_for_beat(self, sample):
         """Check for a single beat."""
+        ir_avg_est = self.average_dc_estimator(sample)
+        return self._check_edges(self.low_pass_fir(sample - ir_avg_est))
+
+    def _check_edges(self, ir_current):
+        """Track rising and falling edges of the filtered signal, returning True on a beat."""
         beat_detected = False
         ir_previous = self.ir_current
-        ir_avg_est = self.average_dc_estimator(sample)
-        self.ir_current = self.low_pass_fir(sample - ir_avg_est)
+        self.ir_current = ir_current
 
         if ir_previous < 0 and self.ir_current >= 0:
             self.ir_max = self.ir_signal_max
@@ -157,51 +793,489 @@ class HeartRate:
 
         return beat_detected
 
-    def on_beat(self, handler, average_over=4, delay=0.5):
+    def on_beat(self, handler, average_over=4, delay=0.5, wait=None):
         """Watch for heartbeat and call a function on every beat.
 
         :param handler: Function to call, should accept beat_detected, bpm and bpm_avg arguments
         :param average_over: Number of samples to average over
+        :param wait: Optional function that blocks until the INT pin is asserted, see `gpio_interrupt_wait`.
+            If supplied the FIFO is drained once per almost-full interrupt, raised with 17 samples unread,
+            otherwise it is polled by a `PollScheduler`. The almost-full count and enable are restored on return.
 
         """
-        bpm_vals = [0 for x in range(average_over)]
-        last_beat = time.time()
-        last_update = time.time()
-        bpm = 0
-        bpm_avg = 0
+        last_update = self._now()
         beat_detected = False
 
-        while True:
-            t = time.time()
+        self.reset(average_over)
 
-            samples = self.max30105.get_samples()
-            if samples is None:
-                continue
+        if wait is not None:
+            almost_full_count = self.max30105.get_fifo_almost_full_count()
+            almost_full_enable = self.max30105.get_fifo_almost_full_enable()
+            # Interrupt with 15 slots free, about half full, leaving time to drain before it overflows
+            self.max30105.set_fifo_almost_full_count(15)
+            self.max30105.set_fifo_almost_full_enable(True)
+        else:
+            scheduler = PollScheduler(self.max30105)
 
-            for sample_index in range(0, len(samples), 2):
-                sample = samples[sample_index + 1]
-                if self.check_for_beat(sample):
+        try:
+            while True:
+                if wait is None:
+                    frames = scheduler.get_frames()
+                else:
+                    frames = self.max30105.wait_for_frames(wait, timeout=delay)
+
+                t = self._now()
+
+                if frames is not None and self.track_beats(frames.ir, frames.timestamps):
                     beat_detected = True
-                    delta = t - last_beat
-                    last_beat = t
-                    bpm = 60 / delta
-                    bpm_vals = bpm_vals[1:] + [bpm]
-                    bpm_avg = sum(bpm_vals) / average_over
 
-            if t - last_update >= delay:
-                if handler(beat_detected, bpm, bpm_avg):
-                    return
-                beat_detected = False
-                last_update = t
+                # Checked on a timeout too, so the handler still runs if INT never fires
+                if t - last_update >= delay:
+                    if handler(beat_detected, self.bpm, self.bpm_avg):
+                        return
+                    beat_detected = False
+                    last_update = t
+        finally:
+            if wait is not None:
+                self.max30105.set_fifo_almost_full_count(almost_full_count)
+                self.max30105.set_fifo_almost_full_enable(almost_full_enable)
+
+    def reset(self, average_over=4):
+        """Reset the beats-per-minute history ready to track a new run of beats.
+
+        Called by `on_beat`, call it before using `track_beats` from your own loop.
+
+        :param average_over: Number of beats to average bpm_avg over
+
+        """
+        self._bpm_vals = [0 for x in range(average_over)]
+        self._last_beat = self._now()
+        self.bpm = 0
+        self.bpm_avg = 0
+
+    def _now(self):
+        """Return the current time from the sensor's clock, see `MAX30105.get_time`."""
+        if self.max30105 is None:
+            return monotonic()
+        return self.max30105.get_time()
+
+    def track_beats(self, samples, timestamps=None):
+        """Check a block of IR samples for beats, and update bpm and bpm_avg.
+
+        This is the work `on_beat` does for each FIFO drain, use it to track beats from
+        your own loop, eg: `heartrate.track_beats(frames.ir, frames.timestamps)`.
+
+        :param samples: IR samples to process
+        :param timestamps: `monotonic` time of each sample, defaults to the current time for all of them
+        :returns: List of (timestamp, bpm, bpm_avg) tuples, one for each beat detected
+
+        """
+        if timestamps is None:
+            timestamps = [self._now()] * len(samples)
+
+        beats = []
+        for ir_current, t in zip(self.process_block(samples), timestamps):
+            if self._check_edges(ir_current):
+                delta = t - self._last_beat
+                self._last_beat = t
+                if delta > 0:
+                    self.bpm = 60 / delta
+                    self._bpm_vals = self._bpm_vals[1:] + [self.bpm]
+                    self.bpm_avg = sum(self._bpm_vals) / len(self._bpm_vals)
+                beats.append((t, self.bpm, self.bpm_avg))
+        return beats
+
+
+# Window function, bin frequencies and band for each (size, nfft, rate, low, high), see SpectralHeartRate
+_spectral_windows = {}
+
+
+class SpectralHeartRate(HeartRate):
+    def __init__(self, max30105, window=8.0, hop=1.0, low=0.7, high=3.5, sample_rate=None):
+        """Initialise a heart rate estimator based on the spectrum of the IR signal.
+
+        Rather than timing individual beats, a sliding window of IR samples is transformed
+        with a Hann-windowed real FFT every hop, and the strongest frequency in the band of
+        plausible heart rates is taken as the heart rate. Window functions and bin
+        frequencies are cached per window size and sample rate.
+
+        Use `on_beat` exactly as with `HeartRate`, the handler's beat_detected argument is
+        True if a new estimate has been made since the last call.
+
+        :param max30105: Instance of a max30105 sensor to read from.
+        :param window: Length of the sliding window in seconds, longer windows give finer resolution
+        :param hop: Time between estimates in seconds
+        :param low: Lowest heart rate to report in Hz, 0.7Hz is 42bpm
+        :param high: Highest heart rate to report in Hz, 3.5Hz is 210bpm
+        :param sample_rate: Rate samples arrive at, in samples per second, defaults to the sensor's `get_sample_rate`
+
+        """
+        if numpy is None:
+            raise ImportError("This feature requires the numpy module\nInstall with: sudo pip install numpy")
+
+        HeartRate.__init__(self, max30105)
+        self.window = window
+        self.hop = hop
+        self.low = low
+        self.high = high
+        self.sample_rate = sample_rate
+        self.confidence = 0.0
+
+    def get_sample_rate(self):
+        """Return the rate samples arrive at, in samples per second."""
+        if self.sample_rate is not None:
+            return self.sample_rate
+        if self.max30105 is None:
+            raise ValueError("SpectralHeartRate requires a sensor or a sample_rate")
+        return self.max30105.get_sample_rate()
+
+    def _get_window(self, size, rate):
+        # Zero pad to at least 4 bins per Hz so the peak can be interpolated accurately
+        nfft = 1
+        while nfft < max(size, 4 * rate):
+            nfft <<= 1
+        key = (size, nfft, rate, self.low, self.high)
+        cached = _spectral_windows.get(key)
+        if cached is None:
+            freqs = numpy.fft.rfftfreq(nfft, 1.0 / rate)
+            band = numpy.flatnonzero((freqs >= self.low) & (freqs <= self.high))
+            if len(band) == 0:
+                raise ValueError("No FFT bins from {}Hz to {}Hz at {}sps".format(self.low, self.high, rate))
+            # Bins either side of a peak in the main lobe of the Hann window
+            lobe = -(-2 * nfft // size)
+            cached = _spectral_windows[key] = (numpy.hanning(size), nfft, freqs, band[0], band[-1] + 1, lobe)
+        return cached
+
+    def reset(self, average_over=4):
+        """Reset the estimates, and the sliding window, ready to track a new run of beats.
+
+        :param average_over: Number of estimates to average bpm_avg over
+
+        """
+        HeartRate.reset(self, average_over)
+        self._rate = None
+
+    def _configure(self, rate):
+        self._rate = rate
+        self._window_size = max(int(round(self.window * rate)), 8)
+        self._hop_size = max(int(round(self.hop * rate)), 1)
+        self._buffer = numpy.zeros(0, dtype=numpy.float64)
+        self._pending = 0
+
+    def estimate(self, samples, sample_rate=None):
+        """Estimate the heart rate of a window of IR samples.
+
+        :param samples: Sequence of samples, several heartbeats long
+        :param sample_rate: Rate of the samples in samples per second, defaults to `get_sample_rate`
+        :returns: Heart rate in beats per minute, and the fraction of in-band power around the peak
+
+        """
+        if sample_rate is None:
+            sample_rate = self.get_sample_rate()
+        hann, nfft, freqs, start, stop, lobe = self._get_window(len(samples), sample_rate)
+        samples = numpy.asarray(samples, dtype=numpy.float64)
+        power = numpy.abs(numpy.fft.rfft((samples - samples.mean()) * hann, nfft)[start:stop]) ** 2
+        total = power.sum()
+        if total == 0:
+            return 0.0, 0.0
+
+        peak = int(power.argmax())
+        offset = 0.0
+        if 0 < peak < len(power) - 1:
+            # Fit a parabola through the peak and its neighbours for a fraction of a bin
+            a, b, c = numpy.log(power[peak - 1:peak + 2] + 1e-12)
+            if a - 2 * b + c < 0:
+                offset = 0.5 * (a - c) / (a - 2 * b + c)
+
+        frequency = freqs[start + peak] + offset * (freqs[1] - freqs[0])
+        return 60.0 * frequency, float(power[max(peak - lobe, 0):peak + lobe + 1].sum() / total)
+
+    def track_beats(self, samples, timestamps=None):
+        """Add a block of IR samples to the window, and update bpm and bpm_avg every hop.
+
+        :param samples: IR samples to process
+        :param timestamps: `monotonic` time of each sample, defaults to the current time for all of them
+        :returns: List of (timestamp, bpm, bpm_avg) tuples, one for each estimate made
+
+        """
+        rate = self.get_sample_rate()
+        if rate != self._rate:
+            self._configure(rate)
+
+        size = self._window_size
+        hop = self._hop_size
+        history = len(self._buffer)
+        signal = numpy.concatenate((self._buffer, numpy.asarray(samples, dtype=numpy.float64)))
+
+        estimates = []
+        # Index in samples of the last sample of each hop that ends in this block
+        for x in range(hop - self._pending - 1, len(samples), hop):
+            end = history + x + 1
+            if end < size:
+                continue
+            self.bpm, self.confidence = self.estimate(signal[end - size:end], rate)
+            self._bpm_vals = self._bpm_vals[1:] + [self.bpm]
+            self.bpm_avg = sum(self._bpm_vals) / len(self._bpm_vals)
+            t = timestamps[x] if timestamps is not None else self._now()
+            estimates.append((t, self.bpm, self.bpm_avg))
+
+        self._pending = (self._pending + len(samples)) % hop
+        self._buffer = signal[-size:].copy()
+        return estimates
+
+
+class Oximeter(object):
+    def __init__(self, heartrate=None, window_size=100, channels=('red', 'ir'), calibration=(-45.060, 30.354, 94.845)):
+        """Initialise a blood oxygen saturation (SpO2) and perfusion index estimator.
+
+        The AC and DC components of each channel are tracked as a running minimum, maximum
+        and mean over a window, normally one heartbeat long, and each completed window
+        yields a ratio of ratios, R = (AC_red / DC_red) / (AC_ir / DC_ir), an SpO2 estimate
+        from a quadratic in R, and a perfusion index, 100 * AC / DC, for each channel.
+
+        Requires the sensor to be set up with the red and IR LEDs, eg: `setup(leds_enable=2)`.
+
+        NOTE! The default calibration is from Maxim's reference design and is not accurate for
+        any particular sensor, enclosure or person. This is not a medical device.
+
+        :param heartrate: `HeartRate` to find beats in the IR channel with, windows run from one beat to the next.
+            If not supplied, windows are window_size samples long instead.
+        :param window_size: Number of samples in each window, if no heartrate is supplied
+        :param channels: Channels to track, must include 'red' and 'ir'
+        :param calibration: Coefficients (a, b, c) of SpO2 = a * R^2 + b * R + c
+
+        """
+        self.heartrate = heartrate
+        self.window_size = window_size
+        self.channels = tuple(channels)
+        self.calibration = calibration
+        if 'red' not in self.channels or 'ir' not in self.channels:
+            raise ValueError("Oximeter requires the red and ir channels")
+        self.reset()
+
+    def reset(self):
+        """Discard the current window and the latest readings."""
+        # Running minimum, maximum, total and count of the current window, per channel
+        self._windows = dict((channel, [None, None, 0, 0]) for channel in self.channels)
+        # With a heartrate, samples before the first beat aren't part of a whole beat
+        self._started = self.heartrate is None
+        self._last_timestamp = monotonic()
+        self.ratio = 0.0
+        self.spo2 = 0.0
+        self.perfusion = dict((channel, 0.0) for channel in self.channels)
+
+    def update(self, frames):
+        """Add a block of samples, and update ratio, spo2 and perfusion for every completed window.
+
+        :param frames: `SampleFrames` including each tracked channel, eg: from `MAX30105.get_frames`
+        :returns: List of (timestamp, ratio, spo2, perfusion) tuples, one for each window completed,
+            where perfusion is the IR perfusion index
+
+        """
+        for channel in self.channels:
+            if channel not in frames:
+                raise ValueError("No {} channel in frames".format(channel))
+
+        count = len(frames)
+        timestamps = frames.timestamps
+
+        if self.heartrate is not None:
+            beats = self.heartrate.track_beats(frames.ir, timestamps)
+            if timestamps is None:
+                # Without sample times beats can't be placed, so close windows at the end of the block
+                boundaries = [count] if beats else []
+            else:
+                boundaries = [bisect.bisect_left(timestamps, t) for t, bpm, bpm_avg in beats]
+        else:
+            filled = self._windows[self.channels[0]][3]
+            boundaries = range(self.window_size - filled, count + 1, self.window_size)
+
+        readings = []
+        start = 0
+        for end in boundaries:
+            self._accumulate(frames, start, end)
+            if self._started:
+                reading = self._complete()
+                if reading is not None:
+                    if end > 0 and timestamps is not None:
+                        t = timestamps[end - 1]
+                    else:
+                        t = self._last_timestamp
+                    readings.append((t,) + reading)
+            self._started = True
+            start = end
+        self._accumulate(frames, start, count)
+
+        self._last_timestamp = timestamps[-1] if timestamps is not None and count else monotonic()
+        return readings
+
+    def _accumulate(self, frames, start, end):
+        """Fold samples start to end of each channel into the current window."""
+        if not self._started or end <= start:
+            return
+        for channel in self.channels:
+            samples = frames[channel][start:end]
+            window = self._windows[channel]
+            if numpy is not None and isinstance(samples, numpy.ndarray):
+                low, high, total = int(samples.min()), int(samples.max()), int(samples.sum(dtype=numpy.int64))
+            else:
+                # The builtins loop in C over lists and arrays
+                low, high, total = min(samples), max(samples), sum(samples)
+            window[0] = low if window[0] is None else min(window[0], low)
+            window[1] = high if window[1] is None else max(window[1], high)
+            window[2] += total
+            window[3] += end - start
+
+    def _complete(self):
+        """Finish the current window, returning (ratio, spo2, ir perfusion), or None if it was unusable."""
+        windows = self._windows
+        self._windows = dict((channel, [None, None, 0, 0]) for channel in self.channels)
+
+        ratios = {}
+        for channel in self.channels:
+            low, high, total, count = windows[channel]
+            if count == 0 or total == 0:
+                return None
+            ratios[channel] = float(high - low) * count / total
+
+        if ratios['ir'] == 0:
+            return None
+
+        for channel in self.channels:
+            self.perfusion[channel] = 100.0 * ratios[channel]
+        self.ratio = ratios['red'] / ratios['ir']
+        a, b, c = self.calibration
+        self.spo2 = min(100.0, max(0.0, a * self.ratio ** 2 + b * self.ratio + c))
+        return self.ratio, self.spo2, self.perfusion['ir']
+
+
+class ParticleDetector(object):
+    def __init__(self, mean_size=20, delta_size=10, threshold=10):
+        """Detect changes in reflected light, such as particles or smoke passing the sensor.
+
+        Each sample is smoothed with a rolling mean, and a change is detected when
+        the mean rises by more than threshold over delta_size samples. Memory use
+        and the cost of each sample are constant, whatever the window sizes.
+
+        :param mean_size: Number of samples in the rolling mean, increase for more smoothing
+        :param delta_size: Number of rolling means between the two compared, decrease for faster detection
+        :param threshold: Rise in the rolling mean at which a change is detected
+
+        """
+        self.mean_size = mean_size
+        self.delta_size = delta_size
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self):
+        """Forget every sample seen so far."""
+        self._values = [0] * self.mean_size
+        self._means = [0.0] * self.delta_size
+        self._count = 0
+        self._sum = 0
+        self.mean = 0.0
+        self.delta = 0.0
+        self.detected = False
+
+    def update(self, samples):
+        """Process a block of samples, eg: `frames.green`.
+
+        After the call `mean`, `delta` and `detected` hold the state at the last sample.
+
+        :param samples: Sequence of samples
+        :returns: True if a change was detected at any sample in the block
+
+        """
+        values = self._values
+        means = self._means
+        mean_size = self.mean_size
+        delta_size = self.delta_size
+        threshold = self.threshold
+        count = self._count
+        total = self._sum
+        mean = self.mean
+        delta = self.delta
+        detected = False
+
+        for sample in samples:
+            index = count % mean_size
+            if count >= mean_size:
+                total -= values[index]
+            values[index] = sample
+            total += sample
+            count += 1
+
+            if index == mean_size - 1:
+                # Resynchronise the running sum once per window, so float error can't build up
+                total = sum(values)
+
+            mean = total / float(min(count, mean_size))
+            means[count % delta_size] = mean
+
+            if count > delta_size:
+                # Compare with the mean delta_size - 1 samples ago
+                delta = mean - means[(count + 1) % delta_size]
+            else:
+                delta = 0
+
+            if delta > threshold:
+                detected = True
+
+        self._count = count
+        self._sum = total
+        self.mean = mean
+        self.delta = delta
+        self.detected = delta > threshold
+
+        return detected
 
 
 class MAX30105:
-    def __init__(self, i2c_addr=I2C_ADDRESS, i2c_dev=None):
+    def __init__(self, i2c_addr=I2C_ADDRESS, i2c_dev=None, max_transfer=SMBUS_BLOCK_MAX, i2c_rdwr=None, clock=None, sleep=None):
+        """Initialise the MAX30105.
+
+        The FIFO status registers are fetched in one block read. If the bus supports
+        combined transfers with `i2c_rdwr`, as smbus2 does, the FIFO data follows in one
+        more, otherwise in block reads of up to max_transfer bytes, split on whole samples.
+
+        :param i2c_addr: I2C address of the sensor
+        :param i2c_dev: SMBus instance, defaults to smbus2.SMBus(1)
+        :param max_transfer: Largest block read the bus adapter supports, in bytes
+        :param i2c_rdwr: True to read the FIFO with `i2c_rdwr`, False to use block reads,
+            or None to use `i2c_rdwr` if the bus and its adapter support it
+        :param clock: Function returning the time in seconds, used to timestamp samples and schedule drains,
+            defaults to `monotonic`. Pass `SimulatedSMBus.get_time` to run faster than real time.
+        :param sleep: Function that sleeps for a number of seconds of clock time, defaults to `time.sleep`
+
+        """
+        self._monotonic = clock if clock is not None else monotonic
+        self._sleep = sleep if sleep is not None else time.sleep
         self._is_setup = False
         self._i2c_addr = i2c_addr
         self._i2c_dev = i2c_dev
         self._active_leds = 0
-        self._max30105 = Device(I2C_ADDRESS, i2c_dev=self._i2c_dev, bit_width=8, registers=(
+        self._mode = 'none'
+        self._slots = ['off', 'off', 'off', 'off']
+        self._channels = ()
+        self._overflow = 0
+        self._temperature = None
+        self.set_temperature_interval(None)
+        # Reset defaults until setup() says otherwise
+        self._sample_rate = 50
+        self._sample_average = 1
+        self._clock = SampleClock(self.get_sample_rate())
+        # Time of the first sample of the last read, the period between samples and the number of samples
+        self._timing = None
+        self._fifo_buf = bytearray(FIFO_DEPTH * FIFO_MAX_SLOTS * FIFO_WORD_SIZE)
+        self._fifo_count = 0
+        self._fifo_fill = 0
+        self._fifo_full = False
+        self._instrumentation = None
+        self._samples = sample_buffer()
+        # Configuration registers are non-volatile: i2cdevice keeps a write-through
+        # shadow of their value so setting a field doesn't need to read it back first.
+        # Status, FIFO and temperature registers are changed by the sensor and always read.
+        self._max30105 = Device(self._i2c_addr, i2c_dev=self._i2c_dev, bit_width=8, registers=(
             Register('INT_STATUS_1', 0x00, fields=(
                 BitField('a_full', bit(7)),
                 BitField('data_ready', bit(6)),
@@ -217,15 +1291,15 @@ class MAX30105:
                 BitField('data_ready_en', bit(6)),
                 BitField('alc_overflow_en', bit(5)),
                 BitField('prox_int_en', bit(4)),
-            )),
+            ), volatile=False),
             Register('INT_ENABLE_2', 0x03, fields=(
                 BitField('die_temp_ready_en', bit(1)),
-            )),
+            ), volatile=False),
             # Points to MAX30105 write location in FIFO
             Register('FIFO_WRITE', 0x04, fields=(
                 BitField('pointer', 0b00011111),
             )),
-            # Counts the number of samples lost up to 0xf
+            # Counts the number of samples lost up to 0x1f
             Register('FIFO_OVERFLOW', 0x05, fields=(
                 BitField('counter', 0b00011111),
             )),
@@ -244,7 +1318,7 @@ class MAX30105:
                 })),
                 BitField('fifo_rollover_en', 0b00010000),
                 BitField('fifo_almost_full', 0b00001111)
-            )),
+            ), volatile=False),
             Register('MODE_CONFIG', 0x09, fields=(
                 BitField('shutdown', 0b10000000),
                 BitField('reset', 0b01000000),
@@ -254,7 +1328,7 @@ class MAX30105:
                     'red_ir': 0b011,
                     'green_red_ir': 0b111
                 }))
-            )),
+            ), volatile=False),
             Register('SPO2_CONFIG', 0x0A, fields=(
                 BitField('adc_range_nA', 0b01100000, adapter=LookupAdapter({
                     2048: 0b00,
@@ -278,119 +1352,414 @@ class MAX30105:
                     215: 0b10,  # 215.44us
                     411: 0b11   # 410.75us
                 }))
-            )),
+            ), volatile=False),
             Register('LED_PULSE_AMPLITUDE', 0x0C, fields=(
                 BitField('led1_mA', 0xff0000, adapter=PulseAmplitudeAdapter()),
                 BitField('led2_mA', 0x00ff00, adapter=PulseAmplitudeAdapter()),
                 BitField('led3_mA', 0x0000ff, adapter=PulseAmplitudeAdapter())
-            ), bit_width=24),
+            ), bit_width=24, volatile=False),
             Register('LED_PROX_PULSE_AMPLITUDE', 0x10, fields=(
                 BitField('pilot_mA', 0xff, adapter=PulseAmplitudeAdapter()),
-            )),
+            ), volatile=False),
             # The below represent 4 timeslots
             Register('LED_MODE_CONTROL', 0x11, fields=(
                 BitField('slot2', 0x7000, adapter=LEDModeAdapter()),
                 BitField('slot1', 0x0700, adapter=LEDModeAdapter()),
                 BitField('slot4', 0x0070, adapter=LEDModeAdapter()),
                 BitField('slot3', 0x0007, adapter=LEDModeAdapter())
-            ), bit_width=16),
+            ), bit_width=16, volatile=False),
             Register('DIE_TEMP', 0x1f, fields=(
                 BitField('temperature', 0xffff, adapter=TemperatureAdapter()),
             ), bit_width=16),
             Register('DIE_TEMP_CONFIG', 0x21, fields=(
                 BitField('temp_en', bit(0)),
-            )),
+            ), volatile=False),
             Register('PROX_INT_THRESHOLD', 0x30, fields=(
                 BitField('threshold', 0xff),
-            )),
+            ), volatile=False),
             Register('PART_ID', 0xfe, fields=(
                 BitField('revision', 0xff00),
                 BitField('part', 0x00ff)
             ), bit_width=16)
         ))
 
+        self._max_transfer = max_transfer
+        if i2c_rdwr and i2c_msg is None:
+            raise ImportError("This feature requires the smbus2 module\nInstall with: sudo pip install smbus2")
+        # If i2c_rdwr was only detected, a failure falls back to block reads rather than raising
+        self._i2c_rdwr_fallback = i2c_rdwr is None
+        self._i2c_rdwr = self._detect_i2c_rdwr() if i2c_rdwr is None else bool(i2c_rdwr)
+
     def setup(self, led_power=6.4, sample_average=4, leds_enable=3, sample_rate=400, pulse_width=215, adc_range=16384, timeout=5.0):
         """Set up the sensor."""
         if self._is_setup:
             return
         self._is_setup = True
 
-        self._active_leds = leds_enable
-
         self._max30105.select_address(self._i2c_addr)
 
         self.soft_reset(timeout=timeout)
 
-        self._max30105.set('FIFO_CONFIG',
-                           sample_average=sample_average,
-                           fifo_rollover_en=True)
+        # Set the LED mode based on the number of LEDs we want enabled,
+        # and set up the LEDs requested in sequential slots
+        self.configure(Profile(
+            mode=['red_only', 'red_ir', 'green_red_ir'][leds_enable - 1],
+            slots=['red',
+                   'ir' if leds_enable >= 2 else 'off',
+                   'green' if leds_enable >= 3 else 'off',
+                   'off'],
+            led_power=led_power,
+            pilot_power=led_power,
+            sample_rate=sample_rate,
+            sample_average=sample_average,
+            pulse_width=pulse_width,
+            adc_range=adc_range,
+            fifo_rollover=True
+        ))
 
-        self._max30105.set('SPO2_CONFIG',
-                           sample_rate_sps=sample_rate,
-                           adc_range_nA=adc_range,
-                           led_pw_us=pulse_width)
+        self.clear_fifo()
 
-        self._max30105.set('LED_PULSE_AMPLITUDE',
-                           led1_mA=led_power,
-                           led2_mA=led_power,
-                           led3_mA=led_power)
+    def configure(self, profile):
+        """Apply a `Profile` of settings to the sensor.
 
-        self._max30105.set('LED_PROX_PULSE_AMPLITUDE', pilot_mA=led_power)
+        Only registers whose value changes are written, and neighbouring
+        registers are written together in as few block writes as possible.
 
-        # Set the LED mode based on the number of LEDs we want enabled
-        self._max30105.set('MODE_CONFIG',
-                           mode=['red_only', 'red_ir', 'green_red_ir'][leds_enable - 1])
+        :param profile: `Profile` of settings to apply
+        :returns: Number of block writes issued
 
-        # Set up the LEDs requested in sequential slots
-        self._max30105.set('LED_MODE_CONTROL',
-                           slot1='red',
-                           slot2='ir' if leds_enable >= 2 else 'off',
-                           slot3='green' if leds_enable >= 3 else 'off')
+        """
+        dev = self._max30105
+        originals = {}
 
-        self.clear_fifo()
+        try:
+            for register, fields in profile.get_register_fields().items():
+                originals[register] = dev.read_register(register)
+                dev.lock_register(register)
+                try:
+                    for field, value in fields.items():
+                        dev.set_field(register, field, value)
+                finally:
+                    dev.unlock_register(register)
+        except Exception:
+            # Nothing has been written yet, leave every shadow matching the sensor
+            for register, old in originals.items():
+                dev.values[register] = old
+            raise
+
+        changed = set(register for register, old in originals.items() if dev.values[register] != old)
+
+        writes = 0
+        for block in _CONFIG_BLOCKS:
+            data = []
+            first = last = None
+            for register in block:
+                width = dev.registers[register].bit_width // 8
+                if register in changed:
+                    if first is None:
+                        first = len(data)
+                    last = len(data) + width
+                data += list(_int_to_bytes(dev.values[register], width))
+
+            # Write from the first changed byte to the last, rewriting any unchanged registers in between
+            if first is not None:
+                address = dev.registers[block[0]].address + first
+                dev._i2c.write_i2c_block_data(self._i2c_addr, address, data[first:last])
+                writes += 1
+
+        if profile.mode is not None:
+            self._mode = profile.mode
+        if profile.slots is not None:
+            self._slots[:len(profile.slots)] = profile.slots
+        if profile.sample_rate is not None or profile.sample_average is not None:
+            # Read back from the shadow, since numeric settings snap to the nearest supported value
+            self._sample_rate = dev.get_field('SPO2_CONFIG', 'sample_rate_sps')
+            self._sample_average = dev.get_field('FIFO_CONFIG', 'sample_average')
+            self._clock = SampleClock(self.get_sample_rate())
+
+        self._update_layout()
+
+        return writes
 
     def soft_reset(self, timeout=5.0):
         """Reset device."""
         self._max30105.set('MODE_CONFIG', reset=True)
         t_start = time.time()
-        while self._max30105.get('MODE_CONFIG').reset and time.time() - t_start < timeout:
+        while self._get_reset() and time.time() - t_start < timeout:
             time.sleep(0.001)
-        if self._max30105.get('MODE_CONFIG').reset:
+        if self._get_reset():
             raise RuntimeError("Timeout: Failed to soft reset MAX30105.")
 
+        # Every configuration register is back to its reset value of zero
+        for register in self._max30105.registers.values():
+            if not register.volatile:
+                self._max30105.values[register.name] = 0
+                register.is_read = True
+
+    def _get_reset(self):
+        """Read the self-clearing reset bit from the sensor, bypassing its shadow."""
+        self._invalidate('MODE_CONFIG')
+        return self._max30105.get('MODE_CONFIG').reset
+
+    def _invalidate(self, register):
+        """Discard the shadow of a register so it's read from the sensor on next use."""
+        self._max30105.registers[register].is_read = False
+
     def clear_fifo(self):
         """Clear samples FIFO."""
-        self._max30105.set('FIFO_READ', pointer=0)
-        self._max30105.set('FIFO_WRITE', pointer=0)
-        self._max30105.set('FIFO_OVERFLOW', counter=0)
+        # FIFO_WRITE, FIFO_OVERFLOW and FIFO_READ are contiguous, clear them in one write
+        self._max30105._i2c.write_i2c_block_data(self._i2c_addr, 0x04, [0, 0, 0])
 
     def get_samples(self):
         """Return contents of sample FIFO."""
-        ptr_r = self._max30105.get('FIFO_READ').pointer
-        ptr_w = self._max30105.get('FIFO_WRITE').pointer
+        count = self.get_samples_into(self._samples)
 
-        if ptr_r == ptr_w:
+        if count == 0:
             return None
 
-        sample_count = ptr_w - ptr_r
-        if sample_count < 0:
-            sample_count = 32
+        return self._samples[:count].tolist()
 
-        byte_count = sample_count * 3 * self._active_leds
+    def get_frames(self, use_numpy=False):
+        """Return contents of sample FIFO de-interleaved into per-channel arrays.
 
-        data = []
+        Channels are laid out according to the current mode and LED slots.
 
-        while byte_count > 0:
-            data += self._max30105._i2c.read_i2c_block_data(self._i2c_addr, 0x07, min(byte_count, 32))
-            byte_count -= 32
+        :param use_numpy: Return numpy uint32 arrays instead of array('I')
+        :returns: `SampleFrames`, or None if the FIFO is empty
 
-        self.clear_fifo()
+        """
+        if use_numpy:
+            words = sample_buffer(use_numpy=True)
+        else:
+            words = self._samples
 
-        result = []
-        for x in range(0, len(data), 3):
-            result.append((data[x] << 16) | (data[x + 1] << 8) | data[x + 2])
+        count = self.get_samples_into(words)
 
-        return result
+        if self._temperature_interval is not None:
+            self._update_temperature()
+
+        if count == 0:
+            return None
+
+        # Timestamps are only built for frames, so get_samples and get_samples_into don't pay for them
+        timestamps = _timestamps(*self._timing, use_numpy=use_numpy)
+        frames = _deinterleave(words, count, self._channels, dropped=self._overflow, timestamps=timestamps)
+        frames.temperature = self._temperature
+        return frames
+
+    def wait_for_frames(self, wait, timeout=None, use_numpy=False):
+        """Block until the sensor raises an interrupt, then drain the FIFO once.
+
+        Enable the interrupt source first, usually with `set_fifo_almost_full_enable`
+        and `set_fifo_almost_full_count`, or `set_data_ready_enable`.
+        Reading the FIFO clears the A_FULL and DATA_RDY flags and releases the INT pin.
+
+        :param wait: Function accepting a timeout in seconds that blocks until INT is asserted, see `gpio_interrupt_wait`
+        :param timeout: Maximum time to wait in seconds, or None to wait forever
+        :param use_numpy: Return numpy uint32 arrays instead of array('I')
+        :returns: `SampleFrames`, or None on timeout or if the FIFO is empty
+
+        """
+        if not wait(timeout):
+            return None
+
+        frames = self.get_frames(use_numpy=use_numpy)
+
+        if frames is None and self.get_fifo_almost_full_status():
+            # With an almost-full count of 0, A_FULL is raised with all 32 samples unread.
+            # The pointers are then equal, just as if the FIFO were empty, so read it as full.
+            self._fifo_full = True
+            frames = self.get_frames(use_numpy=use_numpy)
+
+        return frames
+
+    def get_time(self):
+        """Return the time, in seconds, from the clock samples are timestamped with."""
+        return self._monotonic()
+
+    def get_sample_rate(self):
+        """Return the rate, in samples per second, at which samples arrive in the FIFO.
+
+        This is the sample rate passed to `setup` divided by the sample averaging.
+
+        """
+        return float(self._sample_rate) / self._sample_average
+
+    def get_channels(self):
+        """Return the channel names present in each FIFO sample, in FIFO order."""
+        return self._channels
+
+    def _update_layout(self):
+        """Work out which channels the FIFO holds from the mode and LED slots."""
+        if self._mode == 'red_only':
+            channels = ['red']
+        elif self._mode == 'red_ir':
+            channels = ['red', 'ir']
+        elif self._mode == 'green_red_ir':
+            # Multi-LED mode stops at the first disabled slot
+            channels = []
+            for slot in self._slots:
+                if slot == 'off':
+                    break
+                channels.append(slot)
+        else:
+            channels = []
+
+        self._channels = tuple(channels)
+        self._active_leds = len(channels)
+
+    def get_samples_into(self, out):
+        """Read the contents of the sample FIFO into a caller-owned buffer.
+
+        Reusing the same buffer between calls avoids allocating a new
+        list of samples on every read.
+
+        :param out: array('I') or numpy uint32 array, see `sample_buffer`
+        :returns: Number of sample words written into out, 0 if the FIFO is empty
+
+        """
+        count = self._read_fifo()
+
+        if self._instrumentation is not None:
+            t_start = monotonic()
+            if count > 0:
+                _decode_words(self._fifo_buf, count, out)
+            samples = count // self._active_leds if count else 0
+            self._instrumentation.record_drain(self._fifo_fill, samples, self._overflow, monotonic() - t_start)
+        elif count > 0:
+            _decode_words(self._fifo_buf, count, out)
+
+        return count
+
+    def _read_fifo(self):
+        """Burst read the sample FIFO into the internal byte buffer.
+
+        Samples lost to overflow since the last read are available from `get_overflow_count`,
+        and the timing of the samples read is kept for `get_frames` to timestamp them.
+
+        :returns: Number of 3-byte words read
+
+        """
+        # FIFO_WRITE, FIFO_OVERFLOW and FIFO_READ are contiguous, fetch them in one burst
+        ptr_w, overflow, ptr_r = self._max30105._i2c.read_i2c_block_data(self._i2c_addr, 0x04, 3)
+        t_read = self._monotonic()
+        overflow &= 0x1f
+        self._overflow = overflow
+
+        sample_count = (ptr_w - ptr_r) % FIFO_DEPTH
+
+        # The pointers are equal when the FIFO is empty, or full
+        if sample_count == 0 and (overflow > 0 or self._fifo_full):
+            sample_count = FIFO_DEPTH
+        self._fifo_full = False
+
+        self._fifo_fill = sample_count
+
+        if sample_count == 0:
+            self._fifo_count = 0
+            return 0
+
+        first, period = self._clock.advance(sample_count, t_read, overflow)
+        self._timing = (first, period, sample_count)
+
+        byte_count = sample_count * FIFO_WORD_SIZE * self._active_leds
+
+        # Reading FIFO_DATA advances FIFO_READ, so the pointers are left alone
+        if self._i2c_rdwr:
+            try:
+                self._read_fifo_data_rdwr(byte_count)
+            except (IOError, OSError):
+                if not self._i2c_rdwr_fallback:
+                    raise
+                # The adapter turned out not to support plain I2C messages, nothing was read
+                self._i2c_rdwr = False
+                self._read_fifo_data_blocks(byte_count)
+        else:
+            self._read_fifo_data_blocks(byte_count)
+
+        self._fifo_count = byte_count // FIFO_WORD_SIZE
+        return self._fifo_count
+
+    def _detect_i2c_rdwr(self):
+        """Return True if the bus, and the adapter behind it, can run combined `i2c_rdwr` transactions."""
+        i2c = self._max30105._i2c
+        if i2c_msg is None or not hasattr(i2c, 'i2c_rdwr'):
+            return False
+        # smbus2 reads the adapter's I2C_FUNCS when the bus is opened, SMBus-only adapters lack I2C_FUNC_I2C
+        funcs = getattr(i2c, 'funcs', None)
+        if isinstance(funcs, int) and not funcs & I2C_FUNC_I2C:
+            return False
+        return True
+
+    def _read_fifo_data_rdwr(self, byte_count):
+        # Write the register address and read the data back after a repeated start
+        read = i2c_msg.read(self._i2c_addr, byte_count)
+        self._max30105._i2c.i2c_rdwr(i2c_msg.write(self._i2c_addr, [0x07]), read)
+        self._fifo_buf[:byte_count] = ctypes.string_at(read.buf, byte_count)
+
+    def _read_fifo_data_blocks(self, byte_count):
+        # Split on whole samples, so an interrupted drain never leaves FIFO_READ part way through one
+        sample_size = FIFO_WORD_SIZE * self._active_leds
+        chunk_size = self._max_transfer
+        if chunk_size >= sample_size:
+            chunk_size -= chunk_size % sample_size
+
+        i2c = self._max30105._i2c
+        offset = 0
+        while offset < byte_count:
+            chunk = i2c.read_i2c_block_data(self._i2c_addr, 0x07, min(byte_count - offset, chunk_size))
+            self._fifo_buf[offset:offset + len(chunk)] = bytearray(chunk)
+            offset += len(chunk)
+
+    def get_fifo_bytes(self):
+        """Return the raw bytes from the most recent FIFO read.
+
+        Each sample word is 3 bytes, big-endian, interleaved in the order given by `get_channels`.
+        The bytes are only valid until the next FIFO read.
+
+        :returns: memoryview of the raw FIFO bytes
+
+        """
+        return memoryview(self._fifo_buf)[:self._fifo_count * FIFO_WORD_SIZE]
+
+    def enable_instrumentation(self, callback=None):
+        """Count and time every bus transfer and FIFO drain.
+
+        :param callback: Function to call with an event name, 'transfer' or 'drain', and a dictionary of fields
+        :returns: `max30105.instrumentation.Instrumentation` holding the counters
+
+        """
+        from .instrumentation import Instrumentation, InstrumentedSMBus
+
+        if self._instrumentation is None:
+            names = dict((register.address, name) for name, register in self._max30105.registers.items())
+            names[0x07] = 'FIFO_DATA'
+            self._instrumentation = Instrumentation(names, callback)
+            self._max30105._i2c = InstrumentedSMBus(self._max30105._i2c, self._instrumentation)
+        else:
+            self._instrumentation.callback = callback
+
+        return self._instrumentation
+
+    def disable_instrumentation(self):
+        """Stop counting bus transfers and FIFO drains, and unwrap the bus."""
+        if self._instrumentation is not None:
+            self._max30105._i2c = self._max30105._i2c.i2c_dev
+            self._instrumentation = None
+
+    def get_instrumentation(self):
+        """Return a snapshot of the instrumentation counters, or None if instrumentation is disabled."""
+        if self._instrumentation is None:
+            return None
+        return self._instrumentation.snapshot()
+
+    def get_overflow_count(self):
+        """Return the number of samples lost to FIFO overflow before the most recent read.
+
+        The sensor counts up to 31 lost samples, and resets the count when samples are read.
+
+        """
+        return self._overflow
 
     def get_chip_id(self):
         """Return the revision and part IDs."""
@@ -402,19 +1771,72 @@ class MAX30105:
 
     def get_temperature(self, timeout=5.0):
         """Return the die temperature."""
-        self.setup()
-
-        self._max30105.set('INT_ENABLE_2', die_temp_ready_en=True)
-        self._max30105.set('DIE_TEMP_CONFIG', temp_en=True)
+        self.start_temperature()
         t_start = time.time()
 
-        while not self._max30105.get('INT_STATUS_2').die_temp_ready:
+        temperature = self.read_temperature()
+        while temperature is None:
             time.sleep(0.01)
             if time.time() - t_start > timeout:
                 raise RuntimeError('Timeout: Waiting for INT_STATUS_2, die_temp_ready.')
+            temperature = self.read_temperature()
+
+        return temperature
+
+    def start_temperature(self):
+        """Start a die temperature conversion, without waiting for it to finish.
 
+        Collect the result with `read_temperature`.
+
+        """
+        self.setup()
+
+        if not self._max30105.get_field('INT_ENABLE_2', 'die_temp_ready_en'):
+            self._max30105.set('INT_ENABLE_2', die_temp_ready_en=True)
+        self._max30105.set('DIE_TEMP_CONFIG', temp_en=True)
+        # temp_en clears itself once the conversion is under way
+        self._max30105.values['DIE_TEMP_CONFIG'] = 0
+
+    def read_temperature(self):
+        """Return the result of a conversion started by `start_temperature`, without blocking.
+
+        :returns: Die temperature in degrees C, or None if the conversion has not finished
+
+        """
+        if not self.get_die_temp_ready_status():
+            return None
         return self._max30105.get('DIE_TEMP').temperature
 
+    def set_temperature_interval(self, interval):
+        """Measure the die temperature in the background while reading samples.
+
+        Every `get_frames` call collects a finished conversion or, once interval
+        seconds have passed since the last one started, starts a new conversion.
+        The latest temperature is attached to each block as `frames.temperature`.
+
+        :param interval: Time in seconds between conversions, or None to stop measuring
+
+        """
+        self._temperature_interval = interval
+        self._temperature_pending = False
+        self._temperature_started = None
+
+    def _update_temperature(self):
+        """Collect or start a background temperature conversion when one is due."""
+        now = self._monotonic()
+        if self._temperature_pending:
+            temperature = self.read_temperature()
+            if temperature is not None:
+                self._temperature = temperature
+                self._temperature_pending = False
+            elif now - self._temperature_started > 1.0:
+                # A conversion takes ~30ms, assume the ready flag was cleared elsewhere
+                self._temperature_pending = False
+        elif self._temperature_started is None or now - self._temperature_started >= self._temperature_interval:
+            self.start_temperature()
+            self._temperature_pending = True
+            self._temperature_started = now
+
     def set_mode(self, mode):
         """Set the sensor mode.
 
@@ -422,6 +1844,8 @@ class MAX30105:
 
         """
         self._max30105.set('MODE_CONFIG', mode=mode)
+        self._mode = mode
+        self._update_layout()
 
     def set_slot_mode(self, slot, mode):
         """Set the mode of a single slot.
@@ -441,6 +1865,9 @@ class MAX30105:
         else:
             raise ValueError("Invalid LED slot: {}".format(slot))
 
+        self._slots[slot - 1] = mode
+        self._update_layout()
+
     def set_led_pulse_amplitude(self, led, amplitude):
         """Set the LED pulse amplitude in milliamps.
 
@@ -465,10 +1892,18 @@ class MAX30105:
         """
         self._max30105.set('FIFO_CONFIG', fifo_almost_full=count)
 
+    def get_fifo_almost_full_count(self):
+        """Return the number of FIFO slots remaining for Almost Full trigger."""
+        return self._max30105.get_field('FIFO_CONFIG', 'fifo_almost_full')
+
     def set_fifo_almost_full_enable(self, value):
         """Enable the FIFO-almost-full flag."""
         self._max30105.set('INT_ENABLE_1', a_full_en=value)
 
+    def get_fifo_almost_full_enable(self):
+        """Return True if the FIFO-almost-full flag is enabled."""
+        return bool(self._max30105.get_field('INT_ENABLE_1', 'a_full_en'))
+
     def set_data_ready_enable(self, value):
         """Enable the data-ready flag."""
         self._max30105.set('INT_ENABLE_1', data_ready_en=value)
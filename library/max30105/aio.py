@@ -0,0 +1,102 @@
+"""asyncio support for the MAX30105.
+
+Bus transactions run in an executor, so a single event loop can serve many
+sensors without blocking. Requires Python 3.6 or later.
+"""
+import asyncio
+import time
+
+
+class AsyncMAX30105(object):
+    def __init__(self, max30105, executor=None):
+        """Initialise an asyncio wrapper around a MAX30105.
+
+        :param max30105: Instance of a max30105 sensor
+        :param executor: concurrent.futures executor for bus transactions, defaults to the event loop's default executor
+
+        """
+        self.max30105 = max30105
+        self.executor = executor
+        self._lock = None
+
+    async def _call(self, function, *args):
+        # Serialise bus access to this sensor, calls may come from several tasks
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(self.executor, function, *args)
+
+    async def setup(self, **kwargs):
+        """Set up the sensor, see `MAX30105.setup` for arguments."""
+        await self._call(lambda: self.max30105.setup(**kwargs))
+
+    async def get_frames(self, use_numpy=False):
+        """Return contents of the sample FIFO as `SampleFrames`, or None if it is empty."""
+        return await self._call(self.max30105.get_frames, use_numpy)
+
+    async def get_temperature(self, timeout=5.0):
+        """Return the die temperature, waiting for the conversion without blocking the event loop."""
+        await self._call(self.max30105.start_temperature)
+        t_start = time.time()
+
+        temperature = await self._call(self.max30105.read_temperature)
+        while temperature is None:
+            await asyncio.sleep(0.01)
+            if time.time() - t_start > timeout:
+                raise RuntimeError('Timeout: Waiting for INT_STATUS_2, die_temp_ready.')
+            temperature = await self._call(self.max30105.read_temperature)
+
+        return temperature
+
+    async def stream(self, interval=0.01, use_numpy=False):
+        """Drain the FIFO every interval seconds, yielding each non-empty block of `SampleFrames`.
+
+        :param interval: Time in seconds to sleep between FIFO drains
+        :param use_numpy: Yield numpy uint32 arrays instead of array('I')
+
+        """
+        while True:
+            frames = await self.get_frames(use_numpy)
+            if frames is not None:
+                yield frames
+            await asyncio.sleep(interval)
+
+
+class AsyncHeartRate(object):
+    def __init__(self, heartrate, sensor=None):
+        """Initialise an asyncio heart rate monitor.
+
+        :param heartrate: Instance of `HeartRate` to process samples with
+        :param sensor: `AsyncMAX30105` to read from, defaults to wrapping the HeartRate's sensor
+
+        """
+        self.heartrate = heartrate
+        self.sensor = sensor if sensor is not None else AsyncMAX30105(heartrate.max30105)
+
+    async def beats(self, average_over=4, delay=0.5, interval=0.01):
+        """Watch for heartbeat, yielding beat_detected, bpm and bpm_avg every delay seconds.
+
+        The asyncio counterpart of `HeartRate.on_beat`.
+
+        :param average_over: Number of samples to average over
+        :param delay: Time in seconds between yields
+        :param interval: Time in seconds to sleep between FIFO drains
+
+        """
+        heartrate = self.heartrate
+        heartrate.reset(average_over)
+        clock = self.sensor.max30105.get_time
+        last_update = clock()
+        beat_detected = False
+
+        async for frames in self.sensor.stream(interval):
+            t = clock()
+
+            if heartrate.track_beats(frames.ir, frames.timestamps):
+                beat_detected = True
+
+            if t - last_update >= delay:
+                yield beat_detected, heartrate.bpm, heartrate.bpm_avg
+                beat_detected = False
+                last_update = t
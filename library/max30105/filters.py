@@ -0,0 +1,133 @@
+"""Fixed-point FIR filter design for the MAX30105's output data rates.
+
+Kernels are windowed-sinc designs with a Hamming window, quantised to integers
+with 15 fractional bits so they can be applied with integer arithmetic and a
+final `>> 15`. Designing a kernel is slow, so kernels are memoised per sample
+rate, sample averaging and band in a `FilterBank`, and a single bank, `bank`,
+is shared by every `HeartRate`.
+"""
+import math
+import warnings
+
+# Kernels are scaled so a gain of 1.0 is 1 << FIR_SHIFT
+FIR_SHIFT = 15
+
+
+def _sinc_low_pass(cutoff, taps):
+    """Return a floating point low-pass kernel with unity gain at DC.
+
+    :param cutoff: Cutoff frequency as a fraction of the sample rate, from 0 to 0.5
+    :param taps: Number of taps, odd
+
+    """
+    middle = (taps - 1) / 2.0
+    kernel = []
+    for n in range(taps):
+        x = n - middle
+        if x == 0:
+            value = 2 * cutoff
+        else:
+            value = math.sin(2 * math.pi * cutoff * x) / (math.pi * x)
+        window = 0.54 - 0.46 * math.cos(2 * math.pi * n / (taps - 1)) if taps > 1 else 1.0
+        kernel.append(value * window)
+    total = sum(kernel)
+    return [value / total for value in kernel]
+
+
+def _quantise(kernel, dc_gain):
+    """Round a kernel to integers, nudging the centre tap so the DC gain is exact."""
+    scale = 1 << FIR_SHIFT
+    result = [int(round(value * scale)) for value in kernel]
+    middle = len(result) // 2
+    result[middle] += dc_gain * scale - sum(result)
+    return tuple(result)
+
+
+class FilterBank(object):
+    def __init__(self, max_taps=255):
+        """Initialise a memoised bank of FIR kernels.
+
+        :param max_taps: Longest kernel to design, which limits the cost of each filtered sample
+
+        """
+        self.max_taps = max_taps
+        self._kernels = {}
+
+    def __len__(self):
+        return len(self._kernels)
+
+    def clear(self):
+        """Forget every kernel designed so far."""
+        self._kernels = {}
+
+    def get_taps(self, rate, transition):
+        """Return the number of taps for a Hamming windowed kernel with a given transition band.
+
+        A kernel capped at max_taps has a wider transition band than requested,
+        so a `RuntimeWarning` is issued when the cap applies.
+
+        :param rate: Output data rate in samples per second
+        :param transition: Width of the transition band in Hz
+        :returns: Odd number of taps, from 3 to max_taps
+
+        """
+        taps = max(int(math.ceil(3.3 * rate / transition)), 3)
+        if taps > self.max_taps:
+            warnings.warn("A {}Hz transition at {}sps needs {} taps, capped to {}. "
+                          "Reduce the rate with a Decimator first, or raise max_taps".format(transition, rate, taps, self.max_taps),
+                          RuntimeWarning)
+            taps = self.max_taps
+        return taps | 1
+
+    def get_low_pass(self, sample_rate, sample_average, cutoff, transition=None):
+        """Return a low-pass kernel for the sensor's output data rate.
+
+        The kernel is capped at max_taps, see `get_taps`. At 3200sps a 4Hz cutoff needs
+        2640 taps, capped to 255 the response is only down 3dB at 8.4Hz, so decimate
+        high rates with a `Decimator` before filtering at low cutoffs.
+
+        :param sample_rate: Sample rate the sensor is set up with, in samples per second
+        :param sample_average: Number of samples averaged into each FIFO sample
+        :param cutoff: Cutoff frequency in Hz
+        :param transition: Width of the transition band in Hz, defaults to cutoff
+        :returns: Tuple of integer taps, with a DC gain of 1 << FIR_SHIFT
+
+        """
+        key = ('low_pass', sample_rate, sample_average, cutoff, transition)
+        kernel = self._kernels.get(key)
+        if kernel is None:
+            rate = float(sample_rate) / sample_average
+            if not 0 < cutoff < rate / 2:
+                raise ValueError("Invalid cutoff: {}Hz at {}sps".format(cutoff, rate))
+            taps = self.get_taps(rate, transition or cutoff)
+            kernel = self._kernels[key] = _quantise(_sinc_low_pass(cutoff / rate, taps), 1)
+        return kernel
+
+    def get_band_pass(self, sample_rate, sample_average, low, high, transition=None):
+        """Return a band-pass kernel for the sensor's output data rate.
+
+        The kernel is the difference of two low-pass kernels, so it rejects DC entirely.
+        Like `get_low_pass` it is capped at max_taps.
+
+        :param sample_rate: Sample rate the sensor is set up with, in samples per second
+        :param sample_average: Number of samples averaged into each FIFO sample
+        :param low: Lower cutoff frequency in Hz
+        :param high: Upper cutoff frequency in Hz
+        :param transition: Width of the transition bands in Hz, defaults to low
+        :returns: Tuple of integer taps, with a DC gain of 0
+
+        """
+        key = ('band_pass', sample_rate, sample_average, low, high, transition)
+        kernel = self._kernels.get(key)
+        if kernel is None:
+            rate = float(sample_rate) / sample_average
+            if not 0 < low < high < rate / 2:
+                raise ValueError("Invalid band: {}Hz to {}Hz at {}sps".format(low, high, rate))
+            taps = self.get_taps(rate, transition or low)
+            upper = _sinc_low_pass(high / rate, taps)
+            lower = _sinc_low_pass(low / rate, taps)
+            kernel = self._kernels[key] = _quantise([a - b for a, b in zip(upper, lower)], 0)
+        return kernel
+
+
+bank = FilterBank()
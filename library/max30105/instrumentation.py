@@ -0,0 +1,137 @@
+"""Count and time MAX30105 bus transactions and FIFO drains.
+
+Enable with `MAX30105.enable_instrumentation`. While it is disabled, the driver's
+bus is not wrapped and each FIFO drain costs a single attribute check.
+"""
+from . import monotonic
+
+
+class Instrumentation(object):
+    def __init__(self, register_names, callback=None):
+        """Initialise a set of counters for one sensor.
+
+        :param register_names: Dictionary of register name for each register address
+        :param callback: Function to call with an event name and a dictionary of fields
+            for every transfer and drain, eg: to forward timings to StatsD
+
+        """
+        self.register_names = register_names
+        self.callback = callback
+        self.reset()
+
+    def reset(self):
+        """Zero every counter."""
+        self.registers = {}
+        self.transactions = 0
+        self.bus_time = 0.0
+        self.drains = 0
+        self.empty_drains = 0
+        self.samples = 0
+        self.fill_last = 0
+        self.fill_max = 0
+        self.fill_total = 0
+        self.overflows = 0
+        self.samples_lost = 0
+        self.decode_time = 0.0
+
+    def record_transfer(self, operation, register, length, duration):
+        """Count a block read or write.
+
+        :param operation: Either 'read' or 'write'
+        :param register: Address of the first register transferred
+        :param length: Number of bytes transferred
+        :param duration: Time taken in seconds
+
+        """
+        name = self.register_names.get(register, '0x{:02x}'.format(register))
+        counters = self.registers.get(name)
+        if counters is None:
+            counters = self.registers[name] = {'reads': 0, 'writes': 0, 'bytes': 0, 'time': 0.0}
+        counters[operation + 's'] += 1
+        counters['bytes'] += length
+        counters['time'] += duration
+        self.transactions += 1
+        self.bus_time += duration
+
+        if self.callback is not None:
+            self.callback('transfer', {'register': name, 'operation': operation, 'bytes': length, 'time': duration})
+
+    def record_drain(self, fill, samples, overflow, decode_time):
+        """Count a FIFO drain.
+
+        :param fill: Number of samples waiting in the FIFO when it was read
+        :param samples: Number of samples read
+        :param overflow: Number of samples lost to overflow before the read
+        :param decode_time: Time taken to decode the samples in seconds
+
+        """
+        self.drains += 1
+        if samples == 0:
+            self.empty_drains += 1
+        self.samples += samples
+        self.fill_last = fill
+        self.fill_max = max(self.fill_max, fill)
+        self.fill_total += fill
+        if overflow:
+            self.overflows += 1
+            self.samples_lost += overflow
+        self.decode_time += decode_time
+
+        if self.callback is not None:
+            self.callback('drain', {'fill': fill, 'samples': samples, 'overflow': overflow, 'decode_time': decode_time})
+
+    def snapshot(self):
+        """Return a copy of every counter as a dictionary."""
+        return {
+            'registers': dict((name, dict(counters)) for name, counters in self.registers.items()),
+            'transactions': self.transactions,
+            'bus_time': self.bus_time,
+            'drains': self.drains,
+            'empty_drains': self.empty_drains,
+            'samples': self.samples,
+            'samples_per_drain': float(self.samples) / self.drains if self.drains else 0.0,
+            'fill_last': self.fill_last,
+            'fill_max': self.fill_max,
+            'fill_mean': float(self.fill_total) / self.drains if self.drains else 0.0,
+            'overflows': self.overflows,
+            'samples_lost': self.samples_lost,
+            'decode_time': self.decode_time
+        }
+
+
+class InstrumentedSMBus(object):
+    def __init__(self, i2c_dev, instrumentation):
+        """Wrap an SMBus instance, timing every block transfer.
+
+        :param i2c_dev: SMBus instance to wrap
+        :param instrumentation: `Instrumentation` to record transfers in
+
+        """
+        self.i2c_dev = i2c_dev
+        self.instrumentation = instrumentation
+
+    def __getattr__(self, name):
+        return getattr(self.i2c_dev, name)
+
+    def read_i2c_block_data(self, i2c_address, register, length):
+        t_start = monotonic()
+        result = self.i2c_dev.read_i2c_block_data(i2c_address, register, length)
+        self.instrumentation.record_transfer('read', register, length, monotonic() - t_start)
+        return result
+
+    def write_i2c_block_data(self, i2c_address, register, values):
+        t_start = monotonic()
+        self.i2c_dev.write_i2c_block_data(i2c_address, register, values)
+        self.instrumentation.record_transfer('write', register, len(values), monotonic() - t_start)
+
+    def i2c_rdwr(self, *i2c_msgs):
+        t_start = monotonic()
+        self.i2c_dev.i2c_rdwr(*i2c_msgs)
+        duration = monotonic() - t_start
+        # Count the transaction as a read from, or write to, the register addressed by its first message
+        register = list(i2c_msgs[0])[0]
+        if any(msg.flags & 0x0001 for msg in i2c_msgs):
+            length = sum(msg.len for msg in i2c_msgs if msg.flags & 0x0001)
+            self.instrumentation.record_transfer('read', register, length, duration)
+        else:
+            self.instrumentation.record_transfer('write', register, i2c_msgs[0].len - 1, duration)
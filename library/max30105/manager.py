@@ -0,0 +1,239 @@
+"""Manage many MAX30105 sensors across I2C buses and TCA9548A multiplexers."""
+import time
+
+from . import MAX30105, I2C_ADDRESS, FIFO_DEPTH, monotonic
+
+TCA9548A_ADDRESS = 0x70
+
+
+class TCA9548A(object):
+    def __init__(self, i2c_dev, i2c_addr=TCA9548A_ADDRESS):
+        """Initialise a TCA9548A I2C multiplexer.
+
+        :param i2c_dev: SMBus instance the multiplexer is connected to
+        :param i2c_addr: I2C address of the multiplexer, from 0x70 to 0x77
+
+        """
+        self._i2c_dev = i2c_dev
+        self._i2c_addr = i2c_addr
+        # Last value written to the control register, None until the first write
+        self._control = None
+
+    def select(self, channel):
+        """Route the bus to a single downstream channel.
+
+        :param channel: Channel, from 0 to 7
+        :returns: True if the multiplexer had to be switched
+
+        """
+        if channel not in range(8):
+            raise ValueError("Invalid mux channel: {}".format(channel))
+        return self._set_control(1 << channel)
+
+    def disconnect(self):
+        """Disconnect every downstream channel from the bus.
+
+        :returns: True if the multiplexer had to be switched
+
+        """
+        return self._set_control(0)
+
+    def _set_control(self, control):
+        if control == self._control:
+            return False
+        self._i2c_dev.write_byte(self._i2c_addr, control)
+        self._control = control
+        return True
+
+
+class ManagedSensor(object):
+    def __init__(self, name, max30105, bus, mux=None, channel=None, muxes=None):
+        """A sensor owned by a `SensorManager`.
+
+        :param name: Name used to identify the sensor
+        :param max30105: Instance of the max30105 sensor
+        :param bus: Bus number the sensor is connected to
+        :param mux: `TCA9548A` the sensor is behind, if any
+        :param channel: Multiplexer channel the sensor is connected to
+        :param muxes: Every `TCA9548A` on the bus, to disconnect when this sensor is selected
+
+        """
+        self.name = name
+        self.max30105 = max30105
+        self.bus = bus
+        self.mux = mux
+        self.channel = channel
+        self.muxes = muxes if muxes is not None else []
+        self.last_drain = None
+
+    def select(self):
+        """Switch the multiplexer, if any, to this sensor.
+
+        Every other multiplexer on the bus is disconnected, so a sensor at the same
+        address behind one of them, or directly on the bus, can't answer too.
+
+        """
+        for mux in self.muxes:
+            if mux is not self.mux:
+                mux.disconnect()
+        if self.mux is not None:
+            self.mux.select(self.channel)
+
+    def get_fill(self, now):
+        """Estimate the number of samples waiting in the FIFO from the time since the last drain."""
+        if self.last_drain is None:
+            return FIFO_DEPTH
+        return (now - self.last_drain) * self.max30105.get_sample_rate()
+
+
+class SensorManager(object):
+    def __init__(self, threshold=FIFO_DEPTH // 2, smbus=None):
+        """Initialise a manager for a fleet of MAX30105 sensors.
+
+        One SMBus handle is shared by all sensors on a bus. Sensors are drained
+        once their FIFO is estimated to hold threshold samples, fullest first,
+        grouped by multiplexer channel so each channel is switched to at most once
+        per poll.
+
+        :param threshold: Estimated number of waiting samples at which a sensor is drained
+        :param smbus: Function returning an SMBus instance for a bus number, defaults to smbus2.SMBus
+
+        """
+        self.threshold = threshold
+        self.sensors = []
+        self._smbus = smbus
+        self._buses = {}
+        self._muxes = {}
+        self._bus_muxes = {}
+        self._next = 0
+
+    def get_bus(self, bus):
+        """Return the shared SMBus instance for a bus number."""
+        if bus not in self._buses:
+            if self._smbus is None:
+                import smbus2
+                self._smbus = smbus2.SMBus
+            self._buses[bus] = self._smbus(bus)
+        return self._buses[bus]
+
+    def get_mux(self, bus, i2c_addr=TCA9548A_ADDRESS):
+        """Return the shared `TCA9548A` instance for a multiplexer."""
+        key = (bus, i2c_addr)
+        if key not in self._muxes:
+            self._muxes[key] = TCA9548A(self.get_bus(bus), i2c_addr)
+            self._bus_muxes.setdefault(bus, []).append(self._muxes[key])
+        return self._muxes[key]
+
+    def add_sensor(self, name=None, bus=1, mux_channel=None, mux_address=TCA9548A_ADDRESS, i2c_addr=I2C_ADDRESS):
+        """Add a sensor to the fleet.
+
+        :param name: Name used to identify the sensor, defaults to its index
+        :param bus: Bus number the sensor, or its multiplexer, is connected to
+        :param mux_channel: TCA9548A channel the sensor is connected to, or None if it's directly on the bus
+        :param mux_address: I2C address of the TCA9548A
+        :param i2c_addr: I2C address of the sensor
+        :returns: The new `ManagedSensor`
+
+        """
+        if name is None:
+            name = len(self.sensors)
+
+        mux = None
+        if mux_channel is not None:
+            mux = self.get_mux(bus, mux_address)
+
+        for sensor in self.sensors:
+            if sensor.name == name:
+                raise ValueError("Duplicate sensor name: {}".format(name))
+            if (sensor.bus, sensor.mux, sensor.channel, sensor.max30105._i2c_addr) == (bus, mux, mux_channel, i2c_addr):
+                raise ValueError("Sensor {} is already at this bus address".format(sensor.name))
+            # A sensor directly on the bus answers whichever mux channel is selected
+            if (sensor.bus, sensor.max30105._i2c_addr) == (bus, i2c_addr) and (sensor.mux is None) != (mux is None):
+                raise ValueError("Sensor {} is at this address, one of them directly on the bus".format(sensor.name))
+
+        # Shared by every sensor on the bus, so muxes added later are disconnected too
+        muxes = self._bus_muxes.setdefault(bus, [])
+        sensor = ManagedSensor(name, MAX30105(i2c_addr=i2c_addr, i2c_dev=self.get_bus(bus)), bus, mux, mux_channel, muxes)
+        self.sensors.append(sensor)
+        return sensor
+
+    def select(self, name):
+        """Switch to a sensor, so it can be used directly.
+
+        :param name: Name of the sensor
+        :returns: Instance of the max30105 sensor
+
+        """
+        for sensor in self.sensors:
+            if sensor.name == name:
+                sensor.select()
+                return sensor.max30105
+        raise KeyError(name)
+
+    def setup(self, **kwargs):
+        """Set up every sensor, see `MAX30105.setup` for arguments."""
+        for sensor in self._in_bus_order(self.sensors):
+            sensor.select()
+            sensor.max30105.setup(**kwargs)
+
+    def _in_bus_order(self, sensors):
+        # Stable sort, so sensors sharing a mux channel stay in the given order
+        return sorted(sensors, key=lambda sensor: (sensor.bus, sensor.mux is not None, sensor.channel))
+
+    def poll(self, force=False):
+        """Drain every sensor that is due.
+
+        :param force: Drain every sensor, regardless of how full it is estimated to be
+        :returns: List of (name, `SampleFrames`) tuples, for each sensor that returned samples
+
+        """
+        now = monotonic()
+
+        # Rotate the starting point so sensors with equal fill take turns going first
+        count = len(self.sensors)
+        order = [self.sensors[(self._next + x) % count] for x in range(count)]
+        self._next = (self._next + 1) % max(count, 1)
+
+        due = [sensor for sensor in order if force or sensor.get_fill(now) >= self.threshold]
+
+        # Visit each mux channel once, most urgent channel first
+        groups = {}
+        urgency = {}
+        for sensor in due:
+            key = (sensor.bus, id(sensor.mux), sensor.channel)
+            groups.setdefault(key, []).append(sensor)
+            urgency[key] = max(urgency.get(key, 0), sensor.get_fill(now))
+
+        result = []
+        for key in sorted(groups, key=lambda key: -urgency[key]):
+            for sensor in groups[key]:
+                sensor.select()
+                frames = sensor.max30105.get_frames()
+                sensor.last_drain = now
+                if frames is not None:
+                    result.append((sensor.name, frames))
+
+        return result
+
+    def get_next_due(self):
+        """Return the time in seconds until the next sensor is due to be drained."""
+        now = monotonic()
+        delay = None
+        for sensor in self.sensors:
+            if sensor.last_drain is None:
+                return 0
+            remaining = (self.threshold - sensor.get_fill(now)) / sensor.max30105.get_sample_rate()
+            delay = remaining if delay is None else min(delay, remaining)
+        return max(delay or 0, 0)
+
+    def run(self, handler):
+        """Drain sensors as they come due, calling handler with each block of samples.
+
+        :param handler: Function to call, should accept name and frames arguments, return True to stop
+
+        """
+        while True:
+            for name, frames in self.poll():
+                if handler(name, frames):
+                    return
+            time.sleep(self.get_next_due())
@@ -0,0 +1,194 @@
+"""Offload HeartRate processing for many sensors to a pool of worker processes.
+
+Blocks of IR samples are passed to the workers through shared memory, so the
+acquisition process only handles bus I/O and copying. Requires Python 3.8 or later.
+"""
+from array import array
+import multiprocessing
+import queue
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    raise ImportError("This feature requires Python 3.8 or later for multiprocessing.shared_memory")
+
+from . import HeartRate, FIFO_DEPTH, monotonic
+
+# Each slot holds a block of IR samples as int64, followed by their timestamps as float64
+_ITEM_SIZE = 8
+
+
+def _slot_views(buf, sensor, slot, slots, block_size):
+    offset = (sensor * slots + slot) * block_size * _ITEM_SIZE * 2
+    samples = buf[offset:offset + block_size * _ITEM_SIZE].cast('q')
+    offset += block_size * _ITEM_SIZE
+    timestamps = buf[offset:offset + block_size * _ITEM_SIZE].cast('d')
+    return samples, timestamps
+
+
+def _worker(name, tasks, results, free, slots, block_size, average_over):
+    shm = shared_memory.SharedMemory(name=name)
+    buf = shm.buf.cast('B')
+    heartrates = {}
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            sensor, slot, count = task
+            samples, timestamps = _slot_views(buf, sensor, slot, slots, block_size)
+            samples_block = samples[:count].tolist()
+            timestamps_block = timestamps[:count].tolist()
+            samples.release()
+            timestamps.release()
+            free[sensor].release()
+
+            heartrate = heartrates.get(sensor)
+            if heartrate is None:
+                heartrate = heartrates[sensor] = HeartRate(None)
+                heartrate.reset(average_over)
+
+            for t, bpm, bpm_avg in heartrate.track_beats(samples_block, timestamps_block):
+                results.put((sensor, t, bpm, bpm_avg))
+    finally:
+        buf.release()
+        shm.close()
+
+
+class BeatWorkerPool(object):
+    def __init__(self, sensors, workers=None, block_size=FIFO_DEPTH, slots=8, average_over=4):
+        """Initialise a pool of heart rate worker processes.
+
+        Every sensor is handled by one worker, so its filter state stays in one process.
+
+        :param sensors: Number of sensors, each is identified by an index from 0
+        :param workers: Number of worker processes, defaults to one per CPU core up to the number of sensors
+        :param block_size: Maximum number of samples in each block passed to a worker
+        :param slots: Number of blocks per sensor that can be waiting for a worker at once
+        :param average_over: Number of beats to average bpm_avg over
+
+        """
+        if workers is None:
+            workers = min(sensors, multiprocessing.cpu_count())
+        self.sensors = sensors
+        self.workers = max(1, min(workers, sensors))
+        self.block_size = block_size
+        self.slots = slots
+        self.average_over = average_over
+
+        self._shm = None
+        self._processes = []
+        self._tasks = []
+        self._results = None
+        self._beats = []
+        self._free = None
+        self._next_slot = [0] * sensors
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_traceback):
+        self.stop()
+
+    def start(self):
+        """Create the shared memory and start the worker processes."""
+        if self._shm is not None:
+            return
+        size = self.sensors * self.slots * self.block_size * _ITEM_SIZE * 2
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._buf = self._shm.buf.cast('B')
+        self._results = multiprocessing.Queue()
+        self._free = [multiprocessing.Semaphore(self.slots) for _ in range(self.sensors)]
+
+        for _ in range(self.workers):
+            tasks = multiprocessing.Queue()
+            process = multiprocessing.Process(target=_worker, args=(
+                self._shm.name, tasks, self._results, self._free, self.slots, self.block_size, self.average_over))
+            process.daemon = True
+            process.start()
+            self._tasks.append(tasks)
+            self._processes.append(process)
+
+    def stop(self):
+        """Stop the worker processes, once they have finished any queued blocks, and free the shared memory.
+
+        Beats not yet collected are kept for `get_beats`.
+
+        """
+        if self._shm is None:
+            return
+        for tasks in self._tasks:
+            tasks.put(None)
+        for process in self._processes:
+            # A worker can't exit until the beats it has queued are read from the pipe
+            while process.is_alive():
+                self._collect(timeout=0.01)
+            process.join()
+        self._collect()
+        self._processes = []
+        self._tasks = []
+        self._buf.release()
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+    def submit(self, sensor, samples, timestamps=None, timeout=None):
+        """Queue a block of IR samples from a sensor for processing.
+
+        :param sensor: Index of the sensor the samples came from
+        :param samples: IR samples, eg: `frames.ir`
+        :param timestamps: `monotonic` time of each sample, eg: `frames.timestamps`, defaults to the current time
+        :param timeout: Maximum time in seconds to wait for a free slot, or None to wait forever
+
+        """
+        if timestamps is None:
+            timestamps = [monotonic()] * len(samples)
+
+        for start in range(0, len(samples), self.block_size):
+            block = samples[start:start + self.block_size]
+            count = len(block)
+
+            if not self._free[sensor].acquire(timeout=timeout):
+                raise RuntimeError("Timeout: Waiting for a free slot for sensor {}".format(sensor))
+
+            slot = self._next_slot[sensor]
+            self._next_slot[sensor] = (slot + 1) % self.slots
+
+            view_samples, view_timestamps = _slot_views(self._buf, sensor, slot, self.slots, self.block_size)
+            view_samples[:count] = _as_array('q', block)
+            view_timestamps[:count] = _as_array('d', timestamps[start:start + count])
+            view_samples.release()
+            view_timestamps.release()
+
+            self._tasks[sensor % self.workers].put((sensor, slot, count))
+
+    def get_beats(self, timeout=0):
+        """Return the beats detected so far.
+
+        :param timeout: Time in seconds to wait for the first beat, 0 to return immediately
+        :returns: List of (sensor, timestamp, bpm, bpm_avg) tuples
+
+        """
+        if self._results is not None:
+            self._collect(0 if self._beats else timeout)
+        beats = self._beats
+        self._beats = []
+        return beats
+
+    def _collect(self, timeout=0):
+        """Move beats from the result queue to the list returned by `get_beats`."""
+        try:
+            self._beats.append(self._results.get(timeout=timeout) if timeout else self._results.get_nowait())
+            while True:
+                self._beats.append(self._results.get_nowait())
+        except queue.Empty:
+            pass
+
+
+def _as_array(typecode, values):
+    if isinstance(values, array) and values.typecode == typecode:
+        return values
+    if hasattr(values, 'tolist'):
+        values = values.tolist()
+    return array(typecode, values)
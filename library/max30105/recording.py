@@ -0,0 +1,254 @@
+"""Record raw MAX30105 FIFO data to a compact binary file, and replay it.
+
+A recording is a file header followed by a chunk for every FIFO read. Each chunk
+has a header describing the samples that follow it, and the raw FIFO bytes:
+
+    File header, 16 bytes:
+        magic      8s   b'MAX30105'
+        version    I    format version, currently 1
+        reserved   4x
+
+    Chunk header, 24 bytes:
+        magic          4s  b'FIFO'
+        count          I   number of samples (not words) in the chunk
+        timestamp      d   `monotonic` time of the first sample
+        sample_rate    H   sample rate the sensor was set up with, in samples per second
+        sample_average B   number of samples averaged into each FIFO sample
+        dropped        B   samples lost to FIFO overflow before the chunk
+        layout         4s  slot mode of each channel, as an index into `LEDModeAdapter.LOOKUP`, 0 padded
+
+    Followed by count * channels 3-byte, big-endian FIFO words.
+
+All fields are little-endian.
+"""
+import mmap
+import struct
+
+from . import LEDModeAdapter, FIFO_MAX_SLOTS, FIFO_WORD_SIZE, numpy
+
+FILE_MAGIC = b'MAX30105'
+CHUNK_MAGIC = b'FIFO'
+VERSION = 1
+
+_FILE_HEADER = struct.Struct('<8sI4x')
+_CHUNK_HEADER = struct.Struct('<4sIdHBB4s')
+
+
+def _encode_layout(channels):
+    if len(channels) > FIFO_MAX_SLOTS:
+        raise ValueError("Too many channels: {}".format(len(channels)))
+    codes = [LEDModeAdapter.LOOKUP.index(channel) for channel in channels]
+    return bytes(bytearray(codes + [0] * (FIFO_MAX_SLOTS - len(codes))))
+
+
+def _decode_layout(layout):
+    channels = []
+    for code in bytearray(layout):
+        if code == 0:
+            break
+        channels.append(LEDModeAdapter.LOOKUP[code])
+    return tuple(channels)
+
+
+class Recorder(object):
+    def __init__(self, file, max30105=None):
+        """Initialise a recorder.
+
+        :param file: Path, or binary file object opened for writing, to record to
+        :param max30105: Instance of a max30105 sensor to record from with `record`
+
+        """
+        self.max30105 = max30105
+        self._own_file = not hasattr(file, 'write')
+        self._file = open(file, 'wb') if self._own_file else file
+        self._file.write(_FILE_HEADER.pack(FILE_MAGIC, VERSION))
+        self.chunks = 0
+        self.samples = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_traceback):
+        self.close()
+
+    def close(self):
+        """Flush the recording, and close the file if the recorder opened it."""
+        if self._own_file:
+            self._file.close()
+        else:
+            self._file.flush()
+
+    def write(self, data, channels, timestamp, sample_rate, sample_average=1, dropped=0):
+        """Append a chunk of raw FIFO bytes.
+
+        :param data: Raw FIFO bytes, see `MAX30105.get_fifo_bytes`
+        :param channels: Channel names in each sample, in FIFO order, see `MAX30105.get_channels`
+        :param timestamp: `monotonic` time of the first sample
+        :param sample_rate: Sample rate the sensor was set up with
+        :param sample_average: Number of samples averaged into each FIFO sample
+        :param dropped: Number of samples lost to FIFO overflow before this chunk
+
+        """
+        count = len(data) // (FIFO_WORD_SIZE * len(channels))
+        header = _CHUNK_HEADER.pack(CHUNK_MAGIC, count, timestamp, sample_rate, sample_average,
+                                    min(dropped, 0xff), _encode_layout(channels))
+        self._file.write(header)
+        self._file.write(data)
+        self.chunks += 1
+        self.samples += count
+
+    def record(self, use_numpy=False):
+        """Drain the sensor's FIFO, recording the raw bytes, and return the samples.
+
+        :param use_numpy: Return numpy uint32 arrays instead of array('I')
+        :returns: `SampleFrames`, or None if the FIFO is empty
+
+        """
+        frames = self.max30105.get_frames(use_numpy=use_numpy)
+        if frames is None:
+            return None
+
+        self.write(self.max30105.get_fifo_bytes(),
+                   frames.channels,
+                   frames.timestamps[0],
+                   self.max30105._sample_rate,
+                   self.max30105._sample_average,
+                   frames.dropped)
+
+        return frames
+
+
+class RecordedChunk(object):
+    """A chunk of a `Recording`, the samples from one FIFO read.
+
+    `raw` is a zero-copy numpy structured view of the FIFO bytes in the recording,
+    with a 3-byte field for each channel, eg: `chunk.raw['ir']`.
+
+    """
+
+    def __init__(self, raw, channels, timestamp, sample_rate, sample_average, dropped):
+        self.raw = raw
+        self.channels = channels
+        self.timestamp = timestamp
+        self.sample_rate = sample_rate
+        self.sample_average = sample_average
+        self.dropped = dropped
+
+    def __len__(self):
+        return len(self.raw)
+
+    def __getitem__(self, channel):
+        """Decode a channel to a numpy uint32 array."""
+        return _decode_channel(self.raw[channel])
+
+    def get_timestamps(self):
+        """Return the `monotonic` time of each sample, as a numpy float64 array."""
+        period = float(self.sample_average) / self.sample_rate
+        return self.timestamp + numpy.arange(len(self.raw)) * period
+
+
+def _decode_channel(raw):
+    words = raw[:, 0].astype(numpy.uint32)
+    words <<= 8
+    words |= raw[:, 1]
+    words <<= 8
+    words |= raw[:, 2]
+    return words
+
+
+class Recording(object):
+    def __init__(self, path):
+        """Open a recording for replay.
+
+        The file is memory-mapped, so only the chunks that are used are read from disk.
+        A chunk left incomplete by an interrupted recording is ignored.
+
+        :param path: Path of the recording
+
+        """
+        if numpy is None:
+            raise ImportError("This feature requires the numpy module\nInstall with: sudo pip install numpy")
+
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version = _FILE_HEADER.unpack_from(self._map, 0)
+        if magic != FILE_MAGIC:
+            raise ValueError("Not a MAX30105 recording: {}".format(path))
+        if version != VERSION:
+            raise ValueError("Unsupported recording version: {}".format(version))
+
+        self.chunks = []
+        self._index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_traceback):
+        self.close()
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self.chunks)
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        """Close the recording.
+
+        Views returned from it must not be used afterwards.
+
+        """
+        self.chunks = []
+        try:
+            self._map.close()
+        except BufferError:
+            # Views are still held elsewhere, the map is closed once they are released
+            pass
+        self._file.close()
+
+    def _index(self):
+        offset = _FILE_HEADER.size
+        size = len(self._map)
+        dtypes = {}
+
+        while offset + _CHUNK_HEADER.size <= size:
+            magic, count, timestamp, sample_rate, sample_average, dropped, layout = _CHUNK_HEADER.unpack_from(self._map, offset)
+            if magic != CHUNK_MAGIC:
+                raise ValueError("Corrupt recording, bad chunk at offset {}".format(offset))
+            offset += _CHUNK_HEADER.size
+
+            channels = _decode_layout(layout)
+            length = count * len(channels) * FIFO_WORD_SIZE
+            if offset + length > size:
+                break
+
+            if channels not in dtypes:
+                dtypes[channels] = numpy.dtype([(channel, numpy.uint8, FIFO_WORD_SIZE) for channel in channels])
+            raw = numpy.frombuffer(self._map, dtype=dtypes[channels], count=count, offset=offset)
+
+            self.chunks.append(RecordedChunk(raw, channels, timestamp, sample_rate, sample_average, dropped))
+            offset += length
+
+    def get_channel(self, channel):
+        """Decode every sample of a channel into one numpy uint32 array.
+
+        :param channel: Channel name, eg: 'ir'
+        :returns: numpy uint32 array, chunks without the channel are skipped
+
+        """
+        raws = [chunk.raw[channel] for chunk in self.chunks if channel in chunk.channels]
+        if not raws:
+            return numpy.zeros(0, dtype=numpy.uint32)
+        return _decode_channel(numpy.concatenate(raws))
+
+    def get_timestamps(self, channel=None):
+        """Return the `monotonic` time of every sample, as a numpy float64 array.
+
+        :param channel: Only include chunks with this channel, to match `get_channel`
+
+        """
+        stamps = [chunk.get_timestamps() for chunk in self.chunks if channel is None or channel in chunk.channels]
+        if not stamps:
+            return numpy.zeros(0, dtype=numpy.float64)
+        return numpy.concatenate(stamps)
@@ -0,0 +1,399 @@
+"""Simulated MAX30105 for testing and benchmarking without hardware.
+
+`SimulatedSMBus` stands in for an SMBus instance and behaves like a MAX30105
+on the bus: samples arrive in the FIFO at the configured sample rate, the FIFO
+pointers and overflow counter move as they do on the real part, and interrupt
+flags, soft reset and die temperature conversions are modelled.
+
+    from max30105 import MAX30105
+    from max30105.simulator import SimulatedSMBus, PPGSource
+
+    bus = SimulatedSMBus(source=PPGSource(heart_rate=72), speed=10)
+    max30105 = MAX30105(i2c_dev=bus, clock=bus.get_time, sleep=bus.sleep)
+
+Sharing the bus's clock keeps the driver's timestamps and timeouts in simulated time.
+
+Samples come from a source, either a synthetic `PPGSource` or a `RecordingSource`.
+"""
+import errno
+import math
+import random
+import time
+
+from . import LEDModeAdapter, CHIP_ID, FIFO_DEPTH, I2C_FUNC_I2C, monotonic
+
+REVISION_ID = 0x03
+
+# I2C_FUNCS bits for SMBus block reads and writes
+I2C_FUNC_SMBUS_I2C_BLOCK = 0x0c000000
+
+# Time taken by a die temperature conversion, in seconds
+TEMPERATURE_CONVERSION_TIME = 0.029
+
+_SAMPLE_RATES = (50, 100, 200, 400, 800, 1000, 1600, 3200)
+_SAMPLE_AVERAGES = (1, 2, 4, 8, 16, 32, 32, 32)
+
+_MAX_SAMPLE = 0x3ffff
+
+
+class PPGSource(object):
+    def __init__(self, heart_rate=70.0, dc=None, perfusion=None, noise=20.0, seed=None):
+        """Initialise a synthetic photoplethysmogram.
+
+        Each channel is a steady DC level, reflected light from the skin, less a small
+        pulse that follows the heart rate.
+
+        :param heart_rate: Heart rate in beats per minute
+        :param dc: Dictionary of DC level for each channel, eg: {'ir': 100000}
+        :param perfusion: Dictionary of pulse amplitude for each channel, as a fraction of its DC level
+        :param noise: Standard deviation of the noise added to each sample
+        :param seed: Seed for the noise, for repeatable samples
+
+        """
+        self.heart_rate = heart_rate
+        self.dc = {'red': 80000, 'ir': 100000, 'green': 30000}
+        self.perfusion = {'red': 0.01, 'ir': 0.02, 'green': 0.04}
+        if dc is not None:
+            self.dc.update(dc)
+        if perfusion is not None:
+            self.perfusion.update(perfusion)
+        self.noise = noise
+        self._random = random.Random(seed)
+
+    def pulse(self, t):
+        """Return the pulse shape, from 0 to about 1, at time t seconds."""
+        phase = (t * self.heart_rate / 60.0) % 1.0
+        # Systolic peak followed by a smaller diastolic peak
+        return math.exp(-((phase - 0.2) / 0.08) ** 2) + 0.4 * math.exp(-((phase - 0.45) / 0.1) ** 2)
+
+    def get_samples(self, channels, start, count, rate):
+        """Return count samples, starting from sample number start.
+
+        :param channels: Channel names in each sample
+        :param start: Sample number of the first sample
+        :param count: Number of samples
+        :param rate: Sample rate in samples per second
+        :returns: List of tuples, one word for each channel
+
+        """
+        gauss = self._random.gauss
+        levels = []
+        for channel in channels:
+            channel = channel.replace('pilot_', '')
+            dc = self.dc.get(channel, 0)
+            levels.append((dc, dc * self.perfusion.get(channel, 0)))
+
+        samples = []
+        for x in range(start, start + count):
+            pulse = self.pulse(float(x) / rate)
+            samples.append(tuple(
+                min(max(int(dc - ac * pulse + gauss(0, self.noise)), 0), _MAX_SAMPLE) for dc, ac in levels
+            ))
+        return samples
+
+
+class RecordingSource(object):
+    def __init__(self, recording, loop=True):
+        """Initialise a source that replays a `Recording`.
+
+        Samples are replayed at the sample rate the simulated sensor is set up with,
+        which need not match the rate they were recorded at. Channels missing from
+        the recording read as 0.
+
+        :param recording: `max30105.recording.Recording` to replay
+        :param loop: Start again from the beginning once the recording runs out
+
+        """
+        self.loop = loop
+        self._channels = {}
+        for chunk in recording:
+            for channel in chunk.channels:
+                if channel not in self._channels:
+                    self._channels[channel] = recording.get_channel(channel).tolist()
+        self._length = max([len(samples) for samples in self._channels.values()] or [0])
+        # Channels absent from some chunks are padded, so every channel is the same length
+        for samples in self._channels.values():
+            samples += [0] * (self._length - len(samples))
+
+    def get_samples(self, channels, start, count, rate):
+        """Return count samples, starting from sample number start, see `PPGSource.get_samples`."""
+        if self._length == 0:
+            return []
+        if not self.loop:
+            count = max(0, min(count, self._length - start))
+        columns = []
+        for channel in channels:
+            samples = self._channels.get(channel.replace('pilot_', ''))
+            if samples is None:
+                columns.append([0] * count)
+            else:
+                columns.append([samples[x % self._length] for x in range(start, start + count)])
+        return list(zip(*columns))
+
+
+class SimulatedSMBus(object):
+    def __init__(self, i2c_bus=1, source=None, speed=1.0, temperature=25.0, clock=None, i2c_rdwr=True, sleep=None):
+        """Initialise a simulated MAX30105 on an SMBus.
+
+        Faster than real time, the driver must share the simulated clock, so samples are
+        timestamped and drains scheduled in simulated time, eg:
+        `MAX30105(i2c_dev=bus, clock=bus.get_time, sleep=bus.sleep)`
+
+        :param i2c_bus: Bus number, ignored
+        :param source: Source of samples, defaults to a `PPGSource`
+        :param speed: Rate at which simulated time passes, relative to clock, eg: 10 for ten times real time
+        :param temperature: Die temperature in degrees C
+        :param clock: Function returning the time in seconds, defaults to `monotonic`
+        :param i2c_rdwr: False to behave like an SMBus-only adapter, which fails combined `i2c_rdwr` transactions
+        :param sleep: Function that sleeps for a number of seconds of clock time, defaults to `time.sleep`
+
+        """
+        self.source = source if source is not None else PPGSource()
+        self.speed = speed
+        self.temperature = temperature
+        self._clock = clock if clock is not None else monotonic
+        self._sleep = sleep if sleep is not None else time.sleep
+        # Simulated time carries on through a soft reset, like the host's clock would
+        self._sim_time = 0.0
+        self.funcs = I2C_FUNC_SMBUS_I2C_BLOCK
+        if i2c_rdwr:
+            self.funcs |= I2C_FUNC_I2C
+
+        self.samples_generated = 0
+        self.samples_lost = 0
+        self.transactions = 0
+
+        self.reset()
+
+    def reset(self):
+        """Return every register to its power-on state and empty the FIFO."""
+        self.regs = [0] * 256
+        self.regs[0x00] = 0b00000001  # PWR_RDY
+        self.regs[0xfe] = REVISION_ID
+        self.regs[0xff] = CHIP_ID
+        self._fifo = []
+        self._partial = bytearray()
+        self._pending = 0.0
+        self._temperature_done = None
+        self._last_update = self._clock()
+
+    def get_channels(self):
+        """Return the channel names in each FIFO sample, from the mode and slot registers."""
+        mode = self.regs[0x09] & 0b111
+        if self.regs[0x09] & 0b10000000:  # Shutdown
+            return ()
+        if mode == 0b010:
+            return ('red',)
+        if mode == 0b011:
+            return ('red', 'ir')
+        if mode == 0b111:
+            slots = (self.regs[0x11] & 0x07, (self.regs[0x11] >> 4) & 0x07,
+                     self.regs[0x12] & 0x07, (self.regs[0x12] >> 4) & 0x07)
+            channels = []
+            for slot in slots:
+                if slot in (0, 4):
+                    break
+                channels.append(LEDModeAdapter.LOOKUP[slot])
+            return tuple(channels)
+        return ()
+
+    def get_sample_rate(self):
+        """Return the rate, in samples per second, at which samples arrive in the FIFO."""
+        rate = _SAMPLE_RATES[(self.regs[0x0a] >> 2) & 0b111]
+        average = _SAMPLE_AVERAGES[self.regs[0x08] >> 5]
+        return float(rate) / average
+
+    @property
+    def unread(self):
+        """Number of samples waiting in the FIFO."""
+        return len(self._fifo)
+
+    @property
+    def interrupt(self):
+        """True if the INT pin is asserted."""
+        self._update()
+        return bool((self.regs[0x00] & self.regs[0x02] & 0xf0) or (self.regs[0x01] & self.regs[0x03] & 0x02))
+
+    def get_time(self):
+        """Return the simulated time in seconds, a drop in for `monotonic`."""
+        self._update()
+        return self._sim_time
+
+    def sleep(self, seconds):
+        """Sleep for a number of seconds of simulated time, a drop in for `time.sleep`."""
+        self._sleep(seconds / self.speed)
+
+    def advance(self, seconds):
+        """Move simulated time forward, as if seconds had passed."""
+        self._update()
+        self._advance(seconds)
+
+    def wait(self, timeout=None):
+        """Block until the INT pin is asserted, a drop in for `gpio_interrupt_wait`.
+
+        :param timeout: Maximum time to wait in seconds of simulated time, or None to wait forever
+        :returns: True if INT is asserted, False on timeout
+
+        """
+        t_start = self.get_time()
+        while not self.interrupt:
+            if timeout is not None and self.get_time() - t_start >= timeout:
+                return False
+            self.sleep(min(0.001 * self.speed, 1.0 / self.get_sample_rate()))
+        return True
+
+    def _update(self):
+        now = self._clock()
+        elapsed = (now - self._last_update) * self.speed
+        self._last_update = now
+        if elapsed > 0:
+            self._advance(elapsed)
+
+    def _advance(self, elapsed):
+        self._sim_time += elapsed
+
+        if self._temperature_done is not None and self._sim_time >= self._temperature_done:
+            self._temperature_done = None
+            integer = int(math.floor(self.temperature))
+            self.regs[0x1f] = integer & 0xff
+            self.regs[0x20] = int((self.temperature - integer) * 16) & 0x0f
+            self.regs[0x21] &= ~0b00000001
+            self.regs[0x01] |= 0b00000010  # DIE_TEMP_RDY
+
+        channels = self.get_channels()
+        if not channels:
+            self._pending = 0.0
+            return
+
+        rate = self.get_sample_rate()
+        self._pending += elapsed * rate
+        count = int(self._pending)
+        if count == 0:
+            return
+        self._pending -= count
+
+        self.generate(count)
+
+    def generate(self, count):
+        """Take count samples from the source and push them into the FIFO, without waiting for them.
+
+        :param count: Number of samples
+        :returns: Number of samples generated, 0 if the sensor is shut down or has no LEDs enabled
+
+        """
+        channels = self.get_channels()
+        if not channels:
+            return 0
+        samples = self.source.get_samples(channels, self.samples_generated, count, self.get_sample_rate())
+        self.samples_generated += len(samples)
+        for sample in samples:
+            self._push(sample)
+        return len(samples)
+
+    def _push(self, sample):
+        data = bytearray()
+        for word in sample:
+            data += bytearray(((word >> 16) & 0x03, (word >> 8) & 0xff, word & 0xff))
+
+        if len(self._fifo) == FIFO_DEPTH:
+            self.regs[0x05] = min(self.regs[0x05] + 1, 0x1f)
+            self.samples_lost += 1
+            if not self.regs[0x08] & 0b00010000:
+                # Without rollover the FIFO holds its contents and new samples are lost
+                return
+            self._fifo.pop(0)
+            self._partial = bytearray()
+            self.regs[0x06] = (self.regs[0x06] + 1) % FIFO_DEPTH
+
+        self._fifo.append(data)
+        self.regs[0x04] = (self.regs[0x04] + 1) % FIFO_DEPTH
+
+        self.regs[0x00] |= 0b01000000  # PPG_RDY
+        if len(self._fifo) >= FIFO_DEPTH - (self.regs[0x08] & 0x0f):
+            self.regs[0x00] |= 0b10000000  # A_FULL
+
+    def _read_fifo_data(self, length):
+        result = bytearray()
+        while len(result) < length:
+            if not self._partial:
+                if not self._fifo:
+                    # Reading an empty FIFO does not advance the pointer
+                    result += bytearray(length - len(result))
+                    break
+                self._partial = self._fifo[0]
+            take = self._partial[:length - len(result)]
+            result += take
+            self._partial = self._partial[len(take):]
+            if not self._partial:
+                # The read pointer advances once a whole sample has been read
+                self._fifo.pop(0)
+                self.regs[0x06] = (self.regs[0x06] + 1) % FIFO_DEPTH
+                self.regs[0x05] = 0
+        self.regs[0x00] &= 0b00111111  # Reading the FIFO clears A_FULL and PPG_RDY
+        return list(result)
+
+    def read_i2c_block_data(self, i2c_address, register, length):
+        self.transactions += 1
+        self._update()
+        return self._read(register, length)
+
+    def write_i2c_block_data(self, i2c_address, register, values):
+        self.transactions += 1
+        self._update()
+        self._write(register, values)
+
+    def i2c_rdwr(self, *i2c_msgs):
+        """Run a combined transaction of smbus2 `i2c_msg` writes and reads, with repeated starts between them."""
+        if not self.funcs & I2C_FUNC_I2C:
+            raise IOError(errno.EOPNOTSUPP, "Operation not supported")
+        self.transactions += 1
+        self._update()
+        register = 0
+        for msg in i2c_msgs:
+            if msg.flags & 0x0001:  # I2C_M_RD
+                for index, value in enumerate(self._read(register, msg.len)):
+                    msg.buf[index] = value
+            else:
+                data = list(msg)
+                register = data[0]
+                if len(data) > 1:
+                    self._write(register, data[1:])
+
+    def _read(self, register, length):
+        if register == 0x07:
+            return self._read_fifo_data(length)
+
+        result = self.regs[register:register + length]
+
+        # Reading an interrupt status register clears it
+        if register <= 0x00 < register + length:
+            self.regs[0x00] = 0
+        if register <= 0x01 < register + length:
+            self.regs[0x01] = 0
+
+        return result
+
+    def _write(self, register, values):
+        values = list(values)
+        end = register + len(values)
+        self.regs[register:end] = values
+
+        if register <= 0x09 < end and self.regs[0x09] & 0b01000000:
+            # Soft reset completes immediately and the reset bit clears itself
+            self.reset()
+            return
+
+        if register <= 0x04 < end or register <= 0x06 < end:
+            # Writing the pointers discards the samples that are no longer between them
+            unread = (self.regs[0x04] - self.regs[0x06]) % FIFO_DEPTH
+            self._fifo = self._fifo[len(self._fifo) - unread:] if unread else []
+            self._partial = bytearray()
+
+        if register <= 0x21 < end and self.regs[0x21] & 0b00000001:
+            self._temperature_done = self._sim_time + TEMPERATURE_CONVERSION_TIME
+
+    def read_byte_data(self, i2c_address, register):
+        return self.read_i2c_block_data(i2c_address, register, 1)[0]
+
+    def write_byte_data(self, i2c_address, register, value):
+        self.write_i2c_block_data(i2c_address, register, [value])
@@ -0,0 +1,196 @@
+"""Background acquisition of MAX30105 samples into a ring buffer."""
+from array import array
+import threading
+
+from . import SAMPLE_TYPECODE, SampleFrames, monotonic
+
+
+class SampleStream(object):
+    def __init__(self, max30105, capacity=4096, interval=0.005):
+        """Initialise a sample stream.
+
+        Samples are numbered with a sequence number that starts at 0 and increases
+        by one for every sample (not word) drained from the FIFO. Consumers keep
+        track of the next sequence number they want and pass it to `read`.
+
+        :param max30105: Instance of a max30105 sensor to read from, it should already be set up
+        :param capacity: Number of samples per channel held in the ring buffer
+        :param interval: Time in seconds between FIFO drains
+
+        """
+        self.max30105 = max30105
+        self.capacity = capacity
+        self.interval = interval
+        self.channels = max30105.get_channels()
+
+        self._buffers = [array(SAMPLE_TYPECODE, bytes(bytearray(capacity * 4))) for _ in self.channels]
+        self._times = array('d', [0.0]) * capacity
+
+        # _reserved is advanced before samples are copied in, _head after,
+        # so a reader can tell which of the samples it copied may be torn
+        self._head = 0
+        self._reserved = 0
+
+        self.dropped = 0
+        self.overruns = 0
+        self.temperature = None
+
+        self._error = None
+        self._ready = threading.Condition()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_traceback):
+        self.stop()
+
+    @property
+    def sequence(self):
+        """Sequence number of the next sample to be stored."""
+        return self._head
+
+    def start(self):
+        """Start draining the FIFO from a background thread."""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and wait for it to finish."""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self.poll()
+            except Exception as error:
+                self._error = error
+                with self._ready:
+                    self._ready.notify_all()
+                return
+            # Sleep on the event so stop() doesn't wait out a full interval
+            self._stopping.wait(self.interval)
+
+    def poll(self):
+        """Drain the FIFO once into the ring buffer.
+
+        Called periodically by the background thread, or directly when no thread is running.
+
+        :returns: Number of samples stored
+
+        """
+        frames = self.max30105.get_frames()
+        if frames is None:
+            return 0
+
+        count = len(frames)
+        head = self._head
+        self.dropped += frames.dropped
+        self.temperature = frames.temperature
+
+        # Only the newest samples can survive a drain larger than the ring
+        skip = max(0, count - self.capacity)
+
+        timestamps = frames.timestamps
+        if timestamps is None:
+            timestamps = array('d', [monotonic()]) * count
+
+        self._reserved = head + count
+        for channel, buf in zip(self.channels, self._buffers):
+            column = frames[channel]
+            self._store(buf, (head + skip) % self.capacity, column[skip:count])
+        self._store(self._times, (head + skip) % self.capacity, timestamps[skip:count])
+        self._head = head + count
+
+        with self._ready:
+            self._ready.notify_all()
+
+        return count
+
+    def _store(self, buf, start, column):
+        split = min(len(column), self.capacity - start)
+        buf[start:start + split] = column[:split]
+        if split < len(column):
+            buf[0:len(column) - split] = column[split:]
+
+    def wait(self, seq, timeout=None):
+        """Block until the sample with sequence number seq has been stored.
+
+        :param seq: Sequence number to wait for
+        :param timeout: Maximum time to wait in seconds, or None to wait forever
+        :returns: True if the sample is available, False on timeout
+
+        """
+        with self._ready:
+            if self._head <= seq and self._error is None:
+                self._ready.wait(timeout)
+        if self._error is not None:
+            raise self._error
+        return self._head > seq
+
+    def read(self, seq, max_count=None):
+        """Read samples from the ring buffer, starting from sequence number seq.
+
+        If the consumer has fallen so far behind that samples have been overwritten,
+        reading resumes from the oldest sample still held and the number of samples
+        missed is reported in `frames.dropped`.
+
+        :param seq: Sequence number of the first sample to read
+        :param max_count: Maximum number of samples to read, defaults to all available
+        :returns: Tuple of `SampleFrames` (or None if no samples are available) and the next sequence number
+
+        """
+        if self._error is not None:
+            raise self._error
+
+        head = self._head
+        lost = 0
+
+        oldest = head - self.capacity
+        if seq < oldest:
+            lost = oldest - seq
+            seq = oldest
+
+        count = head - seq
+        if max_count is not None:
+            count = min(count, max_count)
+
+        columns = [self._fetch(buf, seq, count) for buf in self._buffers]
+        timestamps = self._fetch(self._times, seq, count)
+
+        # Discard anything the producer may have overwritten while we were copying
+        torn = self._reserved - self.capacity - seq
+        if torn > 0:
+            torn = min(torn, count)
+            columns = [column[torn:] for column in columns]
+            timestamps = timestamps[torn:]
+            lost += torn
+            seq += torn
+            count -= torn
+
+        if lost:
+            self.overruns += lost
+
+        if count <= 0:
+            return None, seq
+
+        frames = SampleFrames(self.channels, columns, dropped=lost, timestamps=timestamps)
+        frames.temperature = self.temperature
+        return frames, seq + count
+
+    def _fetch(self, buf, seq, count):
+        start = seq % self.capacity
+        end = start + count
+        if end <= self.capacity:
+            return buf[start:end]
+        return buf[start:] + buf[:end - self.capacity]
@@ -50,5 +50,6 @@ setup(
     url='http://www.pimoroni.com',
     classifiers=classifiers,
     packages=['max30105'],
-    install_requires=['i2cdevice>=0.0.7']
+    install_requires=['i2cdevice>=0.0.7'],
+    extras_require={'numpy': ['numpy']}
 )
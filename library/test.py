@@ -30,9 +30,9 @@ try:
         i = 0
 
         while i < 10:
-            samples = max30105.get_samples()
-            if samples is not None:
-                ir = samples[colours[c] - 1] & 0xff
+            frames = max30105.get_frames()
+            if frames is not None:
+                ir = frames[c][0] & 0xff
                 d = hr.low_pass_fir(ir)
                 print(d)
                 time.sleep(0.1)
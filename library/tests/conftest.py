@@ -0,0 +1,7 @@
+import sys
+
+collect_ignore = []
+
+# asyncio support uses async generators
+if sys.version_info < (3, 6):
+    collect_ignore.append('test_aio.py')
@@ -0,0 +1,88 @@
+from array import array
+import asyncio
+
+from i2cdevice import MockSMBus
+import pytest
+
+
+class MockSMBusNoTimeout(MockSMBus):
+    def write_i2c_block_data(self, i2c_address, register, values):
+        # Prevent the reset bit from being written
+        # simulating an immediate soft reset success
+        if register == 0x09:
+            values[0] &= ~0b01000000
+        MockSMBus.write_i2c_block_data(self, i2c_address, register, values)
+
+
+class FakeMAX30105(object):
+    """Hand out queued SampleFrames in place of FIFO reads."""
+    def __init__(self, blocks):
+        self.blocks = list(blocks)
+
+    def get_frames(self, use_numpy=False):
+        from max30105 import SampleFrames, SAMPLE_TYPECODE
+        if self.blocks:
+            return SampleFrames(('red', 'ir'), [array(SAMPLE_TYPECODE, column) for column in self.blocks.pop(0)])
+        return None
+
+    def get_time(self):
+        from max30105 import monotonic
+        return monotonic()
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_get_temperature():
+    from max30105 import MAX30105
+    from max30105.aio import AsyncMAX30105
+    max30105 = MAX30105(i2c_dev=MockSMBusNoTimeout(1, default_registers={
+        0x01: 0b00000010,  # Die temp ready
+        0x09: 0b00000111   # Hard default value to avoid error
+    }))
+    assert run(AsyncMAX30105(max30105).get_temperature()) == 0
+
+
+def test_get_temperature_timeout():
+    from max30105 import MAX30105
+    from max30105.aio import AsyncMAX30105
+    max30105 = MAX30105(i2c_dev=MockSMBusNoTimeout(1, default_registers={
+        0x01: 0b00000000,  # Die temp NOT ready
+        0x09: 0b00000111   # Hard default value to avoid error
+    }))
+
+    with pytest.raises(RuntimeError):
+        run(AsyncMAX30105(max30105).get_temperature(timeout=0.05))
+
+
+def test_stream():
+    from max30105.aio import AsyncMAX30105
+    sensor = AsyncMAX30105(FakeMAX30105([([1, 2], [3, 4]), ([5], [6])]))
+
+    async def collect():
+        result = []
+        async for frames in sensor.stream(interval=0):
+            result.append(frames.red.tolist())
+            if len(result) == 2:
+                break
+        return result
+
+    assert run(collect()) == [[1, 2], [5]]
+
+
+def test_beats():
+    from max30105 import HeartRate
+    from max30105.aio import AsyncHeartRate
+    sensor = FakeMAX30105([([0] * 4, [0] * 4)] * 4)
+    heartrate = AsyncHeartRate(HeartRate(sensor))
+
+    async def first():
+        async for beat_detected, bpm, bpm_avg in heartrate.beats(delay=0, interval=0):
+            return beat_detected, bpm, bpm_avg
+
+    assert run(first()) == (False, 0, 0)
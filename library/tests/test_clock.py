@@ -0,0 +1,99 @@
+import pytest
+
+
+def _simulate(clock, true_period, poll_interval, reads, offset=100.0):
+    """Read an ideal sensor every poll_interval and return every timestamp handed out."""
+    stamps = []
+    produced = 0
+    t = offset
+    for _ in range(reads):
+        t += poll_interval
+        # Samples that have arrived by time t
+        available = int((t - offset) / true_period)
+        count = available - produced
+        if count:
+            stamps += clock.stamp(count, t).tolist()
+            produced = available
+    return stamps
+
+
+def test_first_block_anchored_to_read():
+    from max30105 import SampleClock
+    clock = SampleClock(100)
+    stamps = clock.stamp(4, 10.0)
+    assert stamps.tolist() == pytest.approx([9.97, 9.98, 9.99, 10.0])
+    assert clock.stamp(2, 10.02).tolist() == pytest.approx([10.01, 10.02])
+
+
+def test_dropped_samples_leave_a_gap():
+    from max30105 import SampleClock
+    clock = SampleClock(100)
+    clock.stamp(4, 10.0)
+    assert clock.stamp(2, 10.05, dropped=3).tolist() == pytest.approx([10.04, 10.05])
+
+
+def test_monotonic_and_evenly_spaced():
+    from max30105 import SampleClock
+    clock = SampleClock(100)
+    stamps = _simulate(clock, 0.01, 0.037, 200)
+    deltas = [b - a for a, b in zip(stamps, stamps[1:])]
+    assert min(deltas) > 0
+    assert max(deltas) == pytest.approx(0.01, rel=0.05)
+
+
+def test_drift_correction():
+    from max30105 import SampleClock
+    # Sensor runs 3% slow compared with its nominal 100sps
+    true_period = 0.0103
+    clock = SampleClock(100)
+    stamps = _simulate(clock, true_period, 0.05, 2000)
+    assert clock.period == pytest.approx(true_period, rel=0.005)
+    # Timestamps should track true sample times to within a sample period
+    last = stamps[-1]
+    assert abs(last - (100.0 + len(stamps) * true_period)) < true_period
+
+
+def test_lost_track_reanchors():
+    from max30105 import SampleClock
+    clock = SampleClock(100)
+    clock.stamp(4, 10.0)
+    assert clock.stamp(1, 60.0).tolist() == [60.0]
+
+
+def test_frames_timestamps(monkeypatch):
+    from array import array
+    import max30105
+    from test_simulator import _simulated_sensor
+    sensor, bus, clock = _simulated_sensor()
+
+    # Only get_frames builds timestamps
+    def fail(*args, **kwargs):
+        raise AssertionError("Timestamps built")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(max30105, '_timestamps', fail)
+        bus.generate(4)
+        assert len(sensor.get_samples()) == 8
+
+    bus.generate(5)
+    frames = sensor.get_frames()
+    assert isinstance(frames.timestamps, array)
+    assert len(frames.timestamps) == 5
+    deltas = [b - a for a, b in zip(frames.timestamps, frames.timestamps[1:])]
+    assert deltas == pytest.approx([0.01] * 4, rel=0.05)
+
+
+def test_frames_timestamps_numpy(monkeypatch):
+    numpy = pytest.importorskip('numpy')
+    import max30105
+    from test_simulator import _simulated_sensor
+    expected = max30105._timestamps(10.0, 0.01, 5).tolist()
+    monkeypatch.setattr(max30105, 'numpy', None)
+    assert max30105._timestamps(10.0, 0.01, 5).tolist() == expected
+    monkeypatch.undo()
+
+    sensor, bus, clock = _simulated_sensor()
+    bus.generate(5)
+    frames = sensor.get_frames(use_numpy=True)
+    assert isinstance(frames.timestamps, numpy.ndarray)
+    assert len(frames.timestamps) == 5
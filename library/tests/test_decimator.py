@@ -0,0 +1,110 @@
+import math
+import random
+
+import pytest
+
+
+def _reference(samples, kernel, factor):
+    # Full convolution, preceded by silence, keeping every factor'th output
+    taps = len(kernel)
+    signal = [0] * (taps - 1) + list(samples)
+    result = []
+    for x in range(0, len(signal) - taps + 1, factor):
+        result.append(sum(k * s for k, s in zip(kernel, signal[x:x + taps])) >> 15)
+    return result
+
+
+def _signal(count, seed=0):
+    rng = random.Random(seed)
+    return [100000 + rng.randint(-5000, 5000) for _ in range(count)]
+
+
+def _decimate(decimator, samples, block_size, convert=list):
+    result = []
+    for x in range(0, len(samples), block_size):
+        result.extend(decimator.process(convert(samples[x:x + block_size])))
+    return result
+
+
+@pytest.mark.parametrize('block_size', [1, 5, 32, 100])
+def test_decimator_matches_reference(block_size):
+    from max30105 import Decimator
+    samples = _signal(300)
+    decimator = Decimator(4, sample_rate=400)
+    expected = _reference(samples, decimator.kernel, 4)
+    assert _decimate(decimator, samples, block_size) == expected
+
+
+@pytest.mark.parametrize('block_size', [1, 5, 32, 100])
+def test_decimator_fallback_matches_reference(block_size, monkeypatch):
+    import max30105
+    monkeypatch.setattr(max30105, 'numpy', None)
+    samples = _signal(300)
+    decimator = max30105.Decimator(4, sample_rate=400)
+    expected = _reference(samples, decimator.kernel, 4)
+    assert _decimate(decimator, samples, block_size) == expected
+
+
+def test_decimator_numpy():
+    numpy = pytest.importorskip('numpy')
+    from max30105 import Decimator
+    samples = _signal(300)
+    decimator = Decimator(3, sample_rate=200)
+    expected = _reference(samples, decimator.kernel, 3)
+    result = _decimate(decimator, samples, 32, convert=lambda block: numpy.array(block, dtype=numpy.uint32))
+    assert result == expected
+
+
+def test_decimator_channels():
+    from max30105 import Decimator
+    red = _signal(100, seed=1)
+    ir = _signal(100, seed=2)
+    decimator = Decimator(2, kernel=(8192, 16384, 8192))
+    result_red = []
+    result_ir = []
+    for x in range(0, 100, 10):
+        result_red.extend(decimator.process(red[x:x + 10], channel='red'))
+        result_ir.extend(decimator.process(ir[x:x + 10], channel='ir'))
+    assert result_red == _reference(red, decimator.kernel, 2)
+    assert result_ir == _reference(ir, decimator.kernel, 2)
+
+
+def test_decimator_rejects_alias():
+    from max30105 import Decimator
+    rate = 400
+    decimator = Decimator(8, sample_rate=rate)
+
+    def amplitude(frequency):
+        samples = [int(10000 * math.sin(2 * math.pi * frequency * x / rate)) for x in range(4000)]
+        output = decimator.process(samples)[100:]
+        decimator.reset()
+        return max(abs(x) for x in output)
+
+    # Output rate is 50Hz, 40Hz would alias to 10Hz
+    assert amplitude(5) > 9000
+    assert amplitude(40) < 500
+
+
+def test_decimator_requires_rate():
+    from max30105 import Decimator
+    with pytest.raises(ValueError):
+        Decimator(4)
+
+
+def test_decimator_frames():
+    from array import array
+    from max30105 import Decimator, SampleFrames
+    red = _signal(64, seed=1)
+    ir = _signal(64, seed=2)
+    timestamps = array('d', [x * 0.01 for x in range(64)])
+    frames = SampleFrames(('red', 'ir'), [red, ir], dropped=3, timestamps=timestamps)
+
+    decimator = Decimator(4, kernel=(8192, 16384, 8192))
+    result = decimator.process_frames(frames)
+
+    assert result.channels == ('red', 'ir')
+    assert result.dropped == 3
+    assert list(result.red) == _reference(red, decimator.kernel, 4)
+    assert list(result.ir) == _reference(ir, decimator.kernel, 4)
+    # Each output is stamped with the newest input in its window
+    assert list(result.timestamps) == [timestamps[x] for x in range(0, 64, 4)]
@@ -66,3 +66,22 @@ def test_set_slot_mode():
 
     with pytest.raises(ValueError):
         max30105.set_slot_mode(1, 'puce')
+
+
+def test_start_read_temperature():
+    from max30105 import MAX30105
+    bus = MockSMBusNoTimeout(1, default_registers={
+        0x01: 0b00000000,  # Die temp NOT ready
+        0x09: 0b00000111,  # Hard default value to avoid error
+        0x1f: 25,          # Integer temperature
+        0x20: 8            # Fractional temperature, 8 * 0.0625
+    })
+    max30105 = MAX30105(i2c_dev=bus)
+
+    max30105.start_temperature()
+    assert bus.regs[0x21] == 1
+    assert bus.regs[0x03] == 0b00000010
+    assert max30105.read_temperature() is None
+
+    bus.regs[0x01] = 0b00000010
+    assert max30105.read_temperature() == 25.5
@@ -0,0 +1,362 @@
+from i2cdevice import MockSMBus
+import pytest
+
+
+class MockSMBusFIFO(MockSMBus):
+    """Model the sample FIFO pointers, overflow counter and data register."""
+    def __init__(self, i2c_bus, default_registers=None):
+        MockSMBus.__init__(self, i2c_bus, default_registers=default_registers)
+        self.fifo = bytearray()
+        self.unread = 0
+        self.consumed = 0
+        self.sample_size = 3
+
+    def push(self, samples):
+        for sample in samples:
+            self.sample_size = len(sample) * 3
+            if self.unread == 32:
+                # Roll over, discarding the oldest sample
+                del self.fifo[:self.sample_size]
+                self.regs[0x05] = min(self.regs[0x05] + 1, 0x1f)
+                self.regs[0x06] = (self.regs[0x06] + 1) & 0x1f
+            else:
+                self.unread += 1
+            for word in sample:
+                self.fifo += bytearray([(word >> 16) & 0xff, (word >> 8) & 0xff, word & 0xff])
+            self.regs[0x04] = (self.regs[0x04] + 1) & 0x1f
+
+    def write_i2c_block_data(self, i2c_address, register, values):
+        # Simulate an immediate soft reset success
+        if register == 0x09:
+            values[0] &= ~0b01000000
+        MockSMBus.write_i2c_block_data(self, i2c_address, register, values)
+
+    def read_i2c_block_data(self, i2c_address, register, length):
+        if register == 0x07:
+            data, self.fifo = self.fifo[:length], self.fifo[length:]
+            self.consumed += len(data)
+            popped = self.consumed // self.sample_size
+            self.consumed %= self.sample_size
+            if popped:
+                self.unread -= popped
+                self.regs[0x05] = 0
+                self.regs[0x06] = (self.regs[0x06] + popped) & 0x1f
+            return list(data)
+        return MockSMBus.read_i2c_block_data(self, i2c_address, register, length)
+
+
+def _setup_sensor(leds_enable=3):
+    from max30105 import MAX30105
+    bus = MockSMBusFIFO(1, default_registers={0x09: 0b00000111})
+    max30105 = MAX30105(i2c_dev=bus)
+    max30105.setup(leds_enable=leds_enable)
+    return max30105, bus
+
+
+def test_get_samples_empty():
+    max30105, bus = _setup_sensor()
+    assert max30105.get_samples() is None
+
+
+def test_get_samples():
+    max30105, bus = _setup_sensor(leds_enable=3)
+    bus.push([(0x03ffff, 0x012345, 0x000001), (0x020000, 0x00ff00, 0x0000ff)])
+    assert max30105.get_samples() == [0x03ffff, 0x012345, 0x000001, 0x020000, 0x00ff00, 0x0000ff]
+
+
+def test_get_samples_multiple_blocks():
+    max30105, bus = _setup_sensor(leds_enable=3)
+    samples = [(x, x << 6, x << 12) for x in range(20)]
+    bus.push(samples)
+    assert max30105.get_samples() == [word for sample in samples for word in sample]
+
+
+def test_get_samples_into():
+    from max30105 import sample_buffer
+    max30105, bus = _setup_sensor(leds_enable=2)
+    out = sample_buffer()
+    bus.push([(0x03ffff, 0x000102), (0x010203, 0x020304)])
+    assert max30105.get_samples_into(out) == 4
+    assert out[:4].tolist() == [0x03ffff, 0x000102, 0x010203, 0x020304]
+    assert max30105.get_samples_into(out) == 0
+
+
+def test_get_samples_into_numpy():
+    numpy = pytest.importorskip('numpy')
+    from max30105 import sample_buffer
+    max30105, bus = _setup_sensor(leds_enable=2)
+    out = sample_buffer(use_numpy=True)
+    out[:] = 0xffffffff
+    bus.push([(0x03ffff, 0x000102), (0x010203, 0x020304)])
+    assert max30105.get_samples_into(out) == 4
+    assert out.dtype == numpy.uint32
+    assert out[:4].tolist() == [0x03ffff, 0x000102, 0x010203, 0x020304]
+
+
+def test_decode_words_reused_buffer():
+    from max30105 import sample_buffer, _decode_words
+    out = sample_buffer(8)
+    out[0] = 0xffffffff
+    _decode_words(bytearray([0x00, 0x00, 0x01, 0x03, 0xff, 0xff]), 2, out)
+    assert out[:2].tolist() == [0x000001, 0x03ffff]
+
+
+def test_get_frames():
+    max30105, bus = _setup_sensor(leds_enable=3)
+    assert max30105.get_channels() == ('red', 'ir', 'green')
+    bus.push([(1, 2, 3), (4, 5, 6), (7, 8, 9)])
+    frames = max30105.get_frames()
+    assert len(frames) == 3
+    assert frames.channels == ('red', 'ir', 'green')
+    assert frames.red.tolist() == [1, 4, 7]
+    assert frames.ir.tolist() == [2, 5, 8]
+    assert frames['green'].tolist() == [3, 6, 9]
+    assert max30105.get_frames() is None
+
+
+def test_get_frames_numpy():
+    pytest.importorskip('numpy')
+    max30105, bus = _setup_sensor(leds_enable=2)
+    bus.push([(1, 2), (3, 4)])
+    frames = max30105.get_frames(use_numpy=True)
+    assert frames.red.tolist() == [1, 3]
+    assert frames.ir.tolist() == [2, 4]
+    assert 'green' not in frames
+    with pytest.raises(AttributeError):
+        frames.green
+
+
+def test_get_frames_slot_layout():
+    max30105, bus = _setup_sensor(leds_enable=3)
+    max30105.set_slot_mode(1, 'green')
+    max30105.set_slot_mode(2, 'off')
+    assert max30105.get_channels() == ('green',)
+    bus.push([(10,), (11,)])
+    assert max30105.get_frames().green.tolist() == [10, 11]
+
+    max30105.set_mode('red_ir')
+    assert max30105.get_channels() == ('red', 'ir')
+
+
+def test_get_samples_pointer_wrap():
+    max30105, bus = _setup_sensor(leds_enable=1)
+    bus.regs[0x04] = bus.regs[0x06] = 30
+    bus.push([(x,) for x in range(4)])
+    assert bus.regs[0x04] == 2
+    assert max30105.get_samples() == [0, 1, 2, 3]
+    assert max30105.get_overflow_count() == 0
+    assert max30105.get_samples() is None
+
+
+def test_get_samples_leaves_unread_samples():
+    max30105, bus = _setup_sensor(leds_enable=1)
+    bus.push([(1,), (2,)])
+    assert max30105.get_samples() == [1, 2]
+    bus.push([(3,)])
+    assert max30105.get_samples() == [3]
+
+
+def test_get_frames_overflow():
+    max30105, bus = _setup_sensor(leds_enable=2)
+    bus.push([(x, x) for x in range(40)])
+    frames = max30105.get_frames()
+    assert frames.dropped == 8
+    assert frames.red.tolist() == list(range(8, 40))
+    assert max30105.get_overflow_count() == 8
+    bus.push([(40, 40)])
+    frames = max30105.get_frames()
+    assert frames.dropped == 0
+    assert frames.ir.tolist() == [40]
+
+
+def test_wait_for_frames():
+    max30105, bus = _setup_sensor(leds_enable=2)
+    calls = []
+
+    def wait(timeout):
+        calls.append(timeout)
+        bus.push([(1, 2), (3, 4)])
+        return True
+
+    frames = max30105.wait_for_frames(wait, timeout=1.0)
+    assert calls == [1.0]
+    assert frames.ir.tolist() == [2, 4]
+
+
+def test_wait_for_frames_timeout():
+    max30105, bus = _setup_sensor(leds_enable=2)
+    bus.push([(1, 2)])
+    assert max30105.wait_for_frames(lambda timeout: False, timeout=0.1) is None
+    assert bus.unread == 1
+
+
+class FakeGPIO(object):
+    BCM = 11
+    IN = 1
+    FALLING = 32
+    PUD_UP = 22
+
+    def __init__(self, level=1, edge=True):
+        self.level = level
+        self.edge = edge
+        self.timeouts = []
+
+    def setup(self, pin, mode, pull_up_down=None):
+        self.pin = pin
+
+    def input(self, pin):
+        return self.level
+
+    def wait_for_edge(self, pin, edge, timeout=None):
+        self.timeouts.append(timeout)
+        return pin if self.edge else None
+
+
+def test_gpio_interrupt_wait():
+    from max30105 import gpio_interrupt_wait
+    gpio = FakeGPIO()
+    wait = gpio_interrupt_wait(4, gpio=gpio)
+    assert gpio.pin == 4
+    assert wait() is True
+    assert wait(0.5) is True
+    assert gpio.timeouts == [None, 500]
+
+    gpio.edge = False
+    assert wait(0.1) is False
+
+    # An already asserted pin should not wait for an edge
+    gpio.level = 0
+    assert wait(0.1) is True
+    assert len(gpio.timeouts) == 3
+
+
+def test_get_frames_timestamps():
+    max30105, bus = _setup_sensor(leds_enable=2)
+    assert max30105.get_sample_rate() == 100
+    bus.push([(1, 2), (3, 4), (5, 6)])
+    frames = max30105.get_frames()
+    assert len(frames.timestamps) == 3
+    assert frames.timestamps[1] - frames.timestamps[0] == pytest.approx(0.01)
+
+
+def test_get_frames_temperature():
+    max30105, bus = _setup_sensor(leds_enable=1)
+    bus.regs[0x1f] = 30
+    max30105.set_temperature_interval(10.0)
+
+    bus.push([(1,)])
+    frames = max30105.get_frames()
+    # First drain starts a conversion
+    assert bus.regs[0x21] == 1
+    assert frames.temperature is None
+
+    bus.regs[0x21] = 0
+    bus.regs[0x01] = 0b00000010
+    bus.push([(2,)])
+    assert max30105.get_frames().temperature == 30
+
+    # Nothing more happens until the interval has passed
+    bus.regs[0x1f] = 31
+    bus.push([(3,)])
+    assert max30105.get_frames().temperature == 30
+    assert bus.regs[0x21] == 0
+
+
+class MockSMBusFIFOLog(MockSMBusFIFO):
+    """Log the length of every FIFO_DATA block read."""
+    def __init__(self, i2c_bus, default_registers=None):
+        MockSMBusFIFO.__init__(self, i2c_bus, default_registers=default_registers)
+        self.data_reads = []
+
+    def read_i2c_block_data(self, i2c_address, register, length):
+        if register == 0x07:
+            self.data_reads.append(length)
+        return MockSMBusFIFO.read_i2c_block_data(self, i2c_address, register, length)
+
+
+@pytest.mark.parametrize('max_transfer,expected', [(32, [27] * 10 + [18]), (96, [90] * 3 + [18]), (288, [288]), (4, [4] * 72)])
+def test_get_samples_max_transfer(max_transfer, expected):
+    from max30105 import MAX30105
+    bus = MockSMBusFIFOLog(1, default_registers={0x09: 0b00000111})
+    max30105 = MAX30105(i2c_dev=bus, max_transfer=max_transfer)
+    max30105.setup(leds_enable=3)
+    samples = [(x, x << 6, x << 12) for x in range(31)] + [(1, 2, 3)]
+    bus.push(samples)
+    bus.regs[0x05] = 1
+    assert max30105.get_samples() == [word for sample in samples for word in sample]
+    assert bus.data_reads == expected
+
+
+def test_get_samples_i2c_rdwr():
+    pytest.importorskip('smbus2')
+    from max30105 import MAX30105
+    from max30105.simulator import SimulatedSMBus
+    bus = SimulatedSMBus(clock=lambda: 0.0)
+    max30105 = MAX30105(i2c_dev=bus)
+    max30105.setup(leds_enable=3)
+    assert max30105._i2c_rdwr
+    bus.generate(31)
+    bus.transactions = 0
+    frames = max30105.get_frames()
+    assert len(frames) == 31
+    # Status burst, then the whole FIFO in one combined transaction
+    assert bus.transactions == 2
+
+
+@pytest.mark.parametrize('i2c_rdwr,funcs,expected', [
+    (None, None, True),
+    (None, 0x0c000001, True),
+    (None, 0x0c000000, False),
+    (False, 0x0c000001, False),
+    (True, 0x0c000000, True)
+])
+def test_i2c_rdwr_detect(i2c_rdwr, funcs, expected):
+    pytest.importorskip('smbus2')
+    from max30105 import MAX30105
+    from max30105.simulator import SimulatedSMBus
+    bus = SimulatedSMBus()
+    bus.funcs = funcs
+    assert MAX30105(i2c_dev=bus, i2c_rdwr=i2c_rdwr)._i2c_rdwr == expected
+
+
+def test_i2c_rdwr_not_detected_without_method():
+    from max30105 import MAX30105
+    assert not MAX30105(i2c_dev=MockSMBusFIFO(1))._i2c_rdwr
+
+
+class FailingRdwrBus(object):
+    """Claim I2C support, but fail every combined transaction, like a misreporting adapter."""
+    funcs = 0x0c000001
+
+    def __init__(self, bus):
+        self.bus = bus
+
+    def __getattr__(self, name):
+        return getattr(self.bus, name)
+
+    def i2c_rdwr(self, *i2c_msgs):
+        raise IOError(95, "Operation not supported")
+
+
+def test_i2c_rdwr_fallback():
+    pytest.importorskip('smbus2')
+    from max30105 import MAX30105
+    inner = MockSMBusFIFOLog(1, default_registers={0x09: 0b00000111})
+    max30105 = MAX30105(i2c_dev=FailingRdwrBus(inner))
+    max30105.setup(leds_enable=2)
+    assert max30105._i2c_rdwr
+    inner.push([(1, 2), (3, 4)])
+    assert max30105.get_samples() == [1, 2, 3, 4]
+    assert not max30105._i2c_rdwr
+    assert inner.data_reads == [12]
+
+
+def test_i2c_rdwr_forced_raises():
+    pytest.importorskip('smbus2')
+    from max30105 import MAX30105
+    inner = MockSMBusFIFO(1, default_registers={0x09: 0b00000111})
+    max30105 = MAX30105(i2c_dev=FailingRdwrBus(inner), i2c_rdwr=True)
+    max30105.setup(leds_enable=2)
+    inner.push([(1, 2)])
+    with pytest.raises(IOError):
+        max30105.get_samples()
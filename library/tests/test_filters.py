@@ -0,0 +1,127 @@
+import math
+
+import pytest
+
+
+def _gain(kernel, frequency, rate):
+    # Magnitude response of a symmetric kernel, relative to 1 << 15
+    middle = len(kernel) // 2
+    return abs(sum(tap * math.cos(2 * math.pi * frequency / rate * (n - middle)) for n, tap in enumerate(kernel))) / 32768.0
+
+
+def test_low_pass_kernel():
+    from max30105.filters import FilterBank
+    kernel = FilterBank().get_low_pass(400, 4, 5.0)
+    assert len(kernel) % 2 == 1
+    assert list(kernel) == list(kernel[::-1])
+    assert sum(kernel) == 1 << 15
+    assert _gain(kernel, 1.0, 100) == pytest.approx(1.0, abs=0.01)
+    assert _gain(kernel, 15.0, 100) < 0.01
+
+
+def test_band_pass_kernel():
+    from max30105.filters import FilterBank
+    kernel = FilterBank().get_band_pass(100, 1, 1.0, 4.0, transition=2.0)
+    assert sum(kernel) == 0
+    assert _gain(kernel, 2.0, 100) == pytest.approx(1.0, abs=0.05)
+    assert _gain(kernel, 20.0, 100) < 0.01
+
+
+def test_max_taps():
+    from max30105.filters import FilterBank
+    with pytest.warns(RuntimeWarning, match='Decimator'):
+        kernel = FilterBank(max_taps=63).get_low_pass(3200, 1, 5.0)
+    assert len(kernel) == 63
+    # The cap widens the transition band, a 5Hz cutoff passes well above 5Hz
+    assert _gain(kernel, 20.0, 3200) > 0.5
+
+
+def test_max_taps_not_reached(recwarn):
+    from max30105.filters import FilterBank
+    FilterBank().get_low_pass(400, 4, 5.0)
+    assert len(recwarn) == 0
+
+
+def test_invalid_cutoff():
+    from max30105.filters import FilterBank
+    with pytest.raises(ValueError):
+        FilterBank().get_low_pass(100, 4, 20.0)
+    with pytest.raises(ValueError):
+        FilterBank().get_band_pass(100, 1, 4.0, 2.0)
+
+
+def test_bank_memoised():
+    from max30105.filters import FilterBank
+    bank = FilterBank()
+    kernel = bank.get_low_pass(400, 4, 5.0)
+    assert bank.get_low_pass(400, 4, 5.0) is kernel
+    assert bank.get_low_pass(800, 8, 5.0) is not kernel
+    assert len(bank) == 2
+    bank.clear()
+    assert len(bank) == 0
+
+
+def test_heartrate_shares_bank():
+    from max30105 import HeartRate
+    from test_simulator import _simulated_sensor
+    max30105, bus, clock = _simulated_sensor()
+    first = HeartRate(max30105, cutoff=5.0)
+    second = HeartRate(max30105, cutoff=5.0)
+    first.update_filter()
+    second.update_filter()
+    assert first._kernel is second._kernel
+    assert len(first.buf) >= len(first._kernel)
+
+
+def test_heartrate_set_filter_invalid():
+    from max30105 import HeartRate
+    with pytest.raises(ValueError):
+        HeartRate(None).set_filter([1, 2, 3, 4])
+    with pytest.raises(ValueError):
+        HeartRate(None).set_filter([1, 2, 3])
+
+
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_heartrate_designed_filter_bit_exact(monkeypatch, use_numpy):
+    import max30105
+    from max30105 import HeartRate
+    from max30105.filters import bank
+    from test_heartrate import _signal, _scalar
+    if use_numpy:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(max30105, 'numpy', None)
+
+    kernel = bank.get_band_pass(400, 4, 0.5, 5.0)
+    samples = _signal(300)
+
+    scalar = HeartRate(None)
+    scalar.set_filter(kernel)
+    expected = _scalar(scalar, samples)
+
+    heartrate = HeartRate(None)
+    heartrate.set_filter(kernel)
+    result = []
+    for x in range(0, len(samples), 32):
+        result += list(heartrate.process_block(samples[x:x + 32]))
+
+    assert result == expected
+
+
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')
+def test_heartrate_designed_filter_detects_pulse():
+    from max30105 import HeartRate
+    from max30105.simulator import PPGSource
+    from test_simulator import _simulated_sensor
+    max30105, bus, clock = _simulated_sensor(source=PPGSource(heart_rate=90, seed=2))
+    heartrate = HeartRate(max30105, band=(0.5, 5.0))
+    heartrate.reset(4)
+
+    samples = []
+    for _ in range(100):
+        clock.now += 0.1
+        samples += list(max30105.get_frames().ir)
+
+    heartrate.track_beats(samples, [x / 100.0 for x in range(len(samples))])
+    assert heartrate.bpm_avg == pytest.approx(90, abs=3)
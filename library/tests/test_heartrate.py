@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+
+def _signal(count, seed=0):
+    rng = random.Random(seed)
+    # Slow sinusoid-ish wander around a large DC offset with noise, like a finger on the sensor
+    return [50000 + int(2000 * ((x % 80) - 40) / 40.0) + rng.randint(-200, 200) for x in range(count)]
+
+
+def _scalar(heartrate, samples):
+    return [heartrate.low_pass_fir(sample - heartrate.average_dc_estimator(sample)) for sample in samples]
+
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+@pytest.mark.parametrize('block_size', [1, 7, 32, 100])
+def test_process_block_bit_exact(monkeypatch, use_numpy, block_size):
+    import max30105
+    from max30105 import HeartRate
+    if use_numpy:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(max30105, 'numpy', None)
+
+    samples = _signal(300)
+    expected = _scalar(HeartRate(None), samples)
+
+    heartrate = HeartRate(None)
+    result = list(heartrate.process_block([]))
+    for x in range(0, len(samples), block_size):
+        result += list(heartrate.process_block(samples[x:x + block_size]))
+        result += list(heartrate.process_block([]))
+
+    assert result == expected
+
+
+def test_process_block_interleaved_with_scalar():
+    from max30105 import HeartRate
+    samples = _signal(120, seed=1)
+    expected = _scalar(HeartRate(None), samples)
+
+    heartrate = HeartRate(None)
+    result = heartrate.process_block(samples[:50])
+    result += _scalar(heartrate, samples[50:70])
+    result += heartrate.process_block(samples[70:])
+
+    assert result == expected
+
+
+def test_process_block_numpy_array():
+    numpy = pytest.importorskip('numpy')
+    from max30105 import HeartRate
+    samples = _signal(64, seed=2)
+    expected = _scalar(HeartRate(None), samples)
+
+    result = HeartRate(None).process_block(numpy.array(samples, dtype=numpy.uint32))
+    assert isinstance(result, numpy.ndarray)
+    assert result.tolist() == expected
+
+    result = HeartRate(None).process_block(numpy.zeros(0, dtype=numpy.uint32))
+    assert isinstance(result, numpy.ndarray)
+    assert len(result) == 0
+
+
+def test_check_for_beat_matches_block():
+    from max30105 import HeartRate
+    samples = _signal(400, seed=3)
+
+    scalar = HeartRate(None)
+    expected = [scalar.check_for_beat(sample) for sample in samples]
+
+    block = HeartRate(None)
+    result = [block._check_edges(ir) for ir in block.process_block(samples)]
+
+    assert result == expected
+    assert any(result)
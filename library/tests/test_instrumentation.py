@@ -0,0 +1,61 @@
+from test_simulator import _simulated_sensor
+
+
+def test_instrumentation_disabled():
+    max30105, bus, clock = _simulated_sensor()
+    assert max30105.get_instrumentation() is None
+    max30105.disable_instrumentation()
+
+
+def test_instrumentation_transfers():
+    max30105, bus, clock = _simulated_sensor(leds_enable=3)
+    events = []
+    max30105.enable_instrumentation(lambda event, fields: events.append((event, fields)))
+
+    clock.now += 0.1
+    max30105.get_frames()
+    max30105.set_led_pulse_amplitude(1, 12.5)
+
+    stats = max30105.get_instrumentation()
+    assert stats['registers']['FIFO_WRITE']['reads'] == 1
+    # One combined transaction for the whole FIFO
+    assert stats['registers']['FIFO_DATA']['reads'] == 1
+    assert stats['registers']['FIFO_DATA']['bytes'] == 90
+    assert stats['registers']['LED_PULSE_AMPLITUDE']['writes'] == 1
+    assert stats['transactions'] == 3 == bus.transactions - 8
+
+    assert [event for event, fields in events] == ['transfer', 'transfer', 'drain', 'transfer']
+    assert events[0][1]['register'] == 'FIFO_WRITE'
+
+
+def test_instrumentation_drains():
+    max30105, bus, clock = _simulated_sensor(leds_enable=2)
+    instrumentation = max30105.enable_instrumentation()
+
+    max30105.get_frames()
+    clock.now += 0.1
+    max30105.get_frames()
+    clock.now += 0.5
+    max30105.get_frames()
+
+    stats = instrumentation.snapshot()
+    assert stats['drains'] == 3
+    assert stats['empty_drains'] == 1
+    assert stats['samples'] == 42
+    assert stats['fill_last'] == 32
+    assert stats['fill_max'] == 32
+    assert stats['overflows'] == 1
+    assert stats['samples_lost'] == 18
+
+    instrumentation.reset()
+    assert instrumentation.snapshot()['drains'] == 0
+
+
+def test_instrumentation_disable():
+    max30105, bus, clock = _simulated_sensor()
+    max30105.enable_instrumentation()
+    max30105.disable_instrumentation()
+    assert max30105._max30105._i2c is bus
+    clock.now += 0.1
+    assert len(max30105.get_frames()) == 10
+    assert max30105.get_instrumentation() is None
@@ -0,0 +1,134 @@
+import pytest
+
+from test_fifo import MockSMBusFIFO
+
+
+class MockMuxedBus(object):
+    """A bus with TCA9548As routing to one MockSMBusFIFO per channel, and optionally a sensor directly on the bus."""
+    def __init__(self, i2c_bus, channels=8, direct=False, muxes=1):
+        self.channels = channels
+        self.devices = [MockSMBusFIFO(i2c_bus, default_registers={0x09: 0b00000111}) for _ in range(channels * muxes)]
+        self.direct = MockSMBusFIFO(i2c_bus, default_registers={0x09: 0b00000111}) if direct else None
+        self.switches = []
+        self.controls = dict((0x70 + mux, 0) for mux in range(muxes))
+
+    def write_byte(self, i2c_address, value):
+        assert i2c_address in self.controls
+        self.switches.append(value)
+        self.controls[i2c_address] = value
+
+    def get_device(self):
+        devices = [self.direct] if self.direct is not None else []
+        for i2c_address, value in self.controls.items():
+            if value:
+                devices.append(self.devices[(i2c_address - 0x70) * self.channels + value.bit_length() - 1])
+        assert len(devices) == 1, "{} devices answered".format(len(devices))
+        return devices[0]
+
+    def write_i2c_block_data(self, i2c_address, register, values):
+        self.get_device().write_i2c_block_data(i2c_address, register, values)
+
+    def read_i2c_block_data(self, i2c_address, register, length):
+        return self.get_device().read_i2c_block_data(i2c_address, register, length)
+
+
+def test_constructor_address():
+    from max30105 import MAX30105
+    max30105 = MAX30105(i2c_addr=0x58, i2c_dev=MockSMBusFIFO(1))
+    assert max30105._max30105._i2c_address == 0x58
+
+
+def test_tca9548a_select():
+    from max30105.manager import TCA9548A
+    bus = MockMuxedBus(1)
+    mux = TCA9548A(bus)
+    assert mux.select(3) is True
+    assert mux.select(3) is False
+    assert mux.select(0) is True
+    assert bus.switches == [0b1000, 0b1]
+    with pytest.raises(ValueError):
+        mux.select(8)
+    assert mux.disconnect() is True
+    assert mux.disconnect() is False
+    assert bus.switches == [0b1000, 0b1, 0]
+
+
+def test_shared_bus():
+    from max30105.manager import SensorManager
+    created = []
+
+    def smbus(bus):
+        created.append(bus)
+        return MockMuxedBus(bus)
+
+    manager = SensorManager(smbus=smbus)
+    manager.add_sensor('a', bus=1, mux_channel=0)
+    manager.add_sensor('b', bus=1, mux_channel=1)
+    manager.add_sensor('c', bus=3, mux_channel=0)
+    assert created == [1, 3]
+
+    with pytest.raises(ValueError):
+        manager.add_sensor('d', bus=1, mux_channel=1)
+    with pytest.raises(ValueError):
+        manager.add_sensor('a', bus=1, mux_channel=2)
+
+
+def test_poll():
+    from max30105.manager import SensorManager
+    bus = MockMuxedBus(1)
+    manager = SensorManager(smbus=lambda number: bus)
+    for channel in range(3):
+        manager.add_sensor(channel, mux_channel=channel)
+
+    manager.setup(leds_enable=1)
+    # Each channel selected once to set up
+    assert bus.switches == [0b1, 0b10, 0b100]
+
+    for channel, device in enumerate(bus.devices[:3]):
+        device.push([(channel * 10 + x,) for x in range(channel + 1)])
+
+    del bus.switches[:]
+    result = dict((name, frames.red.tolist()) for name, frames in manager.poll())
+    assert result == {0: [0], 1: [10, 11], 2: [20, 21, 22]}
+    assert sorted(bus.switches) == [0b1, 0b10, 0b100]
+
+    # Nothing is due straight after a drain
+    assert manager.poll() == []
+    assert manager.get_next_due() > 0
+
+    bus.devices[1].push([(12,)])
+    assert [(name, frames.red.tolist()) for name, frames in manager.poll(force=True)] == [(1, [12])]
+
+
+def test_direct_and_muxed_sensor():
+    from max30105.manager import SensorManager
+    bus = MockMuxedBus(1, direct=True)
+    manager = SensorManager(smbus=lambda number: bus)
+    manager.add_sensor('direct')
+
+    # A sensor directly on the bus would answer alongside one at the same address behind a mux
+    with pytest.raises(ValueError):
+        manager.add_sensor('muxed', mux_channel=2)
+    manager.add_sensor('muxed', mux_channel=2, i2c_addr=0x58)
+
+    manager = SensorManager(smbus=lambda number: bus)
+    manager.add_sensor('muxed', mux_channel=2)
+    with pytest.raises(ValueError):
+        manager.add_sensor('direct')
+
+
+def test_multiple_muxes():
+    from max30105.manager import SensorManager
+    bus = MockMuxedBus(1, muxes=2)
+    manager = SensorManager(smbus=lambda number: bus)
+    manager.add_sensor('a', mux_channel=0, mux_address=0x70)
+    manager.add_sensor('b', mux_channel=0, mux_address=0x71)
+
+    manager.setup(leds_enable=1)
+    bus.devices[0].push([(1,)])
+    bus.devices[8].push([(2,), (3,)])
+
+    # Selecting a sensor disconnects the other mux, so only one sensor answers at 0x57
+    result = dict((name, frames.red.tolist()) for name, frames in manager.poll(force=True))
+    assert result == {'a': [1], 'b': [2, 3]}
+    assert bus.controls == {0x70: 0, 0x71: 0b1} or bus.controls == {0x70: 0b1, 0x71: 0}
@@ -0,0 +1,62 @@
+import pytest
+
+from test_heartrate import _signal
+
+
+def _expected(samples, timestamps, average_over=4):
+    from max30105 import HeartRate
+    heartrate = HeartRate(None)
+    heartrate.reset(average_over)
+    return heartrate.track_beats(samples, timestamps)
+
+
+def test_offload_matches_in_process():
+    pytest.importorskip('multiprocessing.shared_memory')
+    from max30105.offload import BeatWorkerPool
+
+    signals = [_signal(600, seed=sensor) for sensor in range(3)]
+    timestamps = [x / 100.0 for x in range(600)]
+
+    with BeatWorkerPool(3, workers=2, slots=2) as pool:
+        for x in range(0, 600, 25):
+            for sensor, samples in enumerate(signals):
+                pool.submit(sensor, samples[x:x + 25], timestamps[x:x + 25])
+
+    beats = pool.get_beats(timeout=1.0)
+
+    for sensor, samples in enumerate(signals):
+        expected = _expected(samples, timestamps)
+        assert len(expected) > 0
+        assert [beat[1:] for beat in beats if beat[0] == sensor] == expected
+
+
+def test_offload_splits_large_blocks():
+    pytest.importorskip('multiprocessing.shared_memory')
+    from max30105.offload import BeatWorkerPool
+
+    samples = _signal(400)
+    timestamps = [x / 100.0 for x in range(400)]
+
+    with BeatWorkerPool(1, block_size=32) as pool:
+        pool.submit(0, samples, timestamps)
+
+    assert [beat[1:] for beat in pool.get_beats(timeout=1.0)] == _expected(samples, timestamps)
+
+
+def test_offload_stop_with_unread_beats():
+    pytest.importorskip('multiprocessing.shared_memory')
+    from max30105.offload import BeatWorkerPool
+
+    from max30105.simulator import PPGSource
+
+    # Over an hour of beats fills the result pipe, the worker can only exit once they are read
+    samples = [sample[0] for sample in PPGSource(heart_rate=72, seed=1).get_samples(('ir',), 0, 100 * 3600, 100)]
+    timestamps = [x / 100.0 for x in range(len(samples))]
+
+    with BeatWorkerPool(1, block_size=4000) as pool:
+        pool.submit(0, samples, timestamps)
+
+    beats = pool.get_beats()
+    assert len(beats) > 4000
+    assert [beat[1:] for beat in beats] == _expected(samples, timestamps)
+    assert pool.get_beats() == []
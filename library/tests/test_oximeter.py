@@ -0,0 +1,111 @@
+from array import array
+
+import pytest
+
+
+def _frames(count, start=0, red_ac=0.02, ir_ac=0.04, period=50, use_numpy=False):
+    from max30105 import SampleFrames
+    red = []
+    ir = []
+    for x in range(start, start + count):
+        # A triangle wave, so each period's minimum and maximum are exact
+        phase = abs(((x % period) / float(period)) * 2 - 1)
+        red.append(int(100000 * (1 + red_ac * phase)))
+        ir.append(int(200000 * (1 + ir_ac * phase)))
+    timestamps = array('d', [x / 50.0 for x in range(start, start + count)])
+    if use_numpy:
+        numpy = pytest.importorskip('numpy')
+        red = numpy.array(red, dtype=numpy.uint32)
+        ir = numpy.array(ir, dtype=numpy.uint32)
+    return SampleFrames(('red', 'ir'), [red, ir], timestamps=timestamps)
+
+
+def _expected_ratio(red_ac, ir_ac):
+    # AC / DC of each channel, the DC being the mean of the triangle wave
+    return (red_ac / (1 + red_ac / 2)) / (ir_ac / (1 + ir_ac / 2))
+
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+@pytest.mark.parametrize('block_size', [1, 13, 50, 200])
+def test_oximeter_fixed_windows(use_numpy, block_size):
+    from max30105 import Oximeter
+    oximeter = Oximeter(window_size=50)
+    readings = []
+    for x in range(0, 400, block_size):
+        readings += oximeter.update(_frames(block_size, start=x, use_numpy=use_numpy))
+
+    assert len(readings) == 400 // 50
+    # Each reading is stamped with the last sample of its window
+    assert [t for t, ratio, spo2, perfusion in readings] == pytest.approx([(x * 50 + 49) / 50.0 for x in range(8)])
+    for t, ratio, spo2, perfusion in readings:
+        assert ratio == pytest.approx(_expected_ratio(0.02, 0.04), rel=0.01)
+        assert perfusion == pytest.approx(100 * 0.04 / 1.02, rel=0.01)
+    assert oximeter.perfusion['red'] == pytest.approx(100 * 0.02 / 1.01, rel=0.01)
+
+
+def test_oximeter_spo2_calibration():
+    from max30105 import Oximeter
+    oximeter = Oximeter(window_size=50, calibration=(0, -25, 110))
+    oximeter.update(_frames(50, red_ac=0.03, ir_ac=0.03))
+    assert oximeter.ratio == pytest.approx(1.0, rel=0.01)
+    assert oximeter.spo2 == pytest.approx(85, abs=0.5)
+
+    # Readings are clamped to a valid percentage
+    oximeter = Oximeter(window_size=50, calibration=(0, 0, 120))
+    oximeter.update(_frames(50))
+    assert oximeter.spo2 == 100
+
+
+def test_oximeter_beat_windows():
+    from max30105 import Oximeter
+
+    class FakeHeartRate(object):
+        def track_beats(self, samples, timestamps):
+            # A beat at the start of every period
+            return [(t, 60, 60) for t in timestamps if round(t * 50) % 50 == 0]
+
+    oximeter = Oximeter(FakeHeartRate())
+    readings = []
+    for x in range(10, 260, 20):
+        readings += oximeter.update(_frames(20, start=x))
+
+    # Samples before the first beat are discarded, windows then run beat to beat
+    assert len(readings) == 4
+    assert [t for t, ratio, spo2, perfusion in readings] == pytest.approx([1.98, 2.98, 3.98, 4.98])
+    for t, ratio, spo2, perfusion in readings:
+        assert ratio == pytest.approx(_expected_ratio(0.02, 0.04), rel=0.01)
+
+
+def test_oximeter_flat_signal():
+    from max30105 import Oximeter, SampleFrames
+    oximeter = Oximeter(window_size=10)
+    frames = SampleFrames(('red', 'ir'), [[1000] * 10, [0] * 10])
+    assert oximeter.update(frames) == []
+    assert oximeter.spo2 == 0
+
+
+def test_oximeter_requires_channels():
+    from max30105 import Oximeter, SampleFrames
+    with pytest.raises(ValueError):
+        Oximeter(channels=('green', 'ir'))
+    with pytest.raises(ValueError):
+        Oximeter().update(SampleFrames(('ir',), [[1, 2, 3]]))
+
+
+def test_oximeter_synthetic_pulse():
+    from test_simulator import _simulated_sensor
+    from max30105 import HeartRate, Oximeter
+    from max30105.simulator import PPGSource
+    max30105, bus, clock = _simulated_sensor(source=PPGSource(heart_rate=72, seed=1))
+    oximeter = Oximeter(HeartRate(max30105))
+
+    readings = []
+    for _ in range(100):
+        clock.now += 0.1
+        readings += oximeter.update(max30105.get_frames())
+
+    # The simulated pulse is 1% of DC on red and 2% on IR
+    assert len(readings) > 5
+    for t, ratio, spo2, perfusion in readings:
+        assert ratio == pytest.approx(0.5, abs=0.05)
+        assert perfusion == pytest.approx(2.0, abs=0.2)
@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+
+def _reference(samples, mean_size=20, delta_size=10, threshold=10):
+    # The list-based algorithm from examples/detect-particles.py
+    data = []
+    means = []
+    result = []
+    for d in samples:
+        data.append(d)
+        if len(data) > mean_size:
+            data.pop(0)
+        mean = sum(data) / float(len(data))
+        means.append(mean)
+        if len(means) > delta_size:
+            delta = means[-1] - means[-delta_size]
+        else:
+            delta = 0
+        result.append((mean, delta, delta > threshold))
+    return result
+
+
+def _signal(count, seed=0):
+    rng = random.Random(seed)
+    # Noise, with a step up part way through like smoke drifting past
+    return [rng.randint(0, 20) + (200 if 150 < x < 220 else 0) for x in range(count)]
+
+
+@pytest.mark.parametrize('block_size', [1, 7, 32])
+def test_particle_detector_matches_reference(block_size):
+    from max30105 import ParticleDetector
+    samples = _signal(400)
+    expected = _reference(samples)
+
+    detector = ParticleDetector()
+    for x in range(0, len(samples), block_size):
+        block = samples[x:x + block_size]
+        detected = detector.update(block)
+        states = expected[x:x + block_size]
+        mean, delta, last_detected = states[-1]
+        assert detector.mean == pytest.approx(mean)
+        assert detector.delta == pytest.approx(delta)
+        assert detector.detected == last_detected
+        assert detected == any(state[2] for state in states)
+
+
+def test_particle_detector_floats():
+    from max30105 import ParticleDetector
+    rng = random.Random(1)
+    samples = [rng.random() * 1e6 for _ in range(5000)]
+    detector = ParticleDetector(mean_size=5, delta_size=3, threshold=1e5)
+    detector.update(samples)
+    mean, delta, detected = _reference(samples, 5, 3, 1e5)[-1]
+    assert detector.mean == pytest.approx(mean)
+    assert detector.delta == pytest.approx(delta)
+
+
+def test_particle_detector_constant_memory():
+    from max30105 import ParticleDetector
+    detector = ParticleDetector(mean_size=20, delta_size=10)
+    detector.update(_signal(10000))
+    assert len(detector._values) == 20
+    assert len(detector._means) == 10
+
+
+def test_particle_detector_reset():
+    from max30105 import ParticleDetector
+    detector = ParticleDetector()
+    assert detector.update(_signal(200))
+    detector.reset()
+    assert not detector.update([0] * 5)
+    assert detector.mean == 0
@@ -0,0 +1,78 @@
+import pytest
+
+from test_fifo import _setup_sensor
+
+
+def test_record_replay(tmpdir):
+    pytest.importorskip('numpy')
+    from max30105.recording import Recorder, Recording
+    max30105, bus = _setup_sensor(leds_enable=2)
+    path = str(tmpdir.join('test.max30105'))
+
+    blocks = [[(x, 0x03ffff - x) for x in range(start, start + 10)] for start in (0, 10, 20)]
+
+    with Recorder(path, max30105) as recorder:
+        for block in blocks:
+            bus.push(block)
+            frames = recorder.record()
+            assert frames.red.tolist() == [red for red, ir in block]
+        assert recorder.record() is None
+        assert recorder.chunks == 3
+        assert recorder.samples == 30
+
+    with Recording(path) as recording:
+        assert len(recording) == 30
+        assert len(recording.chunks) == 3
+        chunk = recording.chunks[0]
+        assert chunk.channels == ('red', 'ir')
+        assert chunk.sample_rate == 400
+        assert chunk.sample_average == 4
+        assert chunk.raw['ir'].shape == (10, 3)
+        assert chunk['ir'].tolist() == [ir for red, ir in blocks[0]]
+        assert recording.get_channel('red').tolist() == list(range(30))
+        assert recording.get_channel('green').tolist() == []
+        assert len(recording.get_timestamps()) == 30
+
+
+def test_record_overflow(tmpdir):
+    pytest.importorskip('numpy')
+    from max30105.recording import Recorder, Recording
+    max30105, bus = _setup_sensor(leds_enable=1)
+    path = str(tmpdir.join('test.max30105'))
+
+    with Recorder(path, max30105) as recorder:
+        bus.push([(x,) for x in range(40)])
+        recorder.record()
+
+    with Recording(path) as recording:
+        assert recording.chunks[0].dropped == 8
+        assert recording.get_channel('red').tolist() == list(range(8, 40))
+
+
+def test_replay_truncated(tmpdir):
+    pytest.importorskip('numpy')
+    from max30105.recording import Recorder, Recording
+    path = str(tmpdir.join('test.max30105'))
+
+    with Recorder(path) as recorder:
+        recorder.write(bytearray(b'\x00\x00\x01\x00\x00\x02'), ('green',), 1.0, 100)
+        recorder.write(bytearray(b'\x00\x00\x03\x00\x00\x04'), ('green',), 1.02, 100)
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:-2])
+
+    with Recording(path) as recording:
+        assert recording.get_channel('green').tolist() == [1, 2]
+        assert recording.get_timestamps().tolist() == [1.0, 1.01]
+
+
+def test_replay_not_a_recording(tmpdir):
+    pytest.importorskip('numpy')
+    from max30105.recording import Recording
+    path = tmpdir.join('test.txt')
+    path.write('time,green,mean,delta,change_detected,temp\n')
+
+    with pytest.raises(ValueError):
+        Recording(str(path))
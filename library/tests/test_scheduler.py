@@ -0,0 +1,60 @@
+import pytest
+
+from test_simulator import _simulated_sensor
+
+
+def test_scheduler_invalid_target():
+    from max30105 import PollScheduler
+    with pytest.raises(ValueError):
+        PollScheduler(None, target_fill=32)
+    with pytest.raises(ValueError):
+        PollScheduler(None, target_fill=0)
+
+
+def test_scheduler_nominal_interval():
+    from max30105 import PollScheduler
+    max30105, bus, clock = _simulated_sensor()
+
+    scheduler = PollScheduler(max30105, target_fill=10)
+    scheduler.get_frames()
+    # 400sps with 4 sample averaging is 100sps
+    assert scheduler.interval == pytest.approx(0.1)
+
+
+@pytest.mark.parametrize('target_fill', [2, 8, 24])
+def test_scheduler_converges(target_fill):
+    from max30105 import PollScheduler
+    max30105, bus, clock = _simulated_sensor()
+
+    scheduler = PollScheduler(max30105, target_fill=target_fill)
+    fills = []
+    for _ in range(50):
+        frames = scheduler.get_frames()
+        fills.append(len(frames) if frames is not None else 0)
+        # The caller's processing takes some time too
+        clock.now += 0.013
+
+    assert bus.samples_lost == 0
+    assert sum(fills[-20:]) / 20.0 == pytest.approx(target_fill, abs=1)
+
+
+def test_scheduler_backs_off_on_overflow():
+    from max30105 import PollScheduler
+    max30105, bus, clock = _simulated_sensor()
+
+    scheduler = PollScheduler(max30105, target_fill=16)
+    scheduler.get_frames()
+    interval = scheduler.interval
+    scheduler.update(32, dropped=5)
+    assert scheduler.interval == pytest.approx(interval / 2)
+
+
+def test_scheduler_follows_rate_change():
+    from max30105 import PollScheduler, Profile
+    max30105, bus, clock = _simulated_sensor()
+
+    scheduler = PollScheduler(max30105, target_fill=16)
+    scheduler.get_frames()
+    max30105.configure(Profile(sample_average=1))
+    scheduler.get_frames()
+    assert scheduler.interval == pytest.approx(16 / 400.0)
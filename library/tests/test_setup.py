@@ -23,3 +23,121 @@ def test_setup_timeout():
 
     with pytest.raises(RuntimeError):
         max30105.setup(timeout=0.5)
+
+
+class MockSMBusCounting(MockSMBusNoTimeout):
+    def __init__(self, i2c_bus, default_registers=None):
+        MockSMBusNoTimeout.__init__(self, i2c_bus, default_registers=default_registers)
+        self.reads = []
+        self.writes = []
+
+    def write_i2c_block_data(self, i2c_address, register, values):
+        self.writes.append(register)
+        MockSMBusNoTimeout.write_i2c_block_data(self, i2c_address, register, values)
+
+    def read_i2c_block_data(self, i2c_address, register, length):
+        self.reads.append(register)
+        return MockSMBusNoTimeout.read_i2c_block_data(self, i2c_address, register, length)
+
+
+def test_setup_register_shadow():
+    from max30105 import MAX30105
+    bus = MockSMBusCounting(1, default_registers={0x09: 0b00000111})
+    max30105 = MAX30105(i2c_dev=bus)
+    max30105.setup()
+
+    # Only the self-clearing reset bit should be read back
+    assert set(bus.reads) == {0x09}
+    assert bus.regs[0x09] == 0b00000111
+    assert bus.regs[0x0a] == 0b01101110
+
+    del bus.reads[:]
+    del bus.writes[:]
+
+    max30105.set_slot_mode(1, 'green')
+    max30105.set_slot_mode(2, 'off')
+    max30105.set_led_pulse_amplitude(3, 12.5)
+    max30105.set_fifo_almost_full_count(4)
+    max30105.set_fifo_almost_full_enable(True)
+
+    assert bus.reads == []
+    assert bus.writes == [0x11, 0x11, 0x0c, 0x08, 0x02]
+    assert bus.regs[0x11] == 0b00000011
+    assert bus.regs[0x0e] == 62
+    assert bus.regs[0x08] == 0b01010100
+
+
+def test_clear_fifo():
+    from max30105 import MAX30105
+    bus = MockSMBusCounting(1, default_registers={0x04: 5, 0x05: 2, 0x06: 7, 0x09: 0b00000111})
+    max30105 = MAX30105(i2c_dev=bus)
+    max30105.clear_fifo()
+    assert bus.writes == [0x04]
+    assert bus.regs[0x04:0x07] == [0, 0, 0]
+
+
+def test_setup_block_writes():
+    from max30105 import MAX30105
+    bus = MockSMBusCounting(1, default_registers={0x09: 0b00000111})
+    max30105 = MAX30105(i2c_dev=bus)
+    max30105.setup(leds_enable=2, sample_rate=1000, sample_average=8)
+
+    # Reset, three configuration bursts and clearing the FIFO
+    assert bus.writes == [0x09, 0x08, 0x0c, 0x10, 0x04]
+    assert bus.regs[0x08:0x0b] == [0b01110000, 0b00000011, 0b01110110]
+    assert bus.regs[0x0c:0x0f] == [32, 32, 32]
+    assert bus.regs[0x10:0x13] == [32, 0b00100001, 0]
+    assert max30105.get_sample_rate() == 125
+    assert max30105.get_channels() == ('red', 'ir')
+
+
+def test_configure_diff():
+    from max30105 import MAX30105, Profile
+    bus = MockSMBusCounting(1, default_registers={0x09: 0b00000111})
+    max30105 = MAX30105(i2c_dev=bus)
+    max30105.setup()
+    del bus.reads[:]
+    del bus.writes[:]
+
+    assert max30105.configure(Profile(pulse_width=215, led_power=6.4)) == 0
+    assert bus.writes == []
+
+    assert max30105.configure(Profile(pulse_width=411)) == 1
+    assert bus.writes == [0x0a]
+    assert bus.regs[0x0a] == 0b01101111
+
+    # Changes either side of MODE_CONFIG are written in one burst
+    del bus.writes[:]
+    assert max30105.configure(Profile(sample_average=8, sample_rate=100, slots=('green', 'off'), led_power=(0, 0, 12.5))) == 3
+    assert bus.writes == [0x08, 0x0c, 0x11]
+    assert bus.regs[0x08:0x0b] == [0b01110000, 0b00000111, 0b01100111]
+    assert bus.regs[0x0c:0x0f] == [0, 0, 62]
+    assert bus.regs[0x11] == 0b00000011
+    assert max30105.get_channels() == ('green',)
+    assert max30105.get_sample_rate() == 12.5
+    assert bus.reads == []
+
+
+def test_configure_invalid():
+    from max30105 import MAX30105, Profile
+    bus = MockSMBusCounting(1, default_registers={0x09: 0b00000111})
+    max30105 = MAX30105(i2c_dev=bus)
+    max30105.setup()
+    del bus.writes[:]
+
+    with pytest.raises(ValueError):
+        max30105.configure(Profile(slots=('red', 'puce')))
+
+    with pytest.raises(ValueError):
+        Profile(led_power=(1, 2))
+
+    assert bus.writes == []
+    assert max30105.configure(Profile(slots=('red', 'ir', 'green'))) == 0
+
+    # A bad field leaves every register unchanged, including ones before it
+    with pytest.raises(ValueError):
+        max30105.configure(Profile(pulse_width=69, slots=('puce',)))
+    assert bus.writes == []
+    assert max30105.configure(Profile(pulse_width=69)) == 1
+    assert bus.writes == [0x0a]
+    assert bus.regs[0x0a] & 0b11 == 0
@@ -0,0 +1,210 @@
+import pytest
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def _simulated_sensor(leds_enable=2, **kwargs):
+    from max30105 import MAX30105
+    from max30105.simulator import SimulatedSMBus
+    clock = FakeClock()
+    bus = SimulatedSMBus(clock=clock, sleep=clock.sleep, **kwargs)
+    max30105 = MAX30105(i2c_dev=bus, clock=bus.get_time, sleep=bus.sleep)
+    max30105.setup(leds_enable=leds_enable, sample_rate=400, sample_average=4)
+    return max30105, bus, clock
+
+
+def test_chip_id():
+    from max30105 import MAX30105
+    from max30105.simulator import SimulatedSMBus, REVISION_ID
+    max30105 = MAX30105(i2c_dev=SimulatedSMBus())
+    assert max30105.get_chip_id() == (REVISION_ID, 0x15)
+
+
+def test_sample_rate():
+    max30105, bus, clock = _simulated_sensor(leds_enable=3)
+    assert max30105.get_frames() is None
+    clock.now += 0.1
+    frames = max30105.get_frames()
+    assert frames.channels == ('red', 'ir', 'green')
+    assert len(frames) == 10
+    assert frames.dropped == 0
+    assert bus.unread == 0
+
+
+def test_overflow():
+    max30105, bus, clock = _simulated_sensor()
+    clock.now += 0.5
+    frames = max30105.get_frames()
+    assert len(frames) == 32
+    assert frames.dropped == 18
+    assert bus.samples_lost == 18
+
+
+def test_no_rollover():
+    max30105, bus, clock = _simulated_sensor()
+    max30105._max30105.set('FIFO_CONFIG', fifo_rollover_en=False)
+    clock.now += 0.5
+    frames = max30105.get_frames()
+    assert len(frames) == 32
+    assert frames.dropped == 18
+    assert bus.unread == 0
+
+
+def test_interrupt():
+    max30105, bus, clock = _simulated_sensor()
+    max30105.set_fifo_almost_full_enable(True)
+    max30105.set_fifo_almost_full_count(15)
+    clock.now += 0.165
+    assert not bus.interrupt
+    clock.now += 0.01
+    assert bus.interrupt
+    assert bus.wait(0)
+    assert len(max30105.wait_for_frames(bus.wait, timeout=0)) == 17
+    assert not bus.interrupt
+    assert not bus.wait(0)
+
+
+def test_wait_for_frames_full_fifo():
+    max30105, bus, clock = _simulated_sensor()
+    max30105.set_fifo_almost_full_enable(True)
+    max30105.set_fifo_almost_full_count(0)
+    bus.generate(32)
+    # All 32 samples unread leaves the pointers equal, as if the FIFO were empty
+    assert bus.interrupt
+    frames = max30105.wait_for_frames(bus.wait, timeout=0)
+    assert len(frames) == 32
+    assert frames.dropped == 0
+    assert not bus.interrupt
+    assert max30105.wait_for_frames(bus.wait, timeout=0) is None
+
+
+def test_on_beat_wait():
+    from max30105 import HeartRate
+    from max30105.simulator import PPGSource
+    max30105, bus, clock = _simulated_sensor(source=PPGSource(heart_rate=72, seed=1))
+    max30105.enable_instrumentation()
+    waits = []
+
+    def wait(timeout):
+        waits.append(bus.wait(timeout))
+        return waits[-1]
+
+    updates = []
+
+    def handler(beat_detected, bpm, bpm_avg):
+        updates.append(bpm_avg)
+        return waits.count(True) == 50
+
+    # 17 samples at 100sps is 0.17 seconds, so each drain is followed by a timeout and an update
+    HeartRate(max30105).on_beat(handler, delay=0.1, wait=wait)
+
+    # One drain of 17 samples per almost-full interrupt, and nothing lost
+    stats = max30105.get_instrumentation()
+    assert waits.count(True) == 50
+    assert stats['drains'] == 50
+    assert stats['empty_drains'] == 0
+    assert stats['samples'] == 50 * 17
+    assert bus.samples_lost == 0
+
+
+def test_on_beat_wait_no_interrupt():
+    from max30105 import HeartRate
+    max30105, bus, clock = _simulated_sensor()
+    max30105.set_fifo_almost_full_count(4)
+    updates = []
+
+    def wait(timeout):
+        # INT is never asserted
+        clock.sleep(timeout)
+        return False
+
+    def handler(beat_detected, bpm, bpm_avg):
+        updates.append(max30105.get_time())
+        return len(updates) == 3
+
+    HeartRate(max30105).on_beat(handler, delay=0.5, wait=wait)
+
+    assert updates == pytest.approx([0.5, 1.0, 1.5])
+    # The caller's interrupt settings are put back
+    assert max30105.get_fifo_almost_full_count() == 4
+    assert not max30105.get_fifo_almost_full_enable()
+
+
+def test_temperature():
+    from max30105 import MAX30105
+    from max30105.simulator import SimulatedSMBus
+    max30105 = MAX30105(i2c_dev=SimulatedSMBus(temperature=31.5))
+    assert max30105.get_temperature() == 31.5
+
+
+def test_recording_source(tmpdir):
+    pytest.importorskip('numpy')
+    from max30105.recording import Recorder, Recording
+    from max30105.simulator import RecordingSource
+    path = str(tmpdir.join('test.max30105'))
+
+    with Recorder(path) as recorder:
+        recorder.write(bytearray([0, 0, 1, 0, 0, 2, 0, 0, 3]), ('ir',), 0.0, 100)
+
+    with Recording(path) as recording:
+        source = RecordingSource(recording, loop=True)
+        max30105, bus, clock = _simulated_sensor(source=source)
+        clock.now += 0.05
+        frames = max30105.get_frames()
+        assert frames.ir.tolist() == [1, 2, 3, 1, 2]
+        assert frames.red.tolist() == [0] * 5
+
+
+def _on_beat(max30105, heartrate, seconds, **kwargs):
+    """Run on_beat for a number of seconds of simulated time, returning the last bpm_avg."""
+    updates = []
+
+    def handler(beat_detected, bpm, bpm_avg):
+        updates.append(bpm_avg)
+        return max30105.get_time() >= seconds
+
+    heartrate.on_beat(handler, **kwargs)
+    return updates[-1]
+
+
+@pytest.mark.parametrize('speed', [1, 10])
+def test_heartrate_detects_synthetic_pulse(speed):
+    from max30105 import HeartRate
+    from max30105.simulator import PPGSource
+    max30105, bus, clock = _simulated_sensor(source=PPGSource(heart_rate=72, seed=1), speed=speed)
+
+    assert _on_beat(max30105, HeartRate(max30105), 10) == pytest.approx(72, abs=3)
+    assert bus.samples_lost == 0
+
+
+def test_heartrate_faster_than_real_time():
+    from max30105 import MAX30105, HeartRate
+    from max30105.simulator import SimulatedSMBus, PPGSource
+    bus = SimulatedSMBus(source=PPGSource(heart_rate=72, seed=1), speed=10)
+    max30105 = MAX30105(i2c_dev=bus, clock=bus.get_time, sleep=bus.sleep)
+    max30105.setup(leds_enable=2, sample_rate=400, sample_average=4)
+
+    # 15 seconds of simulated time in 1.5 seconds
+    t_start = bus.get_time()
+    assert _on_beat(max30105, HeartRate(max30105), t_start + 15) == pytest.approx(72, abs=3)
+    assert bus.samples_lost == 0
+
+
+def test_spectral_heartrate_synthetic_pulse():
+    pytest.importorskip('numpy')
+    from max30105 import SpectralHeartRate
+    from max30105.simulator import PPGSource
+    max30105, bus, clock = _simulated_sensor(source=PPGSource(heart_rate=72, seed=1))
+    heartrate = SpectralHeartRate(max30105)
+
+    assert _on_beat(max30105, heartrate, 15) == pytest.approx(72, abs=3)
+    assert bus.samples_lost == 0
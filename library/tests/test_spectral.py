@@ -0,0 +1,119 @@
+import math
+import random
+
+import pytest
+
+
+class FakeSensor(object):
+    def __init__(self, rate):
+        self.rate = rate
+
+    def get_sample_rate(self):
+        return self.rate
+
+    def get_time(self):
+        return 0.0
+
+
+def _pulse(bpm, rate, count, seed=0):
+    rng = random.Random(seed)
+    frequency = bpm / 60.0
+    # A pulse with a harmonic, on a large DC offset with noise
+    samples = []
+    for x in range(count):
+        phase = 2 * math.pi * frequency * x / rate
+        samples.append(50000 + int(400 * math.sin(phase) + 100 * math.sin(2 * phase)) + rng.randint(-50, 50))
+    return samples
+
+
+@pytest.mark.parametrize('bpm', [48, 72, 150])
+def test_spectral_estimate(bpm):
+    pytest.importorskip('numpy')
+    from max30105 import SpectralHeartRate
+    heartrate = SpectralHeartRate(FakeSensor(50))
+    heartrate.reset(4)
+
+    estimates = heartrate.track_beats(_pulse(bpm, 50, 50 * 20))
+
+    # Estimates start once the window is full, then once a second
+    assert len(estimates) == 20 - 8 + 1
+    assert heartrate.bpm == pytest.approx(bpm, abs=1.5)
+    assert heartrate.bpm_avg == pytest.approx(bpm, abs=1.5)
+    assert heartrate.confidence > 0.5
+
+
+@pytest.mark.parametrize('block_size', [1, 7, 32])
+def test_spectral_blocks(block_size):
+    pytest.importorskip('numpy')
+    from max30105 import SpectralHeartRate
+    samples = _pulse(90, 25, 25 * 12)
+    timestamps = [x / 25.0 for x in range(len(samples))]
+
+    expected = SpectralHeartRate(FakeSensor(25), hop=0.4)
+    expected.reset(4)
+    expected = expected.track_beats(samples, timestamps)
+
+    heartrate = SpectralHeartRate(FakeSensor(25), hop=0.4)
+    heartrate.reset(4)
+    result = []
+    for x in range(0, len(samples), block_size):
+        result += heartrate.track_beats(samples[x:x + block_size], timestamps[x:x + block_size])
+
+    assert result == expected
+    # Each estimate is stamped with the last sample of its hop
+    assert [t for t, bpm, bpm_avg in result] == pytest.approx([(x * 10 + 199) / 25.0 for x in range(len(result))])
+
+
+def test_spectral_window_cache(monkeypatch):
+    pytest.importorskip('numpy')
+    import max30105
+    monkeypatch.setattr(max30105, '_spectral_windows', {})
+    sensor = FakeSensor(50)
+    first = max30105.SpectralHeartRate(sensor)
+    second = max30105.SpectralHeartRate(sensor)
+    first.track_beats([0] * 400)
+    second.track_beats([0] * 400)
+    assert len(max30105._spectral_windows) == 1
+
+    # Changing the sample rate switches window
+    sensor.rate = 100
+    first.track_beats([0] * 800)
+    assert len(max30105._spectral_windows) == 2
+    assert first._window_size == 800
+
+
+def test_spectral_without_sensor():
+    pytest.importorskip('numpy')
+    from max30105 import SpectralHeartRate
+    samples = _pulse(72, 25, 25 * 12)
+
+    # estimate works before any samples have been tracked
+    bpm, confidence = SpectralHeartRate(None, sample_rate=25).estimate(samples[:200])
+    assert bpm == pytest.approx(72, abs=1.5)
+    bpm, confidence = SpectralHeartRate(None).estimate(samples[:200], sample_rate=25)
+    assert bpm == pytest.approx(72, abs=1.5)
+
+    heartrate = SpectralHeartRate(None, sample_rate=25)
+    estimates = heartrate.track_beats(samples, [x / 25.0 for x in range(len(samples))])
+    assert len(estimates) == 5
+    assert heartrate.bpm == pytest.approx(72, abs=1.5)
+
+    with pytest.raises(ValueError):
+        SpectralHeartRate(None).estimate(samples)
+
+
+def test_spectral_silence():
+    pytest.importorskip('numpy')
+    from max30105 import SpectralHeartRate
+    heartrate = SpectralHeartRate(FakeSensor(25))
+    heartrate.reset(4)
+    heartrate.track_beats([1000] * 250)
+    assert heartrate.bpm == 0
+    assert heartrate.confidence == 0
+
+
+def test_spectral_requires_numpy(monkeypatch):
+    import max30105
+    monkeypatch.setattr(max30105, 'numpy', None)
+    with pytest.raises(ImportError):
+        max30105.SpectralHeartRate(FakeSensor(25))
@@ -0,0 +1,123 @@
+from array import array
+
+import pytest
+
+
+class FakeMAX30105(object):
+    """Hand out queued SampleFrames in place of FIFO reads."""
+    def __init__(self, channels=('red', 'ir')):
+        self.channels = channels
+        self.queue = []
+
+    def get_channels(self):
+        return self.channels
+
+    def push(self, start, count, dropped=0):
+        from max30105 import SampleFrames, SAMPLE_TYPECODE
+        columns = [array(SAMPLE_TYPECODE, [x * 10 + i for x in range(start, start + count)]) for i in range(len(self.channels))]
+        self.queue.append(SampleFrames(self.channels, columns, dropped=dropped))
+
+    def get_frames(self):
+        if self.queue:
+            return self.queue.pop(0)
+        return None
+
+
+def test_read_in_order():
+    from max30105.stream import SampleStream
+    sensor = FakeMAX30105()
+    stream = SampleStream(sensor, capacity=16)
+
+    assert stream.read(0) == (None, 0)
+
+    sensor.push(0, 5)
+    assert stream.poll() == 5
+    sensor.push(5, 3)
+    assert stream.poll() == 3
+    assert stream.sequence == 8
+
+    frames, seq = stream.read(0, max_count=6)
+    assert seq == 6
+    assert frames.red.tolist() == [0, 10, 20, 30, 40, 50]
+    assert frames.ir.tolist() == [1, 11, 21, 31, 41, 51]
+    assert frames.dropped == 0
+
+    frames, seq = stream.read(seq)
+    assert seq == 8
+    assert frames.red.tolist() == [60, 70]
+
+
+def test_read_wraps_ring():
+    from max30105.stream import SampleStream
+    sensor = FakeMAX30105(channels=('green',))
+    stream = SampleStream(sensor, capacity=8)
+
+    sensor.push(0, 6)
+    stream.poll()
+    frames, seq = stream.read(0)
+    sensor.push(6, 6)
+    stream.poll()
+
+    frames, seq = stream.read(seq)
+    assert seq == 12
+    assert frames.green.tolist() == [60, 70, 80, 90, 100, 110]
+
+
+def test_read_overrun():
+    from max30105.stream import SampleStream
+    sensor = FakeMAX30105(channels=('green',))
+    stream = SampleStream(sensor, capacity=8)
+
+    for start in (0, 6, 12):
+        sensor.push(start, 6, dropped=1)
+        stream.poll()
+
+    frames, seq = stream.read(0)
+    assert frames.dropped == 10
+    assert frames.green.tolist() == [x * 10 for x in range(10, 18)]
+    assert seq == 18
+    assert stream.overruns == 10
+    assert stream.dropped == 3
+
+
+def test_drain_larger_than_ring():
+    from max30105.stream import SampleStream
+    sensor = FakeMAX30105(channels=('green',))
+    stream = SampleStream(sensor, capacity=4)
+
+    sensor.push(0, 6)
+    stream.poll()
+    frames, seq = stream.read(0)
+    assert frames.dropped == 2
+    assert frames.green.tolist() == [20, 30, 40, 50]
+
+
+def test_background_thread():
+    from max30105.stream import SampleStream
+    sensor = FakeMAX30105()
+    sensor.push(0, 4)
+
+    with SampleStream(sensor, capacity=16, interval=0.001) as stream:
+        assert stream.wait(3, timeout=1.0)
+        frames, seq = stream.read(0)
+
+    assert seq == 4
+    assert frames.red.tolist() == [0, 10, 20, 30]
+
+
+def test_background_thread_error():
+    from max30105.stream import SampleStream
+    sensor = FakeMAX30105()
+
+    def fail():
+        raise IOError("Bus error")
+
+    sensor.get_frames = fail
+
+    stream = SampleStream(sensor, interval=0.001)
+    stream.start()
+    with pytest.raises(IOError):
+        stream.wait(0, timeout=1.0)
+    with pytest.raises(IOError):
+        stream.read(0)
+    stream.stop()